@@ -0,0 +1,316 @@
+"""Time each stage of the scrapers against recorded pages.
+
+Pages are served from a local HTTP server, so runs are reproducible and
+never touch the site. fixtures/ holds a small set of synthetic pages laid
+out like the site's, with a baseline recorded from them, so the suite runs
+on a clean checkout; --record replaces them with pages downloaded from
+basketball-reference. Each stage is timed separately, results are saved
+as JSON, and a run fails when a stage is slower than the saved baseline.
+
+The committed baseline.json was recorded from the committed fixtures with
+the command saved in it, python -m benchmarks.bench --save-baseline, along
+with the Python and pandas versions it ran on. Timings only compare
+between runs on the same machine, so re-record it before comparing.
+"""
+
+import argparse
+import functools
+import http.server
+import json
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+from rsvsps import rsvsps
+from rsvsps.scrapers import fetcher, player_page_scraper, table_cache, team_log_scraper
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FIXTURES_DIR = os.path.join(BENCHMARK_DIR, 'fixtures')
+DEFAULT_RESULTS_FILE = os.path.join(BENCHMARK_DIR, 'results', 'latest.json')
+DEFAULT_BASELINE_FILE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+PLAYER_FIXTURES = (
+    'jamesle01',
+    'petrodr01',
+    'grahade01',
+)
+TEAM_FIXTURES = (
+    ('BOS', 2020),
+)
+BASELINE_COMMAND = 'python -m benchmarks.bench --save-baseline'
+DEFAULT_REPEAT = 5
+DEFAULT_TOLERANCE = 0.25
+# Stages faster than this are too noisy to compare by ratio alone.
+MIN_SLACK_SECONDS = 0.005
+
+
+def player_fixture_path(fixtures_dir, player_id):
+    """Determine where a player page is recorded.
+
+    Args:
+        fixtures_dir: folder of recorded pages
+        player_id: string that is player ID.
+
+    Returns:
+        path of recorded page
+    """
+    return os.path.join(fixtures_dir, 'players', '{player}.html'.format(player=player_id))
+
+
+def team_fixture_path(fixtures_dir, team, season):
+    """Determine where a team game log page is recorded.
+
+    Args:
+        fixtures_dir: folder of recorded pages
+        team: team name
+        season: season number
+
+    Returns:
+        path of recorded page
+    """
+    return os.path.join(fixtures_dir, 'teams', '{team}_{season}.html'.format(team=team, season=season))
+
+
+def record(fixtures_dir):
+    """Download the benchmark pages from the site once.
+
+    Args:
+        fixtures_dir: folder to record pages into
+    """
+    pages = [
+        (player_page_scraper.determine_player_url(player_id), player_fixture_path(fixtures_dir, player_id))
+        for player_id in PLAYER_FIXTURES
+    ] + [
+        (team_log_scraper.determine_team_season_log_url(team, season), team_fixture_path(fixtures_dir, team, season))
+        for team, season in TEAM_FIXTURES
+    ]
+    for url, path in pages:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        response = fetcher.get(url, timeout=30)
+        response.raise_for_status()
+        with open(path, 'w', encoding='utf-8') as page_file:
+            page_file.write(response.text)
+        print('recorded {path}'.format(path=path))
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    """Serve recorded pages without logging every request."""
+
+    def log_message(self, format, *args):
+        """Skip request logging."""
+
+
+def serve(fixtures_dir):
+    """Serve recorded pages on a local port.
+
+    Args:
+        fixtures_dir: folder of recorded pages
+
+    Returns:
+        running server, with base URL at server.base_url
+    """
+    handler = functools.partial(QuietHandler, directory=fixtures_dir)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.base_url = 'http://127.0.0.1:{port}/'.format(port=server.server_address[1])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def timed(timings, stage, function, *args):
+    """Run a function and add its wall time to a stage.
+
+    Args:
+        timings: dict of stage to list of seconds
+        stage: stage name
+        function: function to run
+        *args: arguments for function
+
+    Returns:
+        result of function
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    timings.setdefault(stage, []).append(time.perf_counter() - start)
+    return result
+
+
+def bench_player(timings, base_url, player_id):
+    """Run every stage once for a recorded player page.
+
+    Args:
+        timings: dict of stage to list of seconds
+        base_url: URL of the local server
+        player_id: string that is player ID.
+    """
+    url = '{base}players/{player}.html'.format(base=base_url, player=player_id)
+    page = timed(timings, 'player.fetch', player_page_scraper.fetch_player_page, url)
+    tables = timed(timings, 'player.parse', player_page_scraper.parse_player_page, page)
+    player_data = timed(timings, 'player.clean', player_page_scraper.get_player_data, tables, 'all')
+    player_tables = timed(timings, 'player.diff', rsvsps.player_tables, player_data)
+    timed(timings, 'player.write', rsvsps.write_output, player_id, player_tables)
+
+
+def bench_team(timings, base_url, team, season):
+    """Run every stage once for a recorded team game log page.
+
+    Args:
+        timings: dict of stage to list of seconds
+        base_url: URL of the local server
+        team: team name
+        season: season number
+    """
+    url = '{base}teams/{team}_{season}.html'.format(base=base_url, team=team, season=season)
+    page = timed(timings, 'team.fetch', team_log_scraper.fetch_team_season_log_page, url)
+    soup = timed(timings, 'team.parse', team_log_scraper.parse_team_season_log_page, page)
+    output = timed(timings, 'team.clean', team_log_scraper.get_output_from_soup, soup, team, None)
+    timed(timings, 'team.write', team_log_scraper.write_output, output, team, season, None)
+
+
+def run(fixtures_dir, repeat=DEFAULT_REPEAT):
+    """Time every stage over every recorded page.
+
+    Raises:
+        SystemExit: no recorded pages
+
+    Args:
+        fixtures_dir: folder of recorded pages
+        repeat: number of times each page is run
+
+    Returns:
+        dict with median seconds per run over all pages for every stage
+    """
+    players = [player_id for player_id in PLAYER_FIXTURES if os.path.exists(player_fixture_path(fixtures_dir, player_id))]
+    teams = [(team, season) for team, season in TEAM_FIXTURES if os.path.exists(team_fixture_path(fixtures_dir, team, season))]
+    if not players and not teams:
+        raise SystemExit('No recorded pages in {dir}, run with --record first'.format(dir=fixtures_dir))
+
+    fetcher.configure(None)
+    fetcher.configure_cache(None)
+    table_cache.configure(None)
+    server = serve(fixtures_dir)
+    work_dir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    stage_runs = {}
+    try:
+        os.chdir(work_dir)
+        os.makedirs('output')
+        for _ in range(repeat):
+            timings = {}
+            for player_id in players:
+                bench_player(timings, server.base_url, player_id)
+            for team, season in teams:
+                bench_team(timings, server.base_url, team, season)
+            for stage, seconds in timings.items():
+                stage_runs.setdefault(stage, []).append(sum(seconds))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+        server.shutdown()
+
+    return {
+        'players': players,
+        'teams': ['{team}_{season}'.format(team=team, season=season) for team, season in teams],
+        'repeat': repeat,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'stages': {stage: statistics.median(runs) for stage, runs in sorted(stage_runs.items())},
+    }
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Find stages slower than the baseline.
+
+    Args:
+        results: results of this run
+        baseline: results of the baseline run
+        tolerance: fraction a stage may be slower before it counts
+
+    Returns:
+        list of descriptions of regressed stages
+    """
+    regressions = []
+    for stage, seconds in results['stages'].items():
+        allowed = baseline['stages'].get(stage)
+        if allowed is None:
+            continue
+        limit = max(allowed * (1 + tolerance), allowed + MIN_SLACK_SECONDS)
+        if seconds > limit:
+            regressions.append('{stage}: {seconds:.4f}s vs baseline {allowed:.4f}s'.format(
+                stage=stage,
+                seconds=seconds,
+                allowed=allowed,
+            ))
+    return regressions
+
+
+def save(results, fname):
+    """Save results as JSON.
+
+    Args:
+        results: benchmark results
+        fname: path to write
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(fname)), exist_ok=True)
+    with open(fname, 'w') as results_file:
+        json.dump(results, results_file, indent=1, sort_keys=True)
+
+
+def main(fixtures_dir=DEFAULT_FIXTURES_DIR, repeat=DEFAULT_REPEAT, results_file=DEFAULT_RESULTS_FILE, baseline_file=DEFAULT_BASELINE_FILE, tolerance=DEFAULT_TOLERANCE, save_baseline=False):
+    """Run the benchmarks and check them against the baseline.
+
+    Args:
+        fixtures_dir: folder of recorded pages
+        repeat: number of times each page is run
+        results_file: path to save results to
+        baseline_file: path of baseline results
+        tolerance: fraction a stage may be slower than baseline
+        save_baseline: save these results as the new baseline
+
+    Returns:
+        list of descriptions of regressed stages
+    """
+    results = run(fixtures_dir, repeat)
+    for stage, seconds in results['stages'].items():
+        print('{stage:<14} {seconds:.4f}s'.format(stage=stage, seconds=seconds))
+    save(results, results_file)
+    if save_baseline:
+        save(dict(results, command=BASELINE_COMMAND), baseline_file)
+        return []
+    if not os.path.exists(baseline_file):
+        print('No baseline at {fname}, run with --save-baseline'.format(fname=baseline_file))
+        return []
+    with open(baseline_file) as baseline:
+        regressions = compare(results, json.load(baseline), tolerance)
+    for regression in regressions:
+        print('REGRESSION {regression}'.format(regression=regression))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fixtures-dir', type=str, default=DEFAULT_FIXTURES_DIR)
+    parser.add_argument('--record', action='store_true')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--results-file', type=str, default=DEFAULT_RESULTS_FILE)
+    parser.add_argument('--baseline-file', type=str, default=DEFAULT_BASELINE_FILE)
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.fixtures_dir)
+    else:
+        regressions = main(
+            args.fixtures_dir,
+            args.repeat,
+            args.results_file,
+            args.baseline_file,
+            args.tolerance,
+            args.save_baseline,
+        )
+        raise SystemExit(1 if regressions else 0)
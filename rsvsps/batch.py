@@ -0,0 +1,273 @@
+"""Create rsvsps excel sheets for many players in one run."""
+
+import argparse
+import collections
+import concurrent.futures
+import os
+
+from rsvsps import instrumentation, rsvsps
+from rsvsps.scrapers import fetcher, page_archive, player_index, player_page_scraper, table_cache
+
+
+def read_player_ids(players, players_file, archive=None, index=None, active_only=False):
+    """Collect player IDs from the command line, a file, an archive and the index.
+
+    Args:
+        players: list of player IDs, or None
+        players_file: path to a file with one player ID per line, or None
+        archive: page archive whose player pages are all included, or None
+        index: player index whose players are all included, or None
+        active_only: take only active players from the index
+
+    Returns:
+        list of player IDs in the order given, without duplicates
+    """
+    player_ids = list(players or [])
+    if players_file is not None:
+        with open(players_file) as id_file:
+            for line in id_file:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    player_ids.append(line)
+    if archive is not None:
+        player_ids.extend(page_archive.player_ids(archive))
+    if index is not None:
+        player_ids.extend(index.ids(active_only))
+    return list(dict.fromkeys(player_ids))
+
+
+def fetch_player(player_id):
+    """Download the page for a player.
+
+    Args:
+        player_id: string that is player ID.
+
+    Returns:
+        raw HTML of player page
+    """
+    return player_page_scraper.fetch_player_page(player_page_scraper.determine_player_url(player_id))
+
+
+def configure_worker(fetcher_settings, table_cache_dir):
+    """Set up a worker process like the parent, whatever the start method.
+
+    Args:
+        fetcher_settings: dict from fetcher.worker_settings
+        table_cache_dir: folder of the table cache, or None for no cache
+    """
+    fetcher.configure_worker(fetcher_settings)
+    table_cache.configure(table_cache_dir)
+
+
+def build_player(player_id, player_page, output_format='xlsx', metrics=False, profile_fname=None):
+    """Build and write the output for a downloaded player page.
+
+    Args:
+        player_id: string that is player ID.
+        player_page: raw HTML of player page
+        output_format: one of rsvsps.OUTPUT_FORMATS
+        metrics: record stage metrics for this player
+        profile_fname: path to dump cProfile stats for this player to, or None
+
+    Returns:
+        stage metrics recorded for the player, or None
+    """
+    if metrics:
+        instrumentation.enable()
+    with instrumentation.profile(profile_fname):
+        rsvsps.process_player_page(player_id, player_page, output_format)
+    return instrumentation.snapshot() if metrics else None
+
+
+def describe_error(err):
+    """Describe why a player failed.
+
+    Args:
+        err: exception raised for the player
+
+    Returns:
+        short description of the error
+    """
+    if isinstance(err, SystemExit) and err.__cause__ is not None:
+        err = err.__cause__
+    return '{name}: {message}'.format(name=type(err).__name__, message=err)
+
+
+def fetch_pages(player_ids, fetch_workers, fetch=fetch_player):
+    """Download pages with a bounded number of requests in flight.
+
+    Pages are only requested as the caller consumes them, so a slow consumer
+    holds back the downloads.
+
+    Args:
+        player_ids: iterable of player IDs, or other keys fetch takes
+        fetch_workers: most pages downloaded at once
+        fetch: function taking a key and returning its page
+
+    Yields:
+        key, page or None, and error or None, in the order given
+    """
+    player_ids = iter(player_ids)
+    in_flight = collections.deque()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=fetch_workers) as executor:
+        for player_id in player_ids:
+            in_flight.append((player_id, executor.submit(fetch, player_id)))
+            if len(in_flight) >= fetch_workers:
+                break
+        while in_flight:
+            player_id, future = in_flight.popleft()
+            try:
+                yield player_id, future.result(), None
+            except (Exception, SystemExit) as err:
+                yield player_id, None, err
+            for next_id in player_ids:
+                in_flight.append((next_id, executor.submit(fetch, next_id)))
+                break
+
+
+def run_batch(player_ids, fetch_workers=2, process_workers=None, max_pending=None, output_format='xlsx', profile_player=None, profile_fname=None, fetch=fetch_player, mp_context=None):
+    """Create excel sheets for many players.
+
+    Pages are downloaded in threads and processed in a process pool. At most
+    max_pending pages wait for a worker at any time, so memory stays flat no
+    matter how many players are given. Workers are handed the fetcher and
+    table cache setup rather than relying on fork to copy it.
+
+    Args:
+        player_ids: iterable of player IDs
+        fetch_workers: most pages downloaded at once
+        process_workers: number of worker processes, defaults to CPU count
+        max_pending: most pages waiting for or being processed, defaults to
+            twice the number of worker processes
+        output_format: one of rsvsps.OUTPUT_FORMATS
+        profile_player: player ID to capture a cProfile for, or None
+        profile_fname: path to dump the player's cProfile stats to
+        fetch: function taking a player ID and returning its page
+        mp_context: multiprocessing context for the workers, or None for
+            the default start method
+
+    Returns:
+        dict of player ID to None on success or a description of the error
+    """
+    metrics = instrumentation.recorder is not None
+    workers = process_workers or os.cpu_count() or 1
+    if max_pending is None:
+        max_pending = 2 * workers
+    table_cache_dir = None if table_cache.cache is None else os.path.dirname(table_cache.cache.path)
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=process_workers,
+        mp_context=mp_context,
+        initializer=configure_worker,
+        initargs=(fetcher.worker_settings(workers), table_cache_dir),
+    ) as pool:
+        pending = {}
+
+        def collect(done):
+            for future in done:
+                player_id = pending.pop(future)
+                try:
+                    instrumentation.merge(future.result())
+                    results[player_id] = None
+                except (Exception, SystemExit) as err:
+                    results[player_id] = describe_error(err)
+
+        for player_id, player_page, err in fetch_pages(player_ids, fetch_workers, fetch):
+            if err is not None:
+                results[player_id] = describe_error(err)
+                continue
+            if len(pending) >= max_pending:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                collect(done)
+            pending[pool.submit(
+                build_player,
+                player_id,
+                player_page,
+                output_format,
+                metrics,
+                profile_fname if player_id == profile_player else None,
+            )] = player_id
+        collect(concurrent.futures.as_completed(list(pending)))
+    return results
+
+
+def report(results):
+    """Print the outcome for each player and a summary.
+
+    Args:
+        results: dict of player ID to None or error description
+
+    Returns:
+        number of players that failed
+    """
+    failed = 0
+    for player_id, error in results.items():
+        if error is None:
+            print('{player}: ok'.format(player=player_id))
+        else:
+            failed += 1
+            print('{player}: failed ({error})'.format(player=player_id, error=error))
+    print('{ok} succeeded, {failed} failed'.format(ok=len(results) - failed, failed=failed))
+    return failed
+
+
+def main(player_ids, fetch_workers=2, process_workers=None, max_pending=None, output_format='xlsx', profile_player=None, profile_fname=None):
+    """Create excel sheets for many players and report how each went.
+
+    Args:
+        player_ids: iterable of player IDs
+        fetch_workers: most pages downloaded at once
+        process_workers: number of worker processes
+        max_pending: most pages waiting for or being processed
+        output_format: one of rsvsps.OUTPUT_FORMATS
+        profile_player: player ID to capture a cProfile for, or None
+        profile_fname: path to dump the player's cProfile stats to
+
+    Returns:
+        dict of player ID to None on success or a description of the error
+    """
+    results = run_batch(player_ids, fetch_workers, process_workers, max_pending, output_format, profile_player, profile_fname)
+    report(results)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', type=str, nargs='*')
+    parser.add_argument('--players-file', type=str)
+    parser.add_argument('--fetch-workers', type=int, default=2)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--max-pending', type=int)
+    parser.add_argument('--output-format', type=str, choices=rsvsps.OUTPUT_FORMATS, default='xlsx')
+    parser.add_argument('--archived-players', action='store_true', help='include every player page in --archive')
+    parser.add_argument('--all-players', action='store_true', help='include every player in the player index')
+    parser.add_argument('--active-players', action='store_true', help='include every active player in the player index')
+    parser.add_argument('--index-file', type=str, default=player_index.DEFAULT_INDEX_FILE)
+    parser.add_argument('--profile-player', type=str, help='player ID to profile, with --profile')
+    fetcher.add_arguments(parser)
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    fetcher.configure_from_args(args)
+    table_cache.configure_from_args(args)
+    if args.metrics:
+        instrumentation.enable()
+
+    results = main(
+        read_player_ids(
+            args.players,
+            args.players_file,
+            fetcher.archive if args.archived_players else None,
+            player_index.load(args.index_file) if args.all_players or args.active_players else None,
+            not args.all_players,
+        ),
+        args.fetch_workers,
+        args.workers,
+        args.max_pending,
+        args.output_format,
+        args.profile_player,
+        args.profile,
+    )
+    if args.metrics:
+        instrumentation.write_report(args.metrics, args.metrics_file)
+    raise SystemExit(1 if any(error is not None for error in results.values()) else 0)
@@ -0,0 +1,411 @@
+"""Compact in-memory game logs, one typed array per column.
+
+Stats are held as int16, int32 or float32 arrays, teams and results as
+small integer codes into dictionaries, and dates as day numbers. Home and
+away teams share one team dictionary. Each column remembers how its
+numbers were written, so rows come back exactly as they were scraped, and
+columns that cannot be written back the same way are kept as codes of
+their text instead.
+"""
+
+import argparse
+import re
+
+import numpy as np
+import pandas as pd
+
+from rsvsps.scrapers import fetcher, team_log_scraper
+
+DATE_COLUMNS = frozenset({'Date'})
+TEAM_COLUMNS = frozenset({'Home Team', 'Away Team'})
+LABEL_COLUMNS = frozenset({'Home Team Result'})
+TEAMS = 'teams'
+NUMBER = re.compile(r'^-?(\d*)(?:\.(\d+))?$')
+MISSING_DAY = np.iinfo(np.int32).min
+# Rows are turned back into text this many at a time when iterating.
+CHUNK_ROWS = 4096
+
+
+def code_dtype(size):
+    """Pick the code type for a dictionary, the same one pandas would.
+
+    Args:
+        size: number of labels in dictionary
+
+    Returns:
+        numpy integer type
+    """
+    for dtype in (np.int8, np.int16, np.int32):
+        if size < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def number_format(values):
+    """Work out how a column of numbers is written.
+
+    Args:
+        values: cell text of column
+
+    Returns:
+        dict with decimals and whether a leading zero is dropped, or None
+        if the values are not all numbers written the same way
+    """
+    decimals = None
+    stripped = None
+    for value in values:
+        if value == '':
+            continue
+        match = NUMBER.match(value)
+        if match is None or (match.group(1) == '' and match.group(2) is None):
+            return None
+        places = len(match.group(2) or '')
+        if decimals is None:
+            decimals = places
+        elif places != decimals:
+            return None
+        if match.group(1) in ('', '0') and places:
+            value_stripped = match.group(1) == ''
+            if stripped is None:
+                stripped = value_stripped
+            elif stripped != value_stripped:
+                return None
+    return {'kind': 'number', 'decimals': decimals or 0, 'stripped': bool(stripped)}
+
+
+def format_numbers(array, column_format):
+    """Write numbers the way they were scraped.
+
+    Args:
+        array: numbers of column
+        column_format: dict from number_format
+
+    Returns:
+        list of cell text
+    """
+    if array.dtype.kind == 'i':
+        return [str(value) for value in array.tolist()]
+    template = '{{0:.{decimals}f}}'.format(decimals=column_format['decimals'])
+    text = []
+    for value in array.tolist():
+        if value != value:
+            text.append('')
+            continue
+        cell = template.format(value)
+        if column_format['stripped'] and cell.lstrip('-').startswith('0.'):
+            cell = cell.replace('0.', '.', 1)
+        text.append(cell)
+    return text
+
+
+def encode_numbers(values):
+    """Store a column of numbers in the smallest type that holds them.
+
+    Args:
+        values: cell text of column
+
+    Returns:
+        array and column format, or None if the text cannot be written
+        back exactly from numbers
+    """
+    column_format = number_format(values)
+    if column_format is None:
+        return None
+    numbers = np.array([float(value) if value else np.nan for value in values], dtype=np.float64)
+    array = None
+    if column_format['decimals'] == 0 and not np.isnan(numbers).any():
+        for dtype in (np.int16, np.int32):
+            limits = np.iinfo(dtype)
+            if not len(numbers) or (numbers.min() >= limits.min and numbers.max() <= limits.max):
+                array = numbers.astype(dtype)
+                break
+    if array is None:
+        array = numbers.astype(np.float32)
+    if format_numbers(array, column_format) != list(values):
+        return None
+    return array, column_format
+
+
+def decode_dates(array):
+    """Write day numbers as ISO dates.
+
+    Args:
+        array: day numbers of column
+
+    Returns:
+        list of cell text, '' for missing dates
+    """
+    dates = np.datetime_as_string(array.astype(np.int64).astype('datetime64[D]'))
+    dates[array == MISSING_DAY] = ''
+    return dates.tolist()
+
+
+def encode_dates(values):
+    """Store a column of ISO dates as day numbers.
+
+    Args:
+        values: cell text of column
+
+    Returns:
+        array and column format, or None if a value is not an ISO date
+    """
+    try:
+        dates = np.array(values, dtype='datetime64[D]')
+    except ValueError:
+        return None
+    array = dates.astype(np.int64)
+    array[np.isnat(dates)] = MISSING_DAY
+    array = array.astype(np.int32)
+    if decode_dates(array) != list(values):
+        return None
+    return array, {'kind': 'date'}
+
+
+def encode_labels(values, labels):
+    """Store text as codes into a dictionary, adding new labels to it.
+
+    Args:
+        values: cell text of column
+        labels: dictionary of labels, extended in place
+
+    Returns:
+        array of codes
+    """
+    codes = {label: code for code, label in enumerate(labels)}
+    array = np.empty(len(values), dtype=np.int64)
+    for row, value in enumerate(values):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(labels)
+            labels.append(value)
+        array[row] = code
+    return array
+
+
+def encode_column(name, values, categories):
+    """Pick a compact form for one column and store it.
+
+    Args:
+        name: column header
+        values: cell text of column
+        categories: dict of dictionary name to labels, extended in place
+
+    Returns:
+        array and column format
+    """
+    values = list(values)
+    encoded = None
+    if name in DATE_COLUMNS:
+        encoded = encode_dates(values)
+    elif name not in TEAM_COLUMNS | LABEL_COLUMNS:
+        encoded = encode_numbers(values)
+    if encoded is not None:
+        return encoded
+    key = TEAMS if name in TEAM_COLUMNS else name
+    return encode_labels(values, categories.setdefault(key, [])), {'kind': 'category', 'categories': key}
+
+
+class GameLog:
+    """Game rows held column-wise in typed arrays."""
+
+    def __init__(self, header_row, arrays, formats, categories):
+        """Hold encoded columns.
+
+        Code arrays are narrowed to the type pandas uses for their
+        dictionary, so they can be handed to pandas without a copy.
+
+        Args:
+            header_row: column headers
+            arrays: one array per column
+            formats: one column format per column
+            categories: dict of dictionary name to labels
+        """
+        self.header_row = list(header_row)
+        self.formats = list(formats)
+        self.categories = categories
+        self.arrays = [
+            array.astype(code_dtype(len(categories[column_format['categories']])), copy=False)
+            if column_format['kind'] == 'category' else array
+            for array, column_format in zip(arrays, formats)
+        ]
+
+    @classmethod
+    def from_rows(cls, header_row, rows):
+        """Encode game rows.
+
+        Args:
+            header_row: column headers
+            rows: game rows of cell text
+
+        Returns:
+            game log
+        """
+        columns = list(zip(*rows)) if rows else [()] * len(header_row)
+        categories = {}
+        arrays, formats = [], []
+        for name, values in zip(header_row, columns):
+            array, column_format = encode_column(name, values, categories)
+            arrays.append(array)
+            formats.append(column_format)
+        return cls(header_row, arrays, formats, categories)
+
+    @classmethod
+    def concat(cls, logs):
+        """Join game logs with the same columns into one.
+
+        Dictionaries are merged, so teams keep one code in the whole log.
+        Columns written differently in different logs are encoded again
+        from their text.
+
+        Raises:
+            SystemExit: columns differ between logs
+
+        Args:
+            logs: game logs
+
+        Returns:
+            game log
+        """
+        logs = list(logs)
+        if not logs:
+            raise SystemExit('No game logs to join')
+        header_row = logs[0].header_row
+        for log in logs[1:]:
+            if log.header_row != header_row:
+                raise SystemExit('Columns differ between game logs')
+        categories = {}
+        arrays, formats = [], []
+        for column, name in enumerate(header_row):
+            column_formats = [log.formats[column] for log in logs]
+            column_format = column_formats[0]
+            parts = [log.arrays[column] for log in logs]
+            if any(other != column_format for other in column_formats[1:]):
+                values = [value for log in logs for value in log.decode_column(column, 0, len(log))]
+                array, column_format = encode_column(name, values, categories)
+            elif column_format['kind'] == 'category':
+                labels = categories.setdefault(column_format['categories'], [])
+                array = np.concatenate([
+                    encode_labels(log.categories[column_format['categories']], labels)[part]
+                    for log, part in zip(logs, parts)
+                ])
+            elif any(part.dtype.kind == 'f' for part in parts):
+                array = np.concatenate(parts).astype(np.float32, copy=False)
+            else:
+                array = np.concatenate(parts)
+            arrays.append(array)
+            formats.append(column_format)
+        return cls(header_row, arrays, formats, categories)
+
+    def __len__(self):
+        """Count games."""
+        return len(self.arrays[0]) if self.arrays else 0
+
+    @property
+    def nbytes(self):
+        """Bytes held by the column arrays."""
+        return sum(array.nbytes for array in self.arrays)
+
+    def decode_column(self, column, start, stop):
+        """Write part of a column back as text.
+
+        Args:
+            column: position of column
+            start: first row
+            stop: row after the last
+
+        Returns:
+            list of cell text
+        """
+        array = self.arrays[column][start:stop]
+        column_format = self.formats[column]
+        if column_format['kind'] == 'date':
+            return decode_dates(array)
+        if column_format['kind'] == 'category':
+            labels = self.categories[column_format['categories']]
+            return [labels[code] for code in array.tolist()]
+        return format_numbers(array, column_format)
+
+    def rows(self):
+        """Iterate over games as rows of text, a chunk of rows at a time.
+
+        Yields:
+            game row as scraped
+        """
+        for start in range(0, len(self), CHUNK_ROWS):
+            stop = start + CHUNK_ROWS
+            columns = [self.decode_column(column, start, stop) for column in range(len(self.header_row))]
+            for row in zip(*columns):
+                yield list(row)
+
+    def __iter__(self):
+        """Iterate over the header row and then the games, like a game log list."""
+        yield list(self.header_row)
+        yield from self.rows()
+
+    def to_pandas(self):
+        """Build a dataframe over the stored arrays.
+
+        Number columns and the codes of categorical columns are used as
+        they are, without a copy. Dates are converted to datetimes.
+
+        Returns:
+            dataframe with one column per game log column
+        """
+        data = {}
+        for name, array, column_format in zip(self.header_row, self.arrays, self.formats):
+            if column_format['kind'] == 'date':
+                dates = array.astype(np.int64).astype('datetime64[D]').astype('datetime64[s]')
+                dates[array == MISSING_DAY] = np.datetime64('NaT')
+                data[name] = dates
+            elif column_format['kind'] == 'category':
+                data[name] = pd.Categorical.from_codes(array, categories=self.categories[column_format['categories']])
+            else:
+                data[name] = array
+        return pd.DataFrame(data, copy=False)
+
+
+def load_seasons(team, first_season, last_season, post_season_bool, concurrency=team_log_scraper.DEFAULT_CONCURRENCY):
+    """Scrape a range of seasons into one compact game log.
+
+    Each season is encoded as soon as it is scraped, so only one season is
+    ever held as rows of text. Seasons without games are skipped.
+
+    Raises:
+        SystemExit: columns change between seasons
+
+    Args:
+        team: team name, or 'ALL' for every team
+        first_season: first season number
+        last_season: last season number, included
+        post_season_bool: bool to indicate rs or ps
+        concurrency: most pages downloaded at once for every team
+
+    Returns:
+        game log
+    """
+    logs = []
+    for season in range(int(first_season), int(last_season) + 1):
+        output = team_log_scraper.get_season_output(team, season, post_season_bool, concurrency)
+        if not output:
+            continue
+        logs.append(GameLog.from_rows(output[0], output[1:]))
+    return GameLog.concat(logs)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--team', type=str, required=True)
+    parser.add_argument('--season', type=str, required=True)
+    parser.add_argument('--last-season', type=str)
+    parser.add_argument('--postseason_bool', type=bool)
+    parser.add_argument('--concurrency', type=int, default=team_log_scraper.DEFAULT_CONCURRENCY, help=team_log_scraper.CONCURRENCY_HELP)
+    fetcher.add_arguments(parser)
+    args = parser.parse_args()
+
+    fetcher.configure_from_args(args)
+
+    last_season = args.last_season or args.season
+    game_log = load_seasons(args.team, args.season, last_season, args.postseason_bool, args.concurrency)
+    season_range = args.season if last_season == args.season else '{first}-{last}'.format(first=args.season, last=last_season)
+    team_log_scraper.write_output(game_log, args.team, season_range, args.postseason_bool)
+    print('{games} games in {size} bytes'.format(games=len(game_log), size=game_log.nbytes))
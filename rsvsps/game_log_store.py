@@ -0,0 +1,294 @@
+"""Columnar store of league game logs, partitioned by season and season type.
+
+Each partition is a folder of numpy arrays, one per column, plus a manifest
+describing how to read them. Columns are encoded the way game_log holds
+them in memory: dates as day numbers, teams and results as codes into
+dictionaries, and stats in the smallest type that gives back the scraped
+text.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from rsvsps import game_log
+from rsvsps.scrapers import fetcher, team_log_scraper
+
+DEFAULT_STORE_DIR = 'store'
+SEASON_TYPES = {'RS': False, 'PS': True}
+
+
+def determine_partition_dir(store_dir, season, season_type):
+    """Determine the folder for a partition.
+
+    Args:
+        store_dir: folder of the store
+        season: season number
+        season_type: 'RS' or 'PS'
+
+    Returns:
+        path of partition folder
+    """
+    return os.path.join(store_dir, 'season={season}'.format(season=season), 'type={season_type}'.format(season_type=season_type))
+
+
+def encode_columns(header_row, rows):
+    """Convert game rows to typed column arrays with game_log's encoding.
+
+    Args:
+        header_row: column headers
+        rows: game rows
+
+    Returns:
+        manifest describing the columns, and dict of file name to array
+    """
+    log = game_log.GameLog.from_rows(header_row, rows)
+    manifest = {'rows': len(log), 'columns': {}, 'categories': log.categories}
+    arrays = {}
+    for number, (name, array, column_format) in enumerate(zip(log.header_row, log.arrays, log.formats)):
+        file_name = 'col{number}.npy'.format(number=number)
+        manifest['columns'][name] = {'file': file_name, 'format': column_format}
+        arrays[file_name] = array
+    return manifest, arrays
+
+
+def write_partition(store_dir, season, season_type, header_row, rows, missing_teams=()):
+    """Replace a partition with new game rows.
+
+    Args:
+        store_dir: folder of the store
+        season: season number
+        season_type: 'RS' or 'PS'
+        header_row: column headers
+        rows: game rows
+        missing_teams: teams whose page was not found, kept in the manifest
+    """
+    partition_dir = determine_partition_dir(store_dir, season, season_type)
+    temp_dir = partition_dir + '.tmp'
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+    manifest, arrays = encode_columns(header_row, rows)
+    manifest['missing_teams'] = sorted(missing_teams)
+    for file_name, array in arrays.items():
+        np.save(os.path.join(temp_dir, file_name), array)
+    with open(os.path.join(temp_dir, 'manifest.json'), 'w') as manifest_file:
+        json.dump(manifest, manifest_file)
+    shutil.rmtree(partition_dir, ignore_errors=True)
+    os.replace(temp_dir, partition_dir)
+
+
+def get_team_logs(team_season_log_page, team):
+    """Parse a downloaded team page into its RS and PS game logs.
+
+    Args:
+        team_season_log_page: raw HTML of team log page
+        team: team name
+
+    Returns:
+        dict of season type to game logs with header row, for each season
+        type the page has
+    """
+    soup = team_log_scraper.parse_team_season_log_page(team_season_log_page)
+    team_logs = {}
+    for season_type, label in SEASON_TYPES.items():
+        team_log = team_log_scraper.get_log_for_team_season_and_season_type(soup, label, team)
+        if team_log is not None:
+            team_logs[season_type] = team_log
+    return team_logs
+
+
+async def get_league_logs(season, concurrency=team_log_scraper.DEFAULT_CONCURRENCY, missing=None):
+    """Get one row per game for every team's RS and PS in a season.
+
+    The teams in use that season are scraped, and pages that are not found
+    are skipped. Pages are parsed in worker threads while others download.
+
+    Args:
+        season: season number
+        concurrency: most pages downloaded at once
+        missing: list to add team and season to for each page not found
+
+    Returns:
+        dict of season type to header row and game rows
+    """
+    if missing is None:
+        missing = []
+    collected = {season_type: (None, []) for season_type in SEASON_TYPES}
+    teams = team_log_scraper.teams_for_season(season)
+    async for team, page in team_log_scraper.iter_team_pages(teams, season, concurrency, missing):
+        team_logs = await asyncio.to_thread(get_team_logs, page, team)
+        for season_type, team_log in team_logs.items():
+            header_row, rows = collected[season_type]
+            rows.extend(row[1:] for row in team_log[1:])
+            collected[season_type] = (team_log[0][1:], rows)
+    return {
+        season_type: (header_row, team_log_scraper.index_games(header_row, rows))
+        for season_type, (header_row, rows) in collected.items()
+        if header_row is not None
+    }
+
+
+def ingest_season(store_dir, season, concurrency=team_log_scraper.DEFAULT_CONCURRENCY):
+    """Scrape a season for every team and store it.
+
+    Teams whose page was not found are listed in each partition's manifest.
+
+    Args:
+        store_dir: folder of the store
+        season: season number
+        concurrency: most pages downloaded at once
+
+    Returns:
+        dict of season type to number of games stored, and teams whose page
+        was not found
+    """
+    missing = []
+    logs = asyncio.run(get_league_logs(season, concurrency, missing))
+    missing_teams = [team for team, _ in missing]
+    for season_type, (header_row, rows) in logs.items():
+        write_partition(store_dir, season, season_type, header_row, rows, missing_teams)
+    return {season_type: len(rows) for season_type, (_, rows) in logs.items()}, missing_teams
+
+
+def list_partitions(store_dir, seasons=None, season_types=None):
+    """Find the partitions matching seasons and season types.
+
+    Args:
+        store_dir: folder of the store
+        seasons: season numbers to include, or None for all
+        season_types: season types to include, or None for all
+
+    Returns:
+        list of season, season type and partition folder
+    """
+    wanted_seasons = None if seasons is None else {int(season) for season in seasons}
+    partitions = []
+    if not os.path.isdir(store_dir):
+        return partitions
+    for season_dir in sorted(os.listdir(store_dir)):
+        if not season_dir.startswith('season='):
+            continue
+        season = int(season_dir[len('season='):])
+        if wanted_seasons is not None and season not in wanted_seasons:
+            continue
+        for type_dir in sorted(os.listdir(os.path.join(store_dir, season_dir))):
+            if not type_dir.startswith('type=') or type_dir.endswith('.tmp'):
+                continue
+            season_type = type_dir[len('type='):]
+            if season_types is None or season_type in season_types:
+                partitions.append((season, season_type, os.path.join(store_dir, season_dir, type_dir)))
+    return partitions
+
+
+def read_column(partition_dir, column):
+    """Read one stored column without decoding it.
+
+    Args:
+        partition_dir: partition folder
+        column: manifest entry for the column
+
+    Returns:
+        memory mapped array
+    """
+    return np.load(os.path.join(partition_dir, column['file']), mmap_mode='r')
+
+
+def team_mask(manifest, partition_dir, team, home_away):
+    """Select games a team played, at home, away or either.
+
+    Args:
+        manifest: manifest of the partition
+        partition_dir: partition folder
+        team: team name
+        home_away: 'home', 'away' or None for either
+
+    Returns:
+        boolean array of selected games
+    """
+    columns = manifest['columns']
+    names = {'home': ('Home Team',), 'away': ('Away Team',), None: ('Home Team', 'Away Team')}[home_away]
+    mask = None
+    for name in names:
+        categories = manifest['categories'][columns[name]['format']['categories']]
+        codes = read_column(partition_dir, columns[name])
+        selected = codes == categories.index(team) if team in categories else np.zeros(len(codes), dtype=bool)
+        mask = selected if mask is None else mask | selected
+    return mask
+
+
+def query(store_dir=DEFAULT_STORE_DIR, columns=None, seasons=None, season_types=None, team=None, home_away=None, start_date=None, end_date=None):
+    """Read games matching filters, loading only needed partitions and columns.
+
+    Args:
+        store_dir: folder of the store
+        columns: column names to return, or None for all
+        seasons: season numbers to include, or None for all
+        season_types: 'RS', 'PS' or both, or None for both
+        team: only games this team played, or None for every team
+        home_away: with team, 'home' or 'away' to pick a side
+        start_date: first date to include, as 'YYYY-MM-DD'
+        end_date: last date to include, as 'YYYY-MM-DD'
+
+    Returns:
+        dataframe with Season and Season Type followed by the columns
+    """
+    if isinstance(season_types, str):
+        season_types = (season_types,)
+    frames = []
+    for season, season_type, partition_dir in list_partitions(store_dir, seasons, season_types):
+        with open(os.path.join(partition_dir, 'manifest.json')) as manifest_file:
+            manifest = json.load(manifest_file)
+        stored = manifest['columns']
+        mask = np.ones(manifest['rows'], dtype=bool)
+        if start_date is not None or end_date is not None:
+            days = read_column(partition_dir, stored['Date'])
+            mask &= days != game_log.MISSING_DAY
+            if start_date is not None:
+                mask &= days >= np.datetime64(start_date, 'D').astype(np.int32)
+            if end_date is not None:
+                mask &= days <= np.datetime64(end_date, 'D').astype(np.int32)
+        if team is not None:
+            mask &= team_mask(manifest, partition_dir, team, home_away)
+        if not mask.any():
+            continue
+
+        names = list(stored) if columns is None else [name for name in columns if name in stored]
+        frame = game_log.GameLog(
+            names,
+            [np.asarray(read_column(partition_dir, stored[name])[mask]) for name in names],
+            [stored[name]['format'] for name in names],
+            manifest['categories'],
+        ).to_pandas()
+        frame.insert(0, 'Season Type', season_type)
+        frame.insert(0, 'Season', season)
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=['Season', 'Season Type'] + list(columns or []))
+    games = pd.concat(frames, ignore_index=True)
+    for name in game_log.TEAM_COLUMNS | game_log.LABEL_COLUMNS | {'Season Type'}:
+        if name in games.columns:
+            games[name] = games[name].astype('category')
+    return games
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--season', type=int, required=True)
+    parser.add_argument('--last-season', type=int)
+    parser.add_argument('--store-dir', type=str, default=DEFAULT_STORE_DIR)
+    parser.add_argument('--concurrency', type=int, default=team_log_scraper.DEFAULT_CONCURRENCY, help=team_log_scraper.CONCURRENCY_HELP)
+    fetcher.add_arguments(parser)
+    args = parser.parse_args()
+
+    fetcher.configure_from_args(args)
+
+    for season in range(args.season, (args.last_season or args.season) + 1):
+        counts, missing_teams = ingest_season(args.store_dir, season, args.concurrency)
+        print('{season}: {counts}'.format(season=season, counts=counts))
+        if missing_teams:
+            print('{season}: no page for {teams}'.format(season=season, teams=', '.join(missing_teams)))
@@ -0,0 +1,201 @@
+"""Record wall time, rows and bytes for each stage of the pipeline."""
+
+import contextlib
+import cProfile
+import json
+import sys
+import threading
+import time
+
+METRIC_FIELDS = ('calls', 'seconds', 'rows', 'bytes')
+
+recorder = None
+
+
+class Measure:
+    """Rows and bytes handled by one run of a stage."""
+
+    def __init__(self):
+        """Start with nothing counted."""
+        self.rows = 0
+        self.bytes = 0
+
+    def add(self, rows=0, size=0):
+        """Count rows and bytes handled.
+
+        Args:
+            rows: number of rows
+            size: number of bytes
+        """
+        self.rows += rows
+        self.bytes += size
+
+
+class Recorder:
+    """Totals for every stage, safe to update from many threads."""
+
+    def __init__(self):
+        """Start with no stages recorded."""
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def add(self, name, calls=0, seconds=0.0, rows=0, size=0):
+        """Add to the totals for a stage.
+
+        Args:
+            name: stage name
+            calls: number of runs
+            seconds: wall time
+            rows: number of rows
+            size: number of bytes
+        """
+        with self.lock:
+            totals = self.stages.setdefault(name, dict.fromkeys(METRIC_FIELDS, 0))
+            totals['calls'] += calls
+            totals['seconds'] += seconds
+            totals['rows'] += rows
+            totals['bytes'] += size
+
+
+def enable():
+    """Start recording stages in this process, from zero."""
+    global recorder
+    recorder = Recorder()
+
+
+def disable():
+    """Stop recording stages."""
+    global recorder
+    recorder = None
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Time a stage and collect the rows and bytes it reports.
+
+    Args:
+        name: stage name
+
+    Yields:
+        Measure to report rows and bytes to
+    """
+    measure = Measure()
+    if recorder is None:
+        yield measure
+        return
+    start = time.perf_counter()
+    try:
+        yield measure
+    finally:
+        active = recorder
+        if active is not None:
+            active.add(name, 1, time.perf_counter() - start, measure.rows, measure.bytes)
+
+
+def snapshot():
+    """Copy the totals recorded so far.
+
+    Returns:
+        dict of stage name to totals, or None when not recording
+    """
+    if recorder is None:
+        return None
+    with recorder.lock:
+        return {name: dict(totals) for name, totals in recorder.stages.items()}
+
+
+def merge(stages):
+    """Add totals recorded elsewhere, such as in a worker process.
+
+    Args:
+        stages: dict of stage name to totals, or None
+    """
+    if recorder is None or not stages:
+        return
+    for name, totals in stages.items():
+        recorder.add(name, totals['calls'], totals['seconds'], totals['rows'], totals['bytes'])
+
+
+def to_json(stages):
+    """Format totals as JSON.
+
+    Args:
+        stages: dict of stage name to totals
+
+    Returns:
+        JSON text
+    """
+    return json.dumps({'stages': stages}, indent=1, sort_keys=True)
+
+
+def to_prometheus(stages):
+    """Format totals in the Prometheus text exposition format.
+
+    Args:
+        stages: dict of stage name to totals
+
+    Returns:
+        Prometheus text
+    """
+    lines = []
+    for field in METRIC_FIELDS:
+        metric = 'rsvsps_stage_{field}_total'.format(field=field)
+        lines.append('# TYPE {metric} counter'.format(metric=metric))
+        for name in sorted(stages):
+            lines.append('{metric}{{stage="{name}"}} {value}'.format(
+                metric=metric,
+                name=name,
+                value=stages[name][field],
+            ))
+    return '\n'.join(lines) + '\n'
+
+
+REPORT_FORMATS = {'json': to_json, 'prometheus': to_prometheus}
+
+
+def write_report(report_format, fname=None):
+    """Write the totals recorded so far.
+
+    Args:
+        report_format: 'json' or 'prometheus'
+        fname: path to write, or None for standard output
+    """
+    text = REPORT_FORMATS[report_format](snapshot() or {})
+    if fname is None:
+        sys.stdout.write(text)
+        return
+    with open(fname, 'w') as report_file:
+        report_file.write(text)
+
+
+@contextlib.contextmanager
+def profile(fname):
+    """Capture a cProfile of the enclosed code.
+
+    Args:
+        fname: path to dump stats to, or None to skip profiling
+
+    Yields:
+        None
+    """
+    if fname is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(fname)
+
+
+def add_arguments(parser):
+    """Add the metrics and profiling options to a command line parser.
+
+    Args:
+        parser: argparse parser
+    """
+    parser.add_argument('--metrics', type=str, choices=sorted(REPORT_FORMATS))
+    parser.add_argument('--metrics-file', type=str)
+    parser.add_argument('--profile', type=str, help='file to dump cProfile stats to')
@@ -0,0 +1,177 @@
+"""Rank players league-wide by how their stats change in the playoffs.
+
+Every cached player's table goes through the same difference path as the
+player sheets, rsvsps.diff_table, and the rows it pairs are stacked into
+one table with a row per player and season.
+"""
+
+import argparse
+
+import pandas as pd
+
+from rsvsps import rsvsps
+from rsvsps.scrapers import page_cache, player_page_scraper, table_cache
+
+SEASON_PATTERN = r'^\d{4}-\d{2}$'
+SCOPES = ('career', 'season')
+# In per_game tables MP is minutes per game; in the others it is total minutes.
+MINUTES_PER_GAME_TABLE_TYPES = frozenset({'per_game'})
+
+
+def read_cached_tables(cache, table_type):
+    """Build every cached player's table of one type with difference rows.
+
+    Args:
+        cache: table cache
+        table_type: table type
+
+    Returns:
+        dataframe with Player, Group, Season, diff_qualifier and float32
+        stat columns, where Group numbers each player's First, Last and
+        Diff rows that belong together
+    """
+    stats = list(rsvsps.STAT_COLUMNS[table_type])
+    tables = []
+    for player_id, column_headers, combined in cache.iter_tables(table_type):
+        table = rsvsps.diff_table(column_headers, combined, table_type)
+        is_diff = table['diff_qualifier'] == 'Diff'
+        labelled = pd.DataFrame({
+            'Player': player_id,
+            'Group': is_diff.shift(1, fill_value=False).cumsum(),
+            'Season': table['Season'].astype(str).str.strip(),
+            'diff_qualifier': table['diff_qualifier'],
+        })
+        stat_columns = rsvsps.drop_spacer_columns(table).reindex(columns=stats).astype('float32')
+        tables.append(pd.concat([labelled, stat_columns], axis=1))
+    if not tables:
+        return pd.DataFrame(columns=['Player', 'Group', 'Season', 'diff_qualifier'] + stats)
+    return pd.concat(tables, ignore_index=True)
+
+
+def build_deltas(table):
+    """Gather each season's and the career's paired RS, PS and Diff rows.
+
+    The rows are the ones label_diff_rows pairs for the player sheets, so
+    the RS row is the season total for players who switched teams
+    mid-season, and only DIFF_COLUMNS have a difference.
+
+    Args:
+        table: dataframe from read_cached_tables
+
+    Returns:
+        dataframe indexed by Player and Season with RS and PS column groups
+        holding every stat, and a Diff group holding the stats differenced
+    """
+    stats = [column for column in table.columns if column not in ('Player', 'Group', 'Season', 'diff_qualifier')]
+    diff_stats = [column for column in stats if column in rsvsps.DIFF_COLUMNS]
+    first = table[table['diff_qualifier'] == 'First'].set_index(['Player', 'Group'])
+    seasons = first['Season']
+    seasons = seasons[seasons.str.match(SEASON_PATTERN) | (seasons == 'Career')]
+
+    groups = {}
+    for label, qualifier, columns in (('RS', 'First', stats), ('PS', 'Last', stats), ('Diff', 'Diff', diff_stats)):
+        rows = table[table['diff_qualifier'] == qualifier].set_index(['Player', 'Group'])[columns]
+        rows = rows.reindex(seasons.index)
+        rows.index = pd.MultiIndex.from_arrays(
+            [seasons.index.get_level_values('Player'), seasons.to_numpy()], names=['Player', 'Season'])
+        groups[label] = rows
+    return pd.concat(groups, axis=1)
+
+
+def total_minutes(deltas, table_type, label):
+    """Determine total minutes played.
+
+    Args:
+        deltas: dataframe from build_deltas
+        table_type: table type deltas were built from
+        label: 'RS' or 'PS'
+
+    Returns:
+        series of total minutes per player and season
+    """
+    minutes = deltas[(label, 'MP')]
+    if table_type in MINUTES_PER_GAME_TABLE_TYPES:
+        minutes = minutes * deltas[(label, 'G')]
+    return minutes
+
+
+def rank(deltas, table_type, stat, scope='career', min_games=0, min_minutes=0, top=25, ascending=False):
+    """Rank players by the playoff change in one stat.
+
+    Args:
+        deltas: dataframe from build_deltas
+        table_type: table type deltas were built from
+        stat: stat to rank by
+        scope: 'career' for career rows or 'season' for single seasons
+        min_games: fewest playoff games to be ranked
+        min_minutes: fewest playoff minutes to be ranked
+        top: number of players to keep, or None for all
+        ascending: rank biggest drops first instead of biggest gains
+
+    Returns:
+        dataframe of Player, Season, RS, PS and Diff for stat, with playoff
+        games and minutes, best first
+    """
+    if scope not in SCOPES:
+        raise SystemExit('Unknown scope: {0}'.format(scope))
+    if ('Diff', stat) not in deltas.columns:
+        raise SystemExit('No difference is taken for {table_type} stat: {stat}'.format(table_type=table_type, stat=stat))
+    is_career = deltas.index.get_level_values('Season') == 'Career'
+    ps_minutes = total_minutes(deltas, table_type, 'PS')
+    selected = (
+        (is_career if scope == 'career' else ~is_career)
+        & (deltas[('PS', 'G')] >= min_games)
+        & (ps_minutes >= min_minutes)
+        & deltas[('Diff', stat)].notna()
+    )
+    board = pd.DataFrame({
+        'RS': deltas.loc[selected, ('RS', stat)],
+        'PS': deltas.loc[selected, ('PS', stat)],
+        'Diff': deltas.loc[selected, ('Diff', stat)],
+        'PS G': deltas.loc[selected, ('PS', 'G')],
+        'PS MP': ps_minutes[selected],
+    })
+    board = board.sort_values('Diff', ascending=ascending, kind='stable')
+    if top is not None:
+        board = board.head(top)
+    return rsvsps.round_stats(board.reset_index())
+
+
+def main(cache_dir=page_cache.DEFAULT_CACHE_DIR, table_type='per_game', stat='PTS', scope='career', min_games=0, min_minutes=0, top=25, ascending=False):
+    """Rank every cached player by the playoff change in one stat.
+
+    Args:
+        cache_dir: folder of the table cache
+        table_type: table type to rank from
+        stat: stat to rank by
+        scope: 'career' or 'season'
+        min_games: fewest playoff games to be ranked
+        min_minutes: fewest playoff minutes to be ranked
+        top: number of players to keep, or None for all
+        ascending: rank biggest drops first
+
+    Returns:
+        leaderboard dataframe
+    """
+    deltas = build_deltas(read_cached_tables(table_cache.TableCache(cache_dir), table_type))
+    return rank(deltas, table_type, stat, scope, min_games, min_minutes, top, ascending)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cache-dir', type=str, default=page_cache.DEFAULT_CACHE_DIR)
+    parser.add_argument('--table-type', type=str, choices=player_page_scraper.TABLE_TYPES, default='per_game')
+    parser.add_argument('--stat', type=str, default='PTS')
+    parser.add_argument('--scope', type=str, choices=SCOPES, default='career')
+    parser.add_argument('--min-games', type=float, default=0)
+    parser.add_argument('--min-minutes', type=float, default=0)
+    parser.add_argument('--top', type=int, default=25)
+    parser.add_argument('--ascending', action='store_true')
+    parser.add_argument('--output', type=str, help='csv file to write instead of printing')
+    args = parser.parse_args()
+
+    board = main(args.cache_dir, args.table_type, args.stat, args.scope, args.min_games, args.min_minutes, args.top, args.ascending)
+    if args.output:
+        board.to_csv(args.output, index=False)
+    else:
+        print(board.to_string(index=False))
@@ -1,10 +1,125 @@
 """Create excel sheet comparing players Regular Seasons and Post-Seasons."""
 
 import argparse
+import math
+import os
 
 import pandas as pd
-
-from rsvsps.scrapers import player_page_scraper
+import xlsxwriter
+
+from rsvsps import instrumentation
+from rsvsps.scrapers import fetcher, player_index, player_page_scraper, table_cache
+
+COUNTING_STAT_COLUMNS = (
+    'G',
+    'GS',
+    'MP',
+    'FG',
+    'FGA',
+    'FG%',
+    '3P',
+    '3PA',
+    '3P%',
+    '2P',
+    '2PA',
+    '2P%',
+    'eFG%',
+    'FT',
+    'FTA',
+    'FT%',
+    'ORB',
+    'DRB',
+    'TRB',
+    'AST',
+    'STL',
+    'BLK',
+    'TOV',
+    'PF',
+    'PTS',
+    'ORtg',
+    'DRtg',
+)
+ADVANCED_STAT_COLUMNS = (
+    'G',
+    'MP',
+    'PER',
+    'TS%',
+    '3PAr',
+    'FTr',
+    'ORB%',
+    'DRB%',
+    'TRB%',
+    'AST%',
+    'STL%',
+    'BLK%',
+    'TOV%',
+    'USG%',
+    'OWS',
+    'DWS',
+    'WS',
+    'WS/48',
+    'OBPM',
+    'DBPM',
+    'BPM',
+    'VORP',
+)
+STAT_COLUMNS = {
+    'per_game': COUNTING_STAT_COLUMNS,
+    'per_minute': COUNTING_STAT_COLUMNS,
+    'per_poss': COUNTING_STAT_COLUMNS,
+    'advanced': ADVANCED_STAT_COLUMNS,
+}
+LABEL_COLUMNS = ('Season', 'Tm', 'Lg', 'RSPS')
+# Stats on basketball-reference never have more than three decimals.
+STAT_DECIMALS = 3
+DIFF_COLUMNS = frozenset({
+    '"MP',
+    'FG',
+    'FGA',
+    'FG%',
+    '3P',
+    '3PA',
+    '3P%',
+    '2P',
+    '2PA',
+    '2P%',
+    'eFG%',
+    'FT',
+    'FTA',
+    'FT%',
+    'ORB',
+    'DRB',
+    'TRB',
+    'AST',
+    'STL',
+    'BLK',
+    'TOV',
+    'PF',
+    'PTS',
+    'ORtg',
+    'DRtg',
+    'PER',
+    'TS%',
+    '3PAr',
+    'FTr',
+    'ORB%',
+    'DRB%',
+    'TRB%',
+    'AST%',
+    'STL%',
+    'BLK%',
+    'TOV%',
+    'USG%',
+    'OWS',
+    'DWS',
+    'WS',
+    'WS/48',
+    'OBPM',
+    'DBPM',
+    'BPM',
+    'VORP',
+})
+OUTPUT_FORMATS = ('xlsx', 'xlsx-constant-memory', 'csv', 'parquet', 'jsonl')
 
 
 def remove_sorting_column(player_data_list):
@@ -52,6 +167,30 @@ def add_qualifier_col_diff(player_data_list):
     return [[*year, ''] for year in player_data_list]
 
 
+def build_rows(player_data_list, width):
+    """Yield player rows with blank lines for differences in one pass.
+
+    Streaming equivalent of add_blank_lines, remove_sorting_column and
+    add_qualifier_col_diff applied in turn.
+
+    Args:
+        player_data_list: sorted player data list from get_table_data
+        width: number of columns in the finished rows
+
+    Yields:
+        player rows without sorting column, with qualifier, and blank rows
+        for differences
+    """
+    blank_line = [''] * width
+    previous = None
+    for year in player_data_list:
+        if previous is not None and (previous[0] != '') & (year[0] != '') & (previous[-1] != year[-1]):
+            yield list(blank_line)
+        yield [*year[:-1], '']
+        previous = year
+    yield list(blank_line)
+
+
 def create_dataframe(player_data_list, column_headers):
     """Turns the list into a dataframe.
 
@@ -66,84 +205,24 @@ def create_dataframe(player_data_list, column_headers):
 
 
 def dataframe_data_types(dataframe, table_type):
-    """Create column headers for dataframe.
+    """Convert columns to the types declared for the table type.
+
+    Stat columns become float32 and label columns become categorical, one
+    column at a time.
 
     Args:
         dataframe: player dataframe
         table_type: type of table df is for
 
     Returns:
-        Creates column headers for dataframe
+        dataframe with typed columns
     """
-    cols = []
-    if table_type in {'per_game', 'per_minute', 'per_poss'}:
-        possible_columns = [
-            'G',
-            'GS',
-            'MP',
-            'FG',
-            'FGA',
-            'FG%',
-            '3P',
-            '3PA',
-            '3P%',
-            '2P',
-            '2PA',
-            '2P%',
-            'eFG%',
-            'FT',
-            'FTA',
-            'FT%',
-            'ORB',
-            'DRB',
-            'TRB',
-            'AST',
-            'STL',
-            'BLK',
-            'TOV',
-            'PF',
-            'PTS',
-            'ORtg',
-            'DRtg',
-        ]
-        for column in possible_columns:
-            if column in dataframe.columns:
-                cols += [column]
-
-    elif table_type == 'advanced':
-        possible_columns = [
-            'G',
-            'MP',
-            'PER',
-            'TS%',
-            '3PAr',
-            'FTr',
-            'ORB%',
-            'DRB%',
-            'TRB%',
-            'AST%',
-            'STL%',
-            'BLK%',
-            'TOV%',
-            'USG%',
-            'OWS',
-            'DWS',
-            'WS',
-            'WS/48',
-            'OBPM',
-            'DBPM',
-            'BPM',
-            'VORP',
-        ]
-        for column in possible_columns:
-            if column in dataframe.columns:
-                cols += [column]
-
-    dataframe[cols] = dataframe[cols].apply(
-        pd.to_numeric,
-        errors='coerce',
-        axis=1,
-    )
+    for column in STAT_COLUMNS.get(table_type, ()):
+        if column in dataframe.columns:
+            dataframe[column] = pd.to_numeric(dataframe[column], errors='coerce').astype('float32')
+    for column in LABEL_COLUMNS:
+        if column in dataframe.columns:
+            dataframe[column] = dataframe[column].astype('category')
     return dataframe
 
 
@@ -208,55 +287,8 @@ def get_differences(dataframe):
     Returns:
         dataframe with RS, PS, and differences
     """
-    diff_columns = frozenset({
-       '"MP',
-       'FG',
-       'FGA',
-       'FG%',
-       '3P',
-       '3PA',
-       '3P%',
-       '2P',
-       '2PA',
-       '2P%',
-       'eFG%',
-       'FT',
-       'FTA',
-       'FT%',
-       'ORB',
-       'DRB',
-       'TRB',
-       'AST',
-       'STL',
-       'BLK',
-       'TOV',
-       'PF',
-       'PTS',
-       'ORtg',
-       'DRtg',
-       'PER',
-       'TS%',
-       '3PAr',
-       'FTr',
-       'ORB%',
-       'DRB%',
-       'TRB%',
-       'AST%',
-       'STL%',
-       'BLK%',
-       'TOV%',
-       'USG%',
-       'OWS',
-       'DWS',
-       'WS',
-       'WS/48',
-       'OBPM',
-       'DBPM',
-       'BPM',
-       'VORP',
-    })
     curr_cols = frozenset(dataframe.columns)
-    curr_cols_to_diff = list(curr_cols.intersection(diff_columns))
+    curr_cols_to_diff = list(curr_cols.intersection(DIFF_COLUMNS))
     first = {}
     last = {}
     diff = {}
@@ -281,6 +313,61 @@ def get_differences(dataframe):
     return dataframe
 
 
+def label_diff_rows(dataframe):
+    """Label First, Last and Diff rows for every season at once.
+
+    Column-wise equivalent of determine_rows_to_fill followed by
+    remove_extra_first_last.
+
+    Args:
+        dataframe: dataframe with RS and PS data
+
+    Returns:
+        dataframe with RS and PS identifiers
+    """
+    is_diff = dataframe['RSPS'] == ''
+    is_first = ~is_diff & is_diff.shift(1, fill_value=True)
+    is_last = ~is_diff & is_diff.shift(-1, fill_value=False) & (dataframe['RSPS'] == 'PS')
+    is_first &= ~is_last
+
+    group = is_diff.shift(1, fill_value=False).cumsum()
+    balanced = is_first.groupby(group).transform('sum') == is_last.groupby(group).transform('sum')
+
+    qualifier = pd.Series('', index=dataframe.index, dtype=object)
+    qualifier[is_first & balanced] = 'First'
+    qualifier[is_last & balanced] = 'Last'
+    qualifier[is_diff & balanced] = 'Diff'
+    dataframe['diff_qualifier'] = qualifier
+    return dataframe
+
+
+def fill_differences(dataframe):
+    """Calculate differences between RS and PS for every season at once.
+
+    Column-wise equivalent of get_differences.
+
+    Args:
+        dataframe: dataframe with RS and PS identifiers
+
+    Returns:
+        dataframe with RS, PS, and differences
+    """
+    cols_to_diff = [col for col in dataframe.columns if col in DIFF_COLUMNS]
+    qualifier = dataframe['diff_qualifier']
+    is_diff = qualifier == 'Diff'
+    if not cols_to_diff or not is_diff.any():
+        return dataframe
+
+    group = is_diff.shift(1, fill_value=False).cumsum()
+    is_first = qualifier == 'First'
+    is_last = qualifier == 'Last'
+    first = dataframe.loc[is_first, cols_to_diff].set_axis(group[is_first])
+    last = dataframe.loc[is_last, cols_to_diff].set_axis(group[is_last])
+    differences = last - first
+    dataframe.loc[is_diff, cols_to_diff] = differences.loc[group[is_diff]].to_numpy()
+    return dataframe
+
+
 def remove_diff_qualifier_column(dataframe):
     """Remove diff_qualifier column.
 
@@ -293,65 +380,293 @@ def remove_diff_qualifier_column(dataframe):
     return dataframe.iloc[:, :-1]
 
 
-def player_single_table_type(column_headers, combined, table_type):
+def diff_table(column_headers, combined, table_type):
+    """Build a table with difference rows, still labelled for pairing.
+
+    Args:
+        column_headers: column headers for table type
+        combined: combined RS and PS rows
+        table_type: table type
+
+    Returns:
+        dataframe of RS, PS and difference rows, with diff_qualifier
+        marking the First and Last row each Diff row is taken from
+    """
+    combined = build_rows(combined, len(column_headers))
+    combined = create_dataframe(combined, column_headers)
+    combined = dataframe_data_types(combined, table_type)
+    combined = label_diff_rows(combined)
+    return fill_differences(combined)
+
+
+def player_single_table_type(column_headers, combined, table_type, reference=False):
     """Get specific single table for player.
 
     Args:
         player_id: player id to get table for
         table_type: table type to get info about
+        reference: use the list and row by row functions instead of the
+            streaming and column-wise ones, used to check the two agree
 
     Returns:
         dataframe of RS and PS data with comparisons
     """
     if (column_headers, combined) == (None, None):
         return None
-    combined = add_blank_lines(combined)
-    combined = remove_sorting_column(combined)
-    combined = add_qualifier_col_diff(combined)
-    combined = create_dataframe(combined, column_headers)
-    combined = dataframe_data_types(combined, table_type)
-    combined = determine_rows_to_fill(combined)
-    combined = remove_extra_first_last(combined)
-    combined = get_differences(combined)
-    return remove_diff_qualifier_column(combined)
+    with instrumentation.stage('player.diff') as measure:
+        if reference:
+            combined = add_blank_lines(combined)
+            combined = remove_sorting_column(combined)
+            combined = add_qualifier_col_diff(combined)
+            combined = create_dataframe(combined, column_headers)
+            combined = dataframe_data_types(combined, table_type)
+            combined = determine_rows_to_fill(combined)
+            combined = remove_extra_first_last(combined)
+            combined = get_differences(combined)
+        else:
+            combined = diff_table(column_headers, combined, table_type)
+        combined = remove_diff_qualifier_column(combined)
+        measure.add(rows=len(combined))
+        return combined
+
+
+def player_tables(player_data):
+    """Build the RS vs PS table for every table type.
 
+    Args:
+        player_data: column headers and combined data for each table type,
+            as returned by player_page_scraper.get_player_data
 
-def main(player_id):
-    """Get player rsvsps data from player ID.
+    Returns:
+        dict of table type to dataframe, or None for missing tables
+    """
+    return {
+        table_type: player_single_table_type(column_headers, combined, table_type)
+        for table_type, (column_headers, combined) in zip(player_page_scraper.TABLE_TYPES, player_data)
+    }
+
+
+def round_stats(table):
+    """Widen float32 stats for output without float32 rounding noise.
 
     Args:
-        player_id: string that is player ID.
+        table: dataframe with float32 stat columns
+
+    Returns:
+        dataframe with float64 stat columns rounded to STAT_DECIMALS
+    """
+    float32_columns = [column for column, dtype in table.dtypes.items() if dtype == 'float32']
+    if not float32_columns:
+        return table
+    table = table.astype({column: 'float64' for column in float32_columns})
+    return table.round({column: STAT_DECIMALS for column in float32_columns})
+
+
+def measure_output(measure, tables, fnames):
+    """Count the rows and bytes written for the tables.
+
+    Args:
+        measure: instrumentation measure for the write stage
+        tables: dict of table type to dataframe
+        fnames: paths of the files written
+    """
+    measure.add(
+        rows=sum(len(table) for table in tables.values() if table is not None),
+        size=sum(os.path.getsize(fname) for fname in fnames),
+    )
+
+
+def write_excel_sheets(target, tables):
+    """Write each table to its own sheet of an excel workbook.
+
+    Args:
+        target: path or binary file object to write the workbook to
+        tables: dict of table type to dataframe
 
     Returns:
-        An excel file with player data.
+        excel writer for the workbook written
     """
+    with pd.ExcelWriter(target, engine='xlsxwriter') as writer:
+        for table_type, table in tables.items():
+            if table is not None:
+                round_stats(table).to_excel(writer, sheet_name=table_type)
+    return writer
+
+
+def write_excel(player_id, tables):
+    """Write each table to its own sheet of the player's excel file.
 
-    (
-        (per_game_column_headers, per_game_combined),
-        (per_minute_column_headers, per_minute_combined),
-        (per_poss_column_headers, per_poss_combined),
-        (advanced_column_headers, advanced_combined),
-    ) = player_page_scraper.main(player_id, 'all')
-    per_game = player_single_table_type(per_game_column_headers, per_game_combined, 'per_game')
-    per_minute = player_single_table_type(per_minute_column_headers, per_minute_combined, 'per_minute')
-    per_poss = player_single_table_type(per_poss_column_headers, per_poss_combined, 'per_poss')
-    advanced = player_single_table_type(advanced_column_headers, advanced_combined, 'advanced')
-
-
-    with pd.ExcelWriter('output/{player}.xlsx'.format(player=player_id), engine='xlsxwriter') as writer:
-        if per_game is not None:
-            per_game.to_excel(writer, sheet_name='per_game')
-        if per_game is not None:
-            per_minute.to_excel(writer, sheet_name='per_minute')
-        if per_poss is not None:
-            per_poss.to_excel(writer, sheet_name='per_poss')
-        if advanced is not None:
-            advanced.to_excel(writer, sheet_name='advanced')
+    Args:
+        player_id: string that is player ID.
+        tables: dict of table type to dataframe
+
+    Returns:
+        excel writer for the file written
+    """
+    fname = 'output/{player}.xlsx'.format(player=player_id)
+    with instrumentation.stage('write.xlsx') as measure:
+        writer = write_excel_sheets(fname, tables)
+        measure_output(measure, tables, [fname])
     return writer
 
 
+def excel_cell(value):
+    """Convert a dataframe value to something xlsxwriter can write.
+
+    Args:
+        value: dataframe value
+
+    Returns:
+        value, with missing numbers as None for a blank cell
+    """
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def write_excel_constant_memory(player_id, tables):
+    """Write the player's excel file one row at a time.
+
+    xlsxwriter's constant memory mode only keeps the current row, so rows
+    are written in order here rather than through to_excel, which writes
+    column by column. The layout matches write_excel.
+
+    Args:
+        player_id: string that is player ID.
+        tables: dict of table type to dataframe
+
+    Returns:
+        path of the file written
+    """
+    fname = 'output/{player}.xlsx'.format(player=player_id)
+    with instrumentation.stage('write.xlsx-constant-memory') as measure:
+        workbook = xlsxwriter.Workbook(fname, {'constant_memory': True})
+        header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center'})
+        for table_type, table in tables.items():
+            if table is None:
+                continue
+            worksheet = workbook.add_worksheet(table_type)
+            worksheet.write_row(0, 1, [str(column) for column in table.columns], header_format)
+            for row_num, row in enumerate(round_stats(table).itertuples(name=None), start=1):
+                worksheet.write(row_num, 0, row[0], header_format)
+                worksheet.write_row(row_num, 1, [excel_cell(value) for value in row[1:]])
+        workbook.close()
+        measure_output(measure, tables, [fname])
+    return fname
+
+
+def drop_spacer_columns(table):
+    """Drop the blank spacer columns basketball-reference puts in tables.
+
+    Args:
+        table: dataframe for table type
+
+    Returns:
+        dataframe with unique, named columns
+    """
+    return table.loc[:, table.columns != '']
+
+
+def write_table_files(player_id, tables, output_format):
+    """Write each table to its own file for pipelines.
+
+    Args:
+        player_id: string that is player ID.
+        tables: dict of table type to dataframe
+        output_format: 'csv', 'parquet' or 'jsonl'
+
+    Returns:
+        list of paths of the files written
+    """
+    fnames = []
+    with instrumentation.stage('write.{0}'.format(output_format)) as measure:
+        for table_type, table in tables.items():
+            if table is None:
+                continue
+            table = drop_spacer_columns(round_stats(table))
+            fname = 'output/{player}_{table_type}.{extension}'.format(
+                player=player_id,
+                table_type=table_type,
+                extension=output_format,
+            )
+            if output_format == 'csv':
+                table.to_csv(fname, index=False)
+            elif output_format == 'parquet':
+                table.to_parquet(fname, index=False)
+            else:
+                table.to_json(fname, orient='records', lines=True)
+            fnames.append(fname)
+        measure_output(measure, tables, fnames)
+    return fnames
+
+
+def write_output(player_id, tables, output_format='xlsx'):
+    """Write the player's tables in the chosen format.
+
+    Args:
+        player_id: string that is player ID.
+        tables: dict of table type to dataframe
+        output_format: one of OUTPUT_FORMATS
+
+    Returns:
+        excel writer for xlsx, otherwise path or paths of the files written
+    """
+    if output_format == 'xlsx':
+        return write_excel(player_id, tables)
+    if output_format == 'xlsx-constant-memory':
+        return write_excel_constant_memory(player_id, tables)
+    if output_format in OUTPUT_FORMATS:
+        return write_table_files(player_id, tables, output_format)
+    raise SystemExit('Unknown output format: {0}'.format(output_format))
+
+
+def process_player_page(player_id, player_page, output_format='xlsx'):
+    """Build and write the output from a downloaded player page.
+
+    Args:
+        player_id: string that is player ID.
+        player_page: raw HTML of player page
+        output_format: one of OUTPUT_FORMATS
+
+    Returns:
+        The output written with player data.
+    """
+    player_data = player_page_scraper.get_player_data_from_page(player_id, player_page, 'all')
+    return write_output(player_id, player_tables(player_data), output_format)
+
+
+def main(player_id, output_format='xlsx'):
+    """Get player rsvsps data from player ID.
+
+    Args:
+        player_id: string that is player ID.
+        output_format: one of OUTPUT_FORMATS
+
+    Returns:
+        An excel file, or other output, with player data.
+    """
+    player_data = player_page_scraper.main(player_id, 'all')
+    return write_output(player_id, player_tables(player_data), output_format)
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--player', type=str)
+    parser.add_argument('--name', type=str, help='player name to look up in the player index')
+    parser.add_argument('--index-file', type=str, default=player_index.DEFAULT_INDEX_FILE)
+    parser.add_argument('--output-format', type=str, choices=OUTPUT_FORMATS, default='xlsx')
+    fetcher.add_arguments(parser)
+    instrumentation.add_arguments(parser)
     args = parser.parse_args()
-    main(args.player)
+    fetcher.configure_from_args(args)
+    table_cache.configure_from_args(args)
+
+    if args.metrics:
+        instrumentation.enable()
+    player_id = args.player
+    if args.name:
+        player_id = player_index.load(args.index_file).resolve(args.name)
+    with instrumentation.profile(args.profile):
+        main(player_id, args.output_format)
+    if args.metrics:
+        instrumentation.write_report(args.metrics, args.metrics_file)
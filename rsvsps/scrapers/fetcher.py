@@ -0,0 +1,224 @@
+"""Shared HTTP session and rate limit for requests to basketball-reference."""
+
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rsvsps.scrapers import page_archive, page_cache
+
+DEFAULT_REQUESTS_PER_MINUTE = 20
+DEFAULT_BURST = 1
+POOL_SIZE = 10
+
+
+class TokenBucket:
+    """Token bucket that blocks callers to stay within a request rate."""
+
+    def __init__(self, requests_per_minute, burst):
+        """Start with a full bucket.
+
+        Raises:
+            SystemExit: rate or burst is not positive
+
+        Args:
+            requests_per_minute: long run number of requests allowed per minute
+            burst: most requests allowed back to back
+        """
+        if requests_per_minute <= 0:
+            raise SystemExit('Requests per minute must be positive, not {0}'.format(requests_per_minute))
+        if burst < 1:
+            raise SystemExit('Burst must be at least 1, not {0}'.format(burst))
+        self.rate = requests_per_minute / 60
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, sleeping until one is available."""
+        # The lock is held while sleeping on purpose: waiting callers queue
+        # on it and leave one token interval apart, in the order they came.
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                time.sleep((1 - self.tokens) / self.rate)
+                self.tokens = 1
+                self.updated = time.monotonic()
+            self.tokens -= 1
+
+
+limiter = TokenBucket(DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_BURST)
+cache = None
+archive = None
+archive_mode = None
+session = None
+session_pid = None
+session_lock = threading.Lock()
+
+
+def configure(requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, burst=DEFAULT_BURST):
+    """Set the rate limit shared by every request in this process.
+
+    Raises:
+        SystemExit: rate or burst is not positive
+
+    Args:
+        requests_per_minute: long run number of requests allowed per minute,
+            or None for no limit
+        burst: most requests allowed back to back
+    """
+    global limiter
+    limiter = None if requests_per_minute is None else TokenBucket(requests_per_minute, burst)
+
+
+def configure_cache(directory=page_cache.DEFAULT_CACHE_DIR, max_bytes=page_cache.DEFAULT_MAX_BYTES):
+    """Keep downloaded pages in an on-disk cache.
+
+    Args:
+        directory: folder for the cache, or None to turn the cache off
+        max_bytes: most compressed bytes kept in the cache
+    """
+    global cache
+    cache = None if directory is None else page_cache.PageCache(directory, max_bytes)
+
+
+def configure_archive(path, mode='record'):
+    """Record every page fetched to an archive, or serve pages from one.
+
+    Args:
+        path: path of the archive file, or None to turn the archive off
+        mode: 'record' to add fetched pages to the archive, or 'replay' to
+            serve pages only from the archive and never touch the site
+    """
+    global archive, archive_mode
+    if mode not in page_archive.ARCHIVE_MODES:
+        raise SystemExit('Unknown archive mode: {0}'.format(mode))
+    archive = None if path is None else page_archive.PageArchive(path)
+    archive_mode = mode
+
+
+def add_arguments(parser):
+    """Add the rate limit, cache and archive options to a command line parser.
+
+    Args:
+        parser: argparse parser
+    """
+    parser.add_argument('--requests-per-minute', type=float, default=DEFAULT_REQUESTS_PER_MINUTE)
+    parser.add_argument('--burst', type=int, default=DEFAULT_BURST)
+    parser.add_argument('--cache-dir', type=str)
+    parser.add_argument('--cache-max-bytes', type=int, default=page_cache.DEFAULT_MAX_BYTES)
+    parser.add_argument('--archive', type=str, help='page archive file to record to or replay from')
+    parser.add_argument('--archive-mode', type=str, choices=page_archive.ARCHIVE_MODES, default='record')
+
+
+def configure_from_args(args):
+    """Apply the options added by add_arguments.
+
+    Args:
+        args: parsed command line arguments
+    """
+    configure(args.requests_per_minute, args.burst)
+    configure_cache(args.cache_dir, args.cache_max_bytes)
+    configure_archive(args.archive, args.archive_mode)
+
+
+def worker_settings(workers):
+    """Describe the rate limit, cache and archive for worker processes.
+
+    Workers started with spawn or forkserver do not inherit this module's
+    setup, so it is handed to them and applied with configure_worker. The
+    rate limit is split between the workers so together they keep to it.
+
+    Args:
+        workers: number of worker processes
+
+    Returns:
+        dict of settings for configure_worker
+    """
+    return {
+        'requests_per_minute': None if limiter is None else limiter.rate * 60 / workers,
+        'burst': 1 if limiter is None else max(1, limiter.capacity // workers),
+        'cache_dir': None if cache is None else os.path.dirname(cache.path),
+        'cache_max_bytes': page_cache.DEFAULT_MAX_BYTES if cache is None else cache.max_bytes,
+        'archive': None if archive is None else archive.path,
+        'archive_mode': archive_mode or 'record',
+    }
+
+
+def configure_worker(settings):
+    """Apply settings from worker_settings in a worker process.
+
+    Args:
+        settings: dict from worker_settings
+    """
+    configure(settings['requests_per_minute'], settings['burst'])
+    configure_cache(settings['cache_dir'], settings['cache_max_bytes'])
+    configure_archive(settings['archive'], settings['archive_mode'])
+
+
+def get_session():
+    """Get the keep-alive session for this process.
+
+    A new session is made after a fork so child processes never share
+    connections with their parent.
+
+    Returns:
+        pooled requests session
+    """
+    global session, session_pid
+    with session_lock:
+        if session is None or session_pid != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session_pid = os.getpid()
+        return session
+
+
+def request(url, headers=None, timeout=None):
+    """Request a page from the site through the shared session and rate limit.
+
+    Args:
+        url: URL to request
+        headers: extra request headers
+        timeout: seconds to wait for the server, or None to wait forever
+
+    Returns:
+        response for url
+    """
+    if limiter is not None:
+        limiter.acquire()
+    return get_session().get(url, headers=headers, timeout=timeout)
+
+
+def get(url, timeout=None):
+    """Get a page, from the page cache when it is turned on.
+
+    When replaying an archive the page comes only from the archive, and when
+    recording one the page is added to it.
+
+    Raises:
+        SystemExit: replaying and url is not in the archive
+
+    Args:
+        url: URL to request
+        timeout: seconds to wait for the server, or None to wait forever
+
+    Returns:
+        response for url
+    """
+    if archive is not None and archive_mode == 'replay':
+        return archive.replay(url)
+    if cache is None:
+        response = request(url, timeout=timeout)
+    else:
+        response = cache.get(url, lambda cache_url, headers: request(cache_url, headers, timeout))
+    if archive is not None:
+        archive.store(url, response)
+    return response
@@ -0,0 +1,135 @@
+"""Archive of fetched pages for reprocessing them later without the site."""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+import requests
+
+ARCHIVE_MODES = ('record', 'replay')
+PLAYER_URL = re.compile(r'/players/./(\w+)\.html$')
+
+
+class PageArchive:
+    """Every response fetched, compressed in a single sqlite file.
+
+    Unlike the page cache nothing expires or is evicted, and failed
+    responses are kept too, so replaying gives exactly what was recorded.
+    """
+
+    def __init__(self, path):
+        """Open or create the archive.
+
+        Args:
+            path: path of the archive file
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = None
+        self.connection_pid = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def connect(self):
+        """Get the connection for this process.
+
+        Returns:
+            sqlite connection
+        """
+        if self.connection is None or self.connection_pid != os.getpid():
+            self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS pages ('
+                'url TEXT PRIMARY KEY, status INTEGER, encoding TEXT, body BLOB, fetched REAL)'
+            )
+            self.connection_pid = os.getpid()
+        return self.connection
+
+    def store(self, url, response):
+        """Record a response, replacing any earlier one for the URL.
+
+        Args:
+            url: URL requested
+            response: response for url
+        """
+        body = zlib.compress(response.content, 9)
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)',
+                    (url, response.status_code, response.encoding, body, time.time()),
+                )
+
+    def lookup(self, url):
+        """Rebuild a recorded response.
+
+        Args:
+            url: URL requested
+
+        Returns:
+            response as recorded, or None if url was never recorded
+        """
+        with self.lock:
+            row = self.connect().execute(
+                'SELECT status, encoding, body FROM pages WHERE url = ?',
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        status, encoding, body = row
+        response = requests.models.Response()
+        response.url = url
+        response.status_code = status
+        response._content = zlib.decompress(body)
+        response.encoding = encoding
+        return response
+
+    def replay(self, url):
+        """Serve a recorded response.
+
+        Raises:
+            SystemExit: url was never recorded
+
+        Args:
+            url: URL requested
+
+        Returns:
+            response as recorded
+        """
+        response = self.lookup(url)
+        if response is None:
+            raise SystemExit('Page not in archive: {url}'.format(url=url))
+        return response
+
+    def urls(self, status=None):
+        """List the URLs recorded.
+
+        Args:
+            status: only URLs recorded with this HTTP status, or None for all
+
+        Returns:
+            sorted list of URLs
+        """
+        with self.lock:
+            rows = self.connect().execute(
+                'SELECT url FROM pages WHERE ? IS NULL OR status = ? ORDER BY url',
+                (status, status),
+            ).fetchall()
+        return [url for url, in rows]
+
+
+def player_ids(archive):
+    """List the players whose pages were recorded successfully.
+
+    Args:
+        archive: page archive
+
+    Returns:
+        list of player IDs
+    """
+    return [match.group(1) for match in map(PLAYER_URL.search, archive.urls(200)) if match is not None]
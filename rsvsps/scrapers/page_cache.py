@@ -0,0 +1,226 @@
+"""On-disk cache of downloaded pages with revalidation and LRU eviction."""
+
+import datetime
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+import requests
+
+DEFAULT_CACHE_DIR = 'cache'
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+PAGE_TTL = 24 * 60 * 60
+CURRENT_SEASON_TTL = 60 * 60
+TEAM_SEASON_URL = re.compile(r'/teams/[^/]+/(\d{4})/')
+
+
+def current_season(today=None):
+    """Determine the season currently being played or next to be played.
+
+    Seasons are named by the year they end in, and end by July.
+
+    Args:
+        today: date to check, defaults to today
+
+    Returns:
+        season number
+    """
+    today = today or datetime.date.today()
+    return today.year + 1 if today.month >= 7 else today.year
+
+
+def ttl_for_url(url, today=None):
+    """Determine how long a page may be used without asking the site again.
+
+    Args:
+        url: URL of page
+        today: date to check, defaults to today
+
+    Returns:
+        seconds the page stays fresh, or None if it never changes
+    """
+    match = TEAM_SEASON_URL.search(url)
+    if match is None:
+        return PAGE_TTL
+    if int(match.group(1)) < current_season(today):
+        return None
+    return CURRENT_SEASON_TTL
+
+
+def build_response(url, body, encoding):
+    """Make a response for a page served from the cache.
+
+    Args:
+        url: URL of page
+        body: raw bytes of page
+        encoding: text encoding of page
+
+    Returns:
+        response with status 200 and the cached body
+    """
+    response = requests.models.Response()
+    response.url = url
+    response.status_code = 200
+    response.reason = 'OK'
+    response._content = body
+    response.encoding = encoding
+    return response
+
+
+class PageCache:
+    """Compressed page bodies and validators stored in a sqlite file."""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        """Open or create the cache.
+
+        Args:
+            directory: folder holding the cache file
+            max_bytes: most compressed bytes kept before evicting least
+                recently used pages
+        """
+        self.path = os.path.join(directory, 'pages.sqlite')
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.connection = None
+        self.connection_pid = None
+        os.makedirs(directory, exist_ok=True)
+
+    def connect(self):
+        """Get the connection for this process.
+
+        Returns:
+            sqlite connection
+        """
+        if self.connection is None or self.connection_pid != os.getpid():
+            self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS pages ('
+                'url TEXT PRIMARY KEY, body BLOB, encoding TEXT, etag TEXT, last_modified TEXT, '
+                'expires REAL, used REAL, size INTEGER)'
+            )
+            self.connection.execute('CREATE INDEX IF NOT EXISTS pages_used ON pages (used)')
+            self.connection_pid = os.getpid()
+        return self.connection
+
+    def lookup(self, url):
+        """Find a cached page and mark it as recently used.
+
+        Args:
+            url: URL of page
+
+        Returns:
+            dict with body, encoding, validators and freshness, or None
+        """
+        with self.lock:
+            connection = self.connect()
+            row = connection.execute(
+                'SELECT body, encoding, etag, last_modified, expires FROM pages WHERE url = ?',
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            with connection:
+                connection.execute('UPDATE pages SET used = ? WHERE url = ?', (now, url))
+        body, encoding, etag, last_modified, expires = row
+        return {
+            'body': zlib.decompress(body),
+            'encoding': encoding,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fresh': expires is None or expires > now,
+        }
+
+    def store(self, url, response):
+        """Save a downloaded page, evicting old pages to stay within budget.
+
+        Args:
+            url: URL of page
+            response: successful response for url
+        """
+        body = zlib.compress(response.content)
+        ttl = ttl_for_url(url)
+        now = time.time()
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (
+                        url,
+                        body,
+                        response.encoding,
+                        response.headers.get('ETag'),
+                        response.headers.get('Last-Modified'),
+                        None if ttl is None else now + ttl,
+                        now,
+                        len(body),
+                    ),
+                )
+                self.evict(connection)
+
+    def refresh(self, url):
+        """Start a new freshness period for a page the site says is unchanged.
+
+        Args:
+            url: URL of page
+        """
+        ttl = ttl_for_url(url)
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                connection.execute(
+                    'UPDATE pages SET expires = ? WHERE url = ?',
+                    (None if ttl is None else time.time() + ttl, url),
+                )
+
+    def evict(self, connection):
+        """Delete least recently used pages until within the byte budget.
+
+        Args:
+            connection: sqlite connection inside a transaction
+        """
+        total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for url, size in connection.execute('SELECT url, size FROM pages ORDER BY used').fetchall():
+            connection.execute('DELETE FROM pages WHERE url = ?', (url,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def get(self, url, fetch):
+        """Serve a page from the cache, asking the site only when needed.
+
+        Stale pages are revalidated with If-None-Match and If-Modified-Since,
+        so an unchanged page costs a 304 instead of a full download.
+
+        Args:
+            url: URL of page
+            fetch: function taking url and request headers, returning a
+                response from the site
+
+        Returns:
+            response for url
+        """
+        entry = self.lookup(url)
+        if entry is not None and entry['fresh']:
+            return build_response(url, entry['body'], entry['encoding'])
+
+        headers = {}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        response = fetch(url, headers)
+
+        if response.status_code == 304 and entry is not None:
+            self.refresh(url)
+            return build_response(url, entry['body'], entry['encoding'])
+        if response.status_code == 200:
+            self.store(url, response)
+        return response
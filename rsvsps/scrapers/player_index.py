@@ -0,0 +1,368 @@
+"""Local index of player IDs built from the site's player directory.
+
+The directory has one page per letter of players' last names. The index
+keeps each player's ID, name, first and last season and whether they are
+active, plus a normalized search key, in a small gzipped JSON file.
+"""
+
+import argparse
+import bisect
+import collections
+import difflib
+import gzip
+import json
+import os
+import re
+import string
+import unicodedata
+
+from lxml import etree
+
+from rsvsps.scrapers import fetcher, page_cache, table_extractor
+
+DEFAULT_INDEX_FILE = os.path.join(page_cache.DEFAULT_CACHE_DIR, 'players.json.gz')
+INDEX_VERSION = 1
+NON_ALPHANUMERIC = re.compile(r'[^a-z0-9]+')
+FUZZY_CUTOFF = 0.75
+PLAYER_CELLS = etree.XPath('.//tr/th[@data-stat="player" and @data-append-csv]')
+# Active players' names are in bold.
+ACTIVE_MARK = etree.XPath('.//strong')
+# Names sharing the most trigrams with a query are the only ones scored.
+FUZZY_CANDIDATES = 20
+
+
+def determine_directory_url(letter):
+    """Determine the URL of the directory page for a letter.
+
+    Args:
+        letter: first letter of players' last names
+
+    Returns:
+        URL of directory page
+    """
+    return 'https://www.basketball-reference.com/players/{letter}/'.format(letter=letter)
+
+
+def normalize(name):
+    """Make a search key from a name.
+
+    Accents, case and punctuation are dropped, so 'Dražen Petrović' and
+    'drazen petrovic' give the same key.
+
+    Args:
+        name: player name or search text
+
+    Returns:
+        lower case ASCII words separated by single spaces
+    """
+    decomposed = unicodedata.normalize('NFKD', name)
+    ascii_name = decomposed.encode('ascii', 'ignore').decode().lower()
+    return NON_ALPHANUMERIC.sub(' ', ascii_name.replace("'", '')).strip()
+
+
+def trigrams(key):
+    """Split a search key into overlapping three letter pieces.
+
+    Args:
+        key: search key
+
+    Returns:
+        set of trigrams, with word boundaries marked by spaces
+    """
+    padded = ' {key} '.format(key=key)
+    return {padded[position:position + 3] for position in range(len(padded) - 2)}
+
+
+def parse_directory_page(directory_page):
+    """Read the players listed on a directory page.
+
+    Args:
+        directory_page: raw HTML of directory page
+
+    Returns:
+        list of player ID, name, first season, last season and active flag
+    """
+    table = table_extractor.extract_tables(directory_page, ('players',)).get('players')
+    if table is None:
+        return []
+    players = []
+    for cell in PLAYER_CELLS(table):
+        row = cell.getparent()
+        first_season = row.findtext('td[@data-stat="year_min"]', '')
+        last_season = row.findtext('td[@data-stat="year_max"]', '')
+        players.append((
+            cell.get('data-append-csv'),
+            cell.text_content().rstrip('*').strip(),
+            int(first_season) if first_season.isdigit() else None,
+            int(last_season) if last_season.isdigit() else None,
+            bool(ACTIVE_MARK(cell)),
+        ))
+    return players
+
+
+def scrape_directory():
+    """Download every letter of the player directory.
+
+    Letters with no page are skipped.
+
+    Returns:
+        list of player ID, name, first season, last season and active flag
+    """
+    players = []
+    for letter in string.ascii_lowercase:
+        response = fetcher.get(determine_directory_url(letter))
+        if response.status_code == 404:
+            continue
+        response.raise_for_status()
+        players.extend(parse_directory_page(response.text))
+    return players
+
+
+class PlayerIndex:
+    """Players held column-wise with a sorted word list for prefix search."""
+
+    def __init__(self, player_ids, names, first_seasons, last_seasons, active, keys=None):
+        """Index players.
+
+        Args:
+            player_ids: player IDs
+            names: display names
+            first_seasons: first season played, or None
+            last_seasons: last season played, or None
+            active: whether each player is active
+            keys: search keys, computed from names when not given
+        """
+        self.player_ids = list(player_ids)
+        self.names = list(names)
+        self.first_seasons = list(first_seasons)
+        self.last_seasons = list(last_seasons)
+        self.active = list(active)
+        self.keys = list(keys) if keys is not None else [normalize(name) for name in self.names]
+        self.rows_by_id = {player_id: row for row, player_id in enumerate(self.player_ids)}
+        self.words = sorted(
+            (word, row)
+            for row, key in enumerate(self.keys)
+            for word in key.split()
+        )
+        self.trigram_rows = None
+
+    @classmethod
+    def from_players(cls, players):
+        """Index the players read from directory pages.
+
+        Args:
+            players: list of player ID, name, first season, last season and
+                active flag
+
+        Returns:
+            player index
+        """
+        players = sorted(players)
+        return cls(*(zip(*players) if players else ((),) * 5))
+
+    def __len__(self):
+        """Count indexed players."""
+        return len(self.player_ids)
+
+    def describe(self, row):
+        """Describe one indexed player.
+
+        Args:
+            row: position of player in the index
+
+        Returns:
+            dict with id, name, first and last season and active flag
+        """
+        return {
+            'id': self.player_ids[row],
+            'name': self.names[row],
+            'from': self.first_seasons[row],
+            'to': self.last_seasons[row],
+            'active': self.active[row],
+        }
+
+    def prefix_rows(self, word):
+        """Find players with a name word starting with word.
+
+        Args:
+            word: normalized word
+
+        Returns:
+            set of rows
+        """
+        start = bisect.bisect_left(self.words, (word,))
+        end = bisect.bisect_left(self.words, (word + '\x7f',))
+        return {row for _, row in self.words[start:end]}
+
+    def fuzzy_rows(self, key, limit):
+        """Find players whose names are close to a misspelt key.
+
+        Names are shortlisted by shared trigrams and only the shortlist is
+        scored, so this stays fast for the whole directory.
+
+        Args:
+            key: normalized query
+            limit: most rows returned
+
+        Returns:
+            list of rows, closest first
+        """
+        if self.trigram_rows is None:
+            self.trigram_rows = collections.defaultdict(list)
+            for row, row_key in enumerate(self.keys):
+                for trigram in trigrams(row_key):
+                    self.trigram_rows[trigram].append(row)
+        shared = collections.Counter()
+        for trigram in trigrams(key):
+            shared.update(self.trigram_rows.get(trigram, ()))
+        scored = []
+        matcher = difflib.SequenceMatcher(b=key)
+        for row, _ in shared.most_common(FUZZY_CANDIDATES):
+            matcher.set_seq1(self.keys[row])
+            if matcher.quick_ratio() < FUZZY_CUTOFF:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= FUZZY_CUTOFF:
+                scored.append((-ratio, row))
+        return [row for _, row in sorted(scored)[:limit]]
+
+    def search(self, query, limit=10):
+        """Find players by ID, name prefix or a misspelt name.
+
+        Every word of the query must start a word of the name, so 'lebr jam'
+        finds LeBron James. When nothing matches that way, names close to
+        the query are returned instead.
+
+        Args:
+            query: player ID or part of a name
+            limit: most players returned
+
+        Returns:
+            list of player descriptions, best match first
+        """
+        if query in self.rows_by_id:
+            return [self.describe(self.rows_by_id[query])]
+        key = normalize(query)
+        if not key:
+            return []
+
+        rows = None
+        for word in key.split():
+            matched = self.prefix_rows(word)
+            rows = matched if rows is None else rows & matched
+            if not rows:
+                break
+        if rows:
+            ranked = sorted(rows, key=lambda row: (
+                self.keys[row] != key,
+                not self.keys[row].startswith(key),
+                not self.active[row],
+                -(self.last_seasons[row] or 0),
+                self.keys[row],
+            ))
+        else:
+            ranked = self.fuzzy_rows(key, limit)
+        return [self.describe(row) for row in ranked[:limit]]
+
+    def resolve(self, query):
+        """Get the ID of the best match for a name or ID.
+
+        Raises:
+            SystemExit: no player matches
+
+        Args:
+            query: player ID or name
+
+        Returns:
+            player ID
+        """
+        matches = self.search(query, limit=1)
+        if not matches:
+            raise SystemExit('No player matches {query!r}'.format(query=query))
+        return matches[0]['id']
+
+    def ids(self, active_only=False):
+        """List indexed player IDs.
+
+        Args:
+            active_only: only active players
+
+        Returns:
+            list of player IDs in ID order
+        """
+        return [player_id for player_id, active in zip(self.player_ids, self.active) if active or not active_only]
+
+    def save(self, fname=DEFAULT_INDEX_FILE):
+        """Write the index to a gzipped JSON file.
+
+        Args:
+            fname: path to write
+        """
+        directory = os.path.dirname(fname)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        payload = {
+            'version': INDEX_VERSION,
+            'ids': self.player_ids,
+            'names': self.names,
+            'from': self.first_seasons,
+            'to': self.last_seasons,
+            'active': self.active,
+            'keys': self.keys,
+        }
+        with gzip.open(fname + '.tmp', 'wt', encoding='utf-8') as index_file:
+            json.dump(payload, index_file, separators=(',', ':'))
+        os.replace(fname + '.tmp', fname)
+
+
+def load(fname=DEFAULT_INDEX_FILE):
+    """Read an index written by PlayerIndex.save.
+
+    Raises:
+        SystemExit: no index, or one from another version
+
+    Args:
+        fname: path of index file
+
+    Returns:
+        player index
+    """
+    if not os.path.exists(fname):
+        raise SystemExit('No player index at {fname}, run player_index --build first'.format(fname=fname))
+    with gzip.open(fname, 'rt', encoding='utf-8') as index_file:
+        payload = json.load(index_file)
+    if payload.get('version') != INDEX_VERSION:
+        raise SystemExit('Player index at {fname} is out of date, run player_index --build'.format(fname=fname))
+    return PlayerIndex(payload['ids'], payload['names'], payload['from'], payload['to'], payload['active'], payload['keys'])
+
+
+def build(fname=DEFAULT_INDEX_FILE):
+    """Scrape the player directory and save it as the index.
+
+    Args:
+        fname: path to write
+
+    Returns:
+        player index
+    """
+    index = PlayerIndex.from_players(scrape_directory())
+    index.save(fname)
+    return index
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--build', action='store_true')
+    parser.add_argument('--search', type=str)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--index-file', type=str, default=DEFAULT_INDEX_FILE)
+    fetcher.add_arguments(parser)
+    args = parser.parse_args()
+
+    fetcher.configure_from_args(args)
+
+    if args.build:
+        print('{players} players indexed'.format(players=len(build(args.index_file))))
+    if args.search:
+        for player in load(args.index_file).search(args.search, args.limit):
+            print('{id:<10} {name} ({from}-{to}){active}'.format(active=' active' if player['active'] else '', **player))
@@ -1,7 +1,18 @@
 import argparse
 
 import requests
-from bs4 import BeautifulSoup, SoupStrainer
+
+from rsvsps import instrumentation
+from rsvsps.scrapers import fetcher, table_cache, table_extractor
+
+TABLE_TYPES = ('per_game', 'per_minute', 'per_poss', 'advanced')
+QUALIFIERS = {'RS': '', 'PS': 'playoffs_'}
+PLAYER_TABLE_KEYS = {
+    (label, table_type): '{qualifier}{table_type}'.format(qualifier=qualifier, table_type=table_type)
+    for table_type in TABLE_TYPES
+    for label, qualifier in QUALIFIERS.items()
+}
+PLAYER_TABLE_IDS = tuple(PLAYER_TABLE_KEYS.values())
 
 
 def determine_player_url(player_id):
@@ -27,6 +38,49 @@ def determine_player_url(player_id):
     )
 
 
+def fetch_player_page(player_url):
+    """Download Player Page.
+
+    Raises:
+        SystemExit: HTTPError for player ID
+
+    Args:
+        player_url: URL to download
+
+    Returns:
+        raw HTML of player page
+    """
+    with instrumentation.stage('player.fetch') as measure:
+        try:
+            page_request = fetcher.get(player_url)
+            page_request.raise_for_status()
+        except requests.exceptions.HTTPError as err:
+            raise SystemExit from err
+
+        if page_request.status_code != 200:
+            raise SystemExit('HTTP Error: {0}'.format(page_request.status_code))
+
+        measure.add(size=len(page_request.content))
+        return page_request.text
+
+
+def parse_player_page(player_page):
+    """Find the stat tables in a downloaded Player Page.
+
+    The page is scanned once and every table found is parsed.
+
+    Args:
+        player_page: raw HTML of player page
+
+    Returns:
+        table registry keyed by RS or PS label and table type
+    """
+    with instrumentation.stage('player.parse') as measure:
+        tables = table_extractor.TableRegistry(player_page, PLAYER_TABLE_KEYS)
+        measure.add(rows=tables.parse(), size=len(player_page))
+        return tables
+
+
 def scrape_player_page(player_url):
     """Scrape Player Page for tables.
 
@@ -37,61 +91,39 @@ def scrape_player_page(player_url):
         player_url: URL to scrape
 
     Returns:
-        soup of scraped page
+        table registry keyed by RS or PS label and table type
     """
-    try:
-        page_request = requests.get(player_url)
-        page_request.raise_for_status()
-    except requests.exceptions.HTTPError as err:
-        raise SystemExit from err
-    
-    if page_request.status_code != 200:
-        raise SystemExit('HTTP Error: {0}'.format(page_request.status_code))
-
-    player_page = page_request.text
-    tables = SoupStrainer(id=[
-        'per_game',
-        'playoffs_per_game',
-        'per_minute',
-        'playoffs_per_minute',
-        'per_poss',
-        'playoffs_per_poss',
-        'advanced',
-        'playoffs_advanced',
-    ])
-    player_page = player_page.replace('<!--', '').replace('-->', '')
-
-    soup = BeautifulSoup(player_page, 'lxml', parse_only=tables)
-    return soup.contents[1:]
+    return parse_player_page(fetch_player_page(player_url))
 
 
 def scrape_tables(soup, label, table_type):
     """Scrape the PerGameTables from the Player Page.
 
     Args:
-        soup: soup of player page
+        soup: table registry for player page
         label: regular season or post-season
         table_type: table type to scrape
 
     Returns:
-        soup for table
+        lxml element for table, or None if the page does not have it
     """
-    qualifier_map = {'RS': '', 'PS': 'playoffs_'}
-    for table in soup:
-        if table.attrs['id'] == '{label}{tabletype}'.format(label=qualifier_map.get(label), tabletype=table_type):
-            return table
+    return soup.get((label, table_type))
 
 
 def scraped_table_to_list(table):
     """Convert the scraped table to a multidimensional list.
 
+    Cells are placed by data-stat, so every row comes out as wide as the
+    header.
+
     Args:
         table: table to scrape
 
     Returns:
-        data scraped from soup of table
+        header row followed by data rows of table
     """
-    return [[cell.text for cell in row.find_all(['th', 'td'])] for row in table.find_all('tr')]
+    _, header_labels, rows = table_extractor.table_rows(table)
+    return [header_labels] + rows
 
 
 def scrape_column_headers(player_data_list):
@@ -139,8 +171,8 @@ def adjustments_for_did_not_play_seasons(player_data_list):
     Returns:
         List with formatting for DNP seasons
     """
-    list_extender = [''] * (len(player_data_list[0]) - 3)
-    return [[*year, *list_extender] if 'Did Not Play' in year[2] else year for year in player_data_list]
+    width = len(player_data_list[0])
+    return [[*year, *[''] * (width - len(year))] if 'Did Not Play' in year[2] else year for year in player_data_list]
 
 
 def label_rs_or_ps(player_data_list, label):
@@ -160,7 +192,7 @@ def clean_table(soup, label, table_type):
     """Put functions for RS and PS into one.
 
     Args:
-        soup: soup for player page
+        soup: table registry for player page
         label: RS or PS to scrape
         table_type: type of table to scrape
 
@@ -224,43 +256,119 @@ def sort_list(player_data_list):
 
 
 def get_table_data(player_page, table_type):
-    regular_season = clean_table(player_page, 'RS', table_type)
-    post_season = clean_table(player_page, 'PS', table_type)
-    if (regular_season is None) & (post_season is None):
-        return None, None
-    combined = combine_rs_and_ps(regular_season, post_season)
-    column_headers = scrape_column_headers(combined)
-    combined = remove_column_headers(combined)
-    combined = add_sorting_qualifier(combined)
-    combined = sort_list(combined)
+    with instrumentation.stage('player.clean') as measure:
+        regular_season = clean_table(player_page, 'RS', table_type)
+        post_season = clean_table(player_page, 'PS', table_type)
+        if (regular_season is None) & (post_season is None):
+            return None, None
+        combined = combine_rs_and_ps(regular_season, post_season)
+        column_headers = scrape_column_headers(combined)
+        combined = remove_column_headers(combined)
+        combined = add_sorting_qualifier(combined)
+        combined = sort_list(combined)
+        measure.add(rows=len(combined))
+        return column_headers, combined
+
+
+def map_table_types(get_data, table_type):
+    """Get data for one or all table types.
+
+    Args:
+        get_data: function taking a table type
+        table_type: table type to get, or 'all' for every table type
+
+    Returns:
+        result for table type, or a tuple of results for each table type
+        when table_type is 'all'
+    """
+    if table_type != 'all':
+        return get_data(table_type)
+    return tuple(get_data(each_type) for each_type in TABLE_TYPES)
+
+
+def get_player_data(player_page, table_type):
+    """Get headers and combined rows for one or all table types.
+
+    Args:
+        player_page: table registry for player page
+        table_type: table type to get, or 'all' for every table type
+
+    Returns:
+        column headers and combined data, or a tuple of those for each
+        table type when table_type is 'all'
+    """
+    return map_table_types(lambda each_type: get_table_data(player_page, each_type), table_type)
+
+
+def get_cached_table_data(player_id, tables, table_type):
+    """Get table data, cleaning the tables only if their markup changed.
+
+    Args:
+        player_id: string that is player ID.
+        tables: table registry for player page, parsed or not
+        table_type: table type to get
+
+    Returns:
+        column headers and combined data for table type
+    """
+    markups = [tables.markup((label, table_type)) for label in QUALIFIERS]
+    with instrumentation.stage('player.table_cache') as measure:
+        table_digest = table_cache.digest(markups)
+        cached = table_cache.cache.lookup(player_id, table_type, table_digest)
+        if cached is not None:
+            measure.add(rows=len(cached[1] or ()))
+            return cached
+
+    with instrumentation.stage('player.parse') as measure:
+        parsed = sum(tables.get((label, table_type)) is not None for label in QUALIFIERS)
+        measure.add(rows=parsed, size=sum(len(markup) for markup in markups if markup is not None))
+    column_headers, combined = get_table_data(tables, table_type)
+    table_cache.cache.store(player_id, table_type, table_digest, column_headers, combined)
     return column_headers, combined
 
 
-def main(player_id, table_type):
-    player_url = determine_player_url(player_id)
-    player_page = scrape_player_page(player_url) # returns soup
-    
-    if table_type == 'all':
-        per_game_column_headers, per_game_combined = get_table_data(player_page, 'per_game')
-        per_minute_column_headers, per_minute_combined = get_table_data(player_page, 'per_minute')
-        per_poss_column_headers, per_poss_combined = get_table_data(player_page, 'per_poss')
-        advanced_column_headers, advanced_combined = get_table_data(player_page, 'advanced')
-        return (
-            (per_game_column_headers, per_game_combined),
-            (per_minute_column_headers, per_minute_combined),
-            (per_poss_column_headers, per_poss_combined),
-            (advanced_column_headers, advanced_combined),
-        )
-    else:
-        return get_table_data(player_page, table_type)
+def get_player_data_from_page(player_id, player_page, table_type):
+    """Get headers and combined rows from a downloaded Player Page.
 
+    The page is scanned for tables once. Uses the table cache when it is
+    turned on, so unchanged tables are never parsed again.
 
+    Args:
+        player_id: string that is player ID.
+        player_page: raw HTML of player page
+        table_type: table type to get, or 'all' for every table type
+
+    Returns:
+        column headers and combined data, or a tuple of those for each
+        table type when table_type is 'all'
+    """
+    if table_cache.cache is None:
+        return get_player_data(parse_player_page(player_page), table_type)
+
+    tables = table_extractor.TableRegistry(player_page, PLAYER_TABLE_KEYS)
+    return map_table_types(lambda each_type: get_cached_table_data(player_id, tables, each_type), table_type)
+
+
+def main(player_id, table_type):
+    with instrumentation.stage('player.main'):
+        player_url = determine_player_url(player_id)
+        player_page = fetch_player_page(player_url)
+        return get_player_data_from_page(player_id, player_page, table_type)
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--player', type=str)
     parser.add_argument('--table-type', type=str)
+    fetcher.add_arguments(parser)
+    instrumentation.add_arguments(parser)
     args = parser.parse_args()
-
-    main(args.player, args.table_type)
+    fetcher.configure_from_args(args)
+    table_cache.configure_from_args(args)
+
+    if args.metrics:
+        instrumentation.enable()
+    with instrumentation.profile(args.profile):
+        main(args.player, args.table_type)
+    if args.metrics:
+        instrumentation.write_report(args.metrics, args.metrics_file)
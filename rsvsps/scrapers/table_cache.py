@@ -0,0 +1,184 @@
+"""On-disk cache of cleaned player tables keyed by the markup they came from."""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import zlib
+
+# Bump when the cleaning in player_page_scraper changes so old entries miss.
+# 2: cells placed by data-stat, with Did Not Play padding and row filtering changed.
+CLEANING_VERSION = 2
+
+cache = None
+
+
+def configure(directory):
+    """Keep cleaned tables in an on-disk cache.
+
+    Args:
+        directory: folder for the cache, or None to turn the cache off
+    """
+    global cache
+    cache = None if directory is None else TableCache(directory)
+
+
+def configure_from_args(args):
+    """Apply the --cache-dir option added by fetcher.add_arguments.
+
+    Args:
+        args: parsed command line arguments
+    """
+    configure(args.cache_dir)
+
+
+def digest(table_markups):
+    """Hash the markup a table type was cleaned from.
+
+    Args:
+        table_markups: HTML of the RS and PS tables, None for missing tables
+
+    Returns:
+        hex digest of markup and cleaning version
+    """
+    hasher = hashlib.sha1(str(CLEANING_VERSION).encode())
+    for markup in table_markups:
+        hasher.update(b'\0')
+        if markup is not None:
+            hasher.update(markup.encode())
+    return hasher.hexdigest()
+
+
+def encode(column_headers, combined):
+    """Pack headers and rows column by column and compress them.
+
+    Args:
+        column_headers: column headers for table type
+        combined: combined RS and PS rows
+
+    Returns:
+        compressed bytes
+    """
+    if combined is None:
+        payload = None
+    else:
+        widths = [len(row) for row in combined]
+        width = max(widths, default=0)
+        padded = [row + [''] * (width - len(row)) for row in combined]
+        payload = {
+            'version': CLEANING_VERSION,
+            'headers': column_headers,
+            'widths': widths if min(widths, default=width) != width else None,
+            'columns': [list(column) for column in zip(*padded)],
+        }
+    return zlib.compress(json.dumps(payload, separators=(',', ':')).encode())
+
+
+def decode(blob):
+    """Unpack headers and rows written by encode.
+
+    Args:
+        blob: compressed bytes
+
+    Returns:
+        column headers and combined rows
+    """
+    payload = json.loads(zlib.decompress(blob))
+    if payload is None:
+        return None, None
+    rows = [list(row) for row in zip(*payload['columns'])]
+    if payload['widths'] is not None:
+        rows = [row[:width] for row, width in zip(rows, payload['widths'])]
+    return payload['headers'], rows
+
+
+class TableCache:
+    """Cleaned tables stored per player and table type in a sqlite file."""
+
+    def __init__(self, directory):
+        """Open or create the cache.
+
+        Args:
+            directory: folder holding the cache file
+        """
+        self.path = os.path.join(directory, 'tables.sqlite')
+        self.lock = threading.Lock()
+        self.connection = None
+        self.connection_pid = None
+        os.makedirs(directory, exist_ok=True)
+
+    def connect(self):
+        """Get the connection for this process.
+
+        Returns:
+            sqlite connection
+        """
+        if self.connection is None or self.connection_pid != os.getpid():
+            self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS tables ('
+                'player_id TEXT, table_type TEXT, digest TEXT, data BLOB, '
+                'PRIMARY KEY (player_id, table_type))'
+            )
+            self.connection_pid = os.getpid()
+        return self.connection
+
+    def lookup(self, player_id, table_type, table_digest):
+        """Find cleaned data for tables whose markup has not changed.
+
+        Args:
+            player_id: string that is player ID.
+            table_type: table type
+            table_digest: digest of the current table markup
+
+        Returns:
+            column headers and combined rows, or None if not cached
+        """
+        with self.lock:
+            row = self.connect().execute(
+                'SELECT data FROM tables WHERE player_id = ? AND table_type = ? AND digest = ?',
+                (player_id, table_type, table_digest),
+            ).fetchone()
+        if row is None:
+            return None
+        return decode(row[0])
+
+    def iter_tables(self, table_type):
+        """Read every cached player's table of one type.
+
+        Args:
+            table_type: table type
+
+        Yields:
+            player ID, column headers and combined rows, for players that
+            have the table cleaned by the current version
+        """
+        with self.lock:
+            rows = self.connect().execute(
+                'SELECT player_id, data FROM tables WHERE table_type = ? ORDER BY player_id',
+                (table_type,),
+            ).fetchall()
+        for player_id, data in rows:
+            payload = json.loads(zlib.decompress(data))
+            if payload is not None and payload.get('version') == CLEANING_VERSION:
+                yield (player_id, *decode(data))
+
+    def store(self, player_id, table_type, table_digest, column_headers, combined):
+        """Save cleaned data, replacing any older version for the table type.
+
+        Args:
+            player_id: string that is player ID.
+            table_type: table type
+            table_digest: digest of the table markup
+            column_headers: column headers for table type
+            combined: combined RS and PS rows
+        """
+        data = encode(column_headers, combined)
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO tables VALUES (?, ?, ?, ?)',
+                    (player_id, table_type, table_digest, data),
+                )
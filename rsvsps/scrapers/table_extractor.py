@@ -0,0 +1,214 @@
+"""Extract stat tables from basketball-reference pages in a single pass."""
+
+import re
+import threading
+
+import lxml.html
+from lxml import etree
+
+TABLE_OPEN_TAG = re.compile(r'<table\b[^>]*?\sid="([^"]+)"[^>]*>')
+TABLE_CLOSE_TAG = '</table>'
+HEADER_ROWS = etree.XPath('thead/tr')
+BODY_ROWS = etree.XPath('.//tr[not(parent::thead)]')
+ALL_ROWS = etree.XPath('.//tr')
+CELLS = etree.XPath('th|td')
+CELL_TEXT = etree.XPath('string()')
+
+
+def find_table_spans(page, table_ids):
+    """Locate the markup of each wanted table, commented out or not.
+
+    basketball-reference ships most of its tables inside HTML comments, so
+    the page is scanned for opening table tags directly instead of being
+    uncommented first. Tables on the site are never nested, so each table
+    ends at the next closing table tag.
+
+    Args:
+        page: raw HTML of the page
+        table_ids: ids of the tables to find
+
+    Returns:
+        dict of table id to (start, end) offsets into page
+    """
+    wanted = frozenset(table_ids)
+    spans = {}
+    position = 0
+    for match in TABLE_OPEN_TAG.finditer(page):
+        if match.start() < position:
+            continue
+        table_id = match.group(1)
+        if table_id not in wanted or table_id in spans:
+            continue
+        end = page.find(TABLE_CLOSE_TAG, match.end())
+        if end == -1:
+            break
+        position = end + len(TABLE_CLOSE_TAG)
+        spans[table_id] = (match.start(), position)
+        if len(spans) == len(wanted):
+            break
+    return spans
+
+
+def parse_table(table_markup):
+    """Parse the markup of a single table.
+
+    Args:
+        table_markup: HTML from the opening to the closing table tag
+
+    Returns:
+        lxml element for table
+    """
+    return lxml.html.fragment_fromstring(table_markup)
+
+
+def table_rows(table):
+    """Read a table's cells into rows, placing each cell by its data-stat.
+
+    The header is the last row of thead, or the first row when there is no
+    thead. Each body cell goes to the header column with the same
+    data-stat, so cells never need to be matched up by position and every
+    row is as wide as the header. Cells whose data-stat is not in the
+    header, like the reason spanning a Did Not Play season, go to the
+    column they start in. Blank rows and repeated header rows are skipped.
+
+    Args:
+        table: lxml element for table
+
+    Returns:
+        list of header data-stats, list of header labels, and list of rows
+        of cell text
+    """
+    header_rows = HEADER_ROWS(table)
+    if header_rows:
+        header_row = header_rows[-1]
+        body_rows = BODY_ROWS(table)
+    else:
+        rows = ALL_ROWS(table)
+        if not rows:
+            return [], [], []
+        header_row, body_rows = rows[0], rows[1:]
+    header_cells = CELLS(header_row)
+    header_stats = [cell.get('data-stat') for cell in header_cells]
+    header_labels = [CELL_TEXT(cell) for cell in header_cells]
+    width = len(header_cells)
+    slots = {}
+    for column, stat in enumerate(header_stats):
+        if stat is not None:
+            slots.setdefault(stat, []).append(column)
+
+    rows = []
+    repeated_header = header_labels[0] if header_labels else None
+    for row in body_rows:
+        cells = CELLS(row)
+        if not cells:
+            continue
+        first = CELL_TEXT(cells[0])
+        if first == '' or first == repeated_header:
+            continue
+        values = [''] * width
+        used = {}
+        position = 0
+        for number, cell in enumerate(cells):
+            stat = cell.get('data-stat')
+            stat_slots = slots.get(stat)
+            column = position
+            if stat_slots is not None:
+                count = used.get(stat, 0)
+                used[stat] = count + 1
+                if count < len(stat_slots):
+                    column = stat_slots[count]
+            if column < width:
+                values[column] = CELL_TEXT(cell) if number else first
+            position += int(cell.get('colspan', 1))
+        rows.append(values)
+    return header_stats, header_labels, rows
+
+
+def extract_tables(page, table_ids):
+    """Extract wanted tables from a page, keyed by table id.
+
+    Args:
+        page: raw HTML of the page
+        table_ids: ids of the tables to extract
+
+    Returns:
+        dict of table id to lxml element for table
+    """
+    return {
+        table_id: parse_table(page[start:end])
+        for table_id, (start, end) in find_table_spans(page, table_ids).items()
+    }
+
+
+class TableRegistry:
+    """The wanted tables of one page, found in a single scan of the page.
+
+    Tables are looked up by id or by a key such as ('RS', 'per_game'). Each
+    table is parsed at most once, however many times and from however many
+    threads it is asked for.
+    """
+
+    def __init__(self, page, table_keys):
+        """Scan a page for tables.
+
+        Args:
+            page: raw HTML of the page
+            table_keys: dict of key to table id
+        """
+        self.page = page
+        self.table_ids = dict(table_keys)
+        self.table_ids.update({table_id: table_id for table_id in table_keys.values()})
+        self.spans = find_table_spans(page, frozenset(table_keys.values()))
+        self.tables = {}
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        """Check whether the page has a table."""
+        return self.table_ids.get(key) in self.spans
+
+    def markup(self, key):
+        """Get the markup of a table.
+
+        Args:
+            key: table id or key
+
+        Returns:
+            HTML of table, or None if the page does not have it
+        """
+        span = self.spans.get(self.table_ids.get(key))
+        if span is None:
+            return None
+        return self.page[span[0]:span[1]]
+
+    def get(self, key, default=None):
+        """Get a parsed table, parsing it the first time.
+
+        Args:
+            key: table id or key
+            default: returned if the page does not have the table
+
+        Returns:
+            lxml element for table
+        """
+        table_id = self.table_ids.get(key)
+        table = self.tables.get(table_id)
+        if table is not None:
+            return table
+        markup = self.markup(table_id)
+        if markup is None:
+            return default
+        with self.lock:
+            table = self.tables.get(table_id)
+            if table is None:
+                table = self.tables[table_id] = parse_table(markup)
+        return table
+
+    def parse(self):
+        """Parse every table found that is not parsed yet.
+
+        Returns:
+            number of tables on the page
+        """
+        for table_id in self.spans:
+            self.get(table_id)
+        return len(self.spans)
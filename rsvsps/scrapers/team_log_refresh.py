@@ -0,0 +1,246 @@
+"""Append new games to existing game log csv files instead of rebuilding them."""
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+
+from rsvsps.scrapers import fetcher, table_extractor, team_log_scraper
+
+
+def determine_watermark_filename(fname):
+    """Determine the file holding watermarks for a csv file.
+
+    Args:
+        fname: path of csv file
+
+    Returns:
+        path of watermark file
+    """
+    return '{base}.watermark.json'.format(base=os.path.splitext(fname)[0])
+
+
+def load_watermarks(fname):
+    """Load the watermarks for a csv file.
+
+    Watermarks are only trusted while the csv file they describe exists and
+    holds at least the bytes written when they were saved.
+
+    Args:
+        fname: path of csv file
+
+    Returns:
+        dict with watermark per team, size of the csv file and, for ALL
+        files, keys of games written
+    """
+    watermark_fname = determine_watermark_filename(fname)
+    if not (os.path.exists(fname) and os.path.exists(watermark_fname)):
+        return {'teams': {}, 'games': []}
+    with open(watermark_fname) as watermark_file:
+        watermarks = json.load(watermark_file)
+    if os.path.getsize(fname) < watermarks.get('size', 0):
+        return {'teams': {}, 'games': []}
+    return watermarks
+
+
+def discard_uncommitted_rows(fname, watermarks):
+    """Cut off rows appended after the watermarks were last saved.
+
+    Saving the watermarks commits an append, so rows left by a run that
+    failed before saving them are dropped and fetched again.
+
+    Args:
+        fname: path of csv file
+        watermarks: watermarks loaded for the csv file
+    """
+    size = watermarks.get('size')
+    if size is not None and os.path.getsize(fname) > size:
+        os.truncate(fname, size)
+
+
+def save_watermarks(fname, watermarks):
+    """Save the watermarks for a csv file.
+
+    Args:
+        fname: path of csv file
+        watermarks: dict with watermark per team and keys of games written
+    """
+    watermark_fname = determine_watermark_filename(fname)
+    with open(watermark_fname + '.tmp', 'w') as watermark_file:
+        json.dump(watermarks, watermark_file, indent=1, sort_keys=True)
+    os.replace(watermark_fname + '.tmp', watermark_fname)
+
+
+def page_digest(tables):
+    """Hash the game log tables of a page, ignoring the rest of the page.
+
+    Args:
+        tables: table registry for team log page, parsed or not
+
+    Returns:
+        hex digest of game log tables
+    """
+    hasher = hashlib.sha1()
+    for table_id in team_log_scraper.TEAM_TABLE_IDS:
+        hasher.update(b'\0')
+        markup = tables.markup(table_id)
+        if markup is not None:
+            hasher.update(markup.encode())
+    return hasher.hexdigest()
+
+
+def get_new_rows(team, tables, post_season_bool, watermark):
+    """Get the games newer than a team's watermark.
+
+    Args:
+        team: team name
+        tables: table registry for team log page, parsed or not
+        post_season_bool: bool to indicate rs or ps
+        watermark: dict with date of last game stored, or empty dict
+
+    Returns:
+        header row, and game rows played after the watermark date, or None
+        and no rows if the page has no table for the season type
+    """
+    output = team_log_scraper.get_output_from_soup(tables, team, post_season_bool)
+    if not output:
+        return None, []
+    header_row = output[0]
+    date_col = header_row.index('Date')
+    last_date = watermark.get('date', '')
+    return header_row, [row for row in output[1:] if row[date_col] > last_date]
+
+
+def read_page(team, page, post_season_bool, watermark):
+    """Hash a downloaded team page and get its new games if it changed.
+
+    Args:
+        team: team name
+        page: raw HTML of team log page
+        post_season_bool: bool to indicate rs or ps
+        watermark: dict with date and digest of last run, or empty dict
+
+    Returns:
+        digest of game log tables, header row or None, and game rows played
+        after the watermark date, which are only read if the digest changed
+    """
+    tables = table_extractor.TableRegistry(page, team_log_scraper.TEAM_TABLE_KEYS)
+    digest = page_digest(tables)
+    if watermark.get('digest') == digest:
+        return digest, None, []
+    return (digest, *get_new_rows(team, tables, post_season_bool, watermark))
+
+
+async def collect_new_rows(team, season, post_season_bool, watermarks, concurrency, missing=None):
+    """Get new games from every page that changed since the last run.
+
+    For every team, the teams in use that season are checked, and pages
+    that are not found are skipped and added to missing. Pages are read in
+    worker threads while others download.
+
+    Args:
+        team: team name, or 'ALL' for every team
+        season: season number
+        post_season_bool: bool to indicate rs or ps
+        watermarks: dict with watermark per team, updated in place
+        concurrency: most pages downloaded at once
+        missing: list to add team and season to for each page not found
+
+    Returns:
+        header row or None if no changed page has games, and new game rows
+    """
+    if team == 'ALL':
+        teams = team_log_scraper.teams_for_season(season)
+        if missing is None:
+            missing = []
+    else:
+        teams = (team,)
+        missing = None
+    header_row = None
+    new_rows = []
+    async for page_team, page in team_log_scraper.iter_team_pages(teams, season, concurrency, missing):
+        watermark = watermarks['teams'].get(page_team, {})
+        digest, page_header_row, rows = await asyncio.to_thread(read_page, page_team, page, post_season_bool, watermark)
+        if watermark.get('digest') == digest:
+            continue
+        last_date = watermark.get('date', '')
+        if page_header_row is not None:
+            header_row = page_header_row
+            date_col = header_row.index('Date')
+            last_date = max([row[date_col] for row in rows], default=last_date)
+            new_rows.extend(rows)
+        watermarks['teams'][page_team] = {'date': last_date, 'digest': digest}
+    return header_row, new_rows
+
+
+def main(team, season, post_season_bool, concurrency=team_log_scraper.DEFAULT_CONCURRENCY):
+    """Append games played since the last run to a season's csv file.
+
+    Teams whose game log tables are unchanged are skipped. The file and its
+    watermarks are written in full on the first run. Saving the watermarks
+    commits the new rows, so a run that fails part way leaves nothing the
+    next run would append twice.
+
+    Args:
+        team: team name, or 'ALL' for every team
+        season: season number
+        post_season_bool: bool to indicate rs or ps
+        concurrency: most pages downloaded at once
+
+    Returns:
+        number of game rows appended
+    """
+    fname = team_log_scraper.determine_output_filename(team, season, post_season_bool)
+    watermarks = load_watermarks(fname)
+    first_run = not watermarks['teams']
+    if not first_run:
+        discard_uncommitted_rows(fname, watermarks)
+
+    missing = []
+    header_row, new_rows = asyncio.run(
+        collect_new_rows(team, season, post_season_bool, watermarks, concurrency, missing)
+    )
+    for missing_team, missing_season in missing:
+        print('Skipped {team} {season}: page not found'.format(team=missing_team, season=missing_season))
+    if header_row is None:
+        return 0
+
+    if team == 'ALL':
+        header_row = header_row[1:]
+        written = set(watermarks['games'])
+        key_cols = [header_row.index(name) for name in ('Date', 'Home Team', 'Away Team')]
+        games = team_log_scraper.index_games(header_row, [row[1:] for row in new_rows])
+        new_rows = []
+        for row in games:
+            key = '|'.join(row[col].strip() for col in key_cols)
+            if key not in written:
+                written.add(key)
+                new_rows.append(row)
+        watermarks['games'] = sorted(written)
+
+    if first_run:
+        team_log_scraper.write_output([header_row] + new_rows, team, season, post_season_bool)
+    else:
+        with open(fname, 'a', newline='') as my_csv:
+            csv.writer(my_csv).writerows(new_rows)
+            my_csv.flush()
+            os.fsync(my_csv.fileno())
+    watermarks['size'] = os.path.getsize(fname)
+    save_watermarks(fname, watermarks)
+    return len(new_rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--team', type=str, required=True)
+    parser.add_argument('--season', type=str, required=True)
+    parser.add_argument('--postseason_bool', type=bool)
+    parser.add_argument('--concurrency', type=int, default=team_log_scraper.DEFAULT_CONCURRENCY, help=team_log_scraper.CONCURRENCY_HELP)
+    fetcher.add_arguments(parser)
+    args = parser.parse_args()
+
+    fetcher.configure_from_args(args)
+
+    print('{rows} new games'.format(rows=main(args.team, args.season, args.postseason_bool, args.concurrency)))
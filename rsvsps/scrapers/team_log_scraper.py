@@ -1,120 +1,279 @@
 """Script to scrape game logs from basketball-reference."""
 
 import argparse
+import asyncio
 import csv
+import operator
+import os
 
 import requests
-from bs4 import BeautifulSoup, SoupStrainer
 
+from rsvsps.scrapers import fetcher, table_extractor
+
+TEAMS = (
+    'ATL',
+    'BOS',
+    'BRK',
+    'CHI',
+    'CHO',
+    'CLE',
+    'DAL',
+    'DEN',
+    'DET',
+    'GSW',
+    'HOU',
+    'IND',
+    'LAC',
+    'LAL',
+    'MEM',
+    'MIA',
+    'MIL',
+    'MIN',
+    'NOP',
+    'NYK',
+    'OKC',
+    'ORL',
+    'PHI',
+    'PHO',
+    'POR',
+    'SAC',
+    'SAS',
+    'TOR',
+    'UTA',
+    'WAS',
+)
+# Team names used by basketball-reference for each franchise, with the
+# first and last season each name was used, None while still in use.
+TEAM_SEASONS = (
+    ('ATL', 1969, None),
+    ('BAL', 1964, 1973),
+    ('BOS', 1947, None),
+    ('BRK', 2013, None),
+    ('BUF', 1971, 1978),
+    ('CAP', 1974, 1974),
+    ('CHA', 2005, 2014),
+    ('CHH', 1989, 2002),
+    ('CHI', 1967, None),
+    ('CHO', 2015, None),
+    ('CIN', 1958, 1972),
+    ('CLE', 1971, None),
+    ('DAL', 1981, None),
+    ('DEN', 1977, None),
+    ('DET', 1958, None),
+    ('GSW', 1972, None),
+    ('HOU', 1972, None),
+    ('IND', 1977, None),
+    ('KCK', 1976, 1985),
+    ('KCO', 1973, 1975),
+    ('LAC', 1985, None),
+    ('LAL', 1961, None),
+    ('MEM', 2002, None),
+    ('MIA', 1989, None),
+    ('MIL', 1969, None),
+    ('MIN', 1990, None),
+    ('NJN', 1978, 2012),
+    ('NOH', 2003, 2005),
+    ('NOH', 2008, 2013),
+    ('NOJ', 1975, 1979),
+    ('NOK', 2006, 2007),
+    ('NOP', 2014, None),
+    ('NYK', 1947, None),
+    ('NYN', 1977, 1977),
+    ('OKC', 2009, None),
+    ('ORL', 1990, None),
+    ('PHI', 1964, None),
+    ('PHO', 1969, None),
+    ('POR', 1971, None),
+    ('SAC', 1986, None),
+    ('SAS', 1977, None),
+    ('SDC', 1979, 1984),
+    ('SDR', 1968, 1971),
+    ('SEA', 1968, 2008),
+    ('SFW', 1963, 1971),
+    ('STL', 1956, 1968),
+    ('TOR', 1996, None),
+    ('UTA', 1980, None),
+    ('VAN', 1996, 2001),
+    ('WAS', 1998, None),
+    ('WSB', 1975, 1997),
+)
+# Downloads still go through the fetcher's rate limit, which by default lets
+# one request out every three seconds, so concurrency only speeds up a run
+# once --requests-per-minute and --burst are raised to match it.
+DEFAULT_CONCURRENCY = 4
+CONCURRENCY_HELP = 'most pages downloaded at once, only faster than one when --requests-per-minute and --burst allow it'
+# Game log table id for each season type label, False for RS and True for PS.
+TEAM_TABLE_KEYS = {False: 'tgl_basic', True: 'tgl_basic_playoffs'}
+TEAM_TABLE_IDS = tuple(TEAM_TABLE_KEYS.values())
+# Columns before the team's box score stats, named the same for every team.
+LEADING_STATS = frozenset({
+    'ranker',
+    'game_season',
+    'date_game',
+    'game_location',
+    'opp_id',
+    'game_result',
+    'pts',
+    'opp_pts',
+})
+# Positions of cleaned game log columns before the box score stats.
+LOCATION_COL = 3
+OPPONENT_COL = 4
+RESULT_COL = 5
+POINTS_COL = 6
+STATS_COL = 8
+FLIPPED_RESULTS = {'W': 'L', 'L': 'W'}
+
+
+def teams_for_season(season):
+    """List the team names in use in a season.
 
-def scrape_team_season_log_page(team_season_log_urls):
-    """Scrape Team Log Page for tables.
+    Args:
+        season: season number
+
+    Returns:
+        tuple of team names, in alphabetical order
+    """
+    season = int(season)
+    return tuple(sorted({
+        team
+        for team, first_season, last_season in TEAM_SEASONS
+        if first_season <= season and (last_season is None or season <= last_season)
+    }))
+
+
+def determine_team_season_log_url(team, season):
+    """Determine the game log URL for a team's season.
+
+    Args:
+        team: team name
+        season: season number
+
+    Returns:
+        URL for team season game log
+    """
+    return 'https://www.basketball-reference.com/teams/{team}/{season}/gamelog/'.format(
+        team=team,
+        season=season,
+    )
+
+
+def fetch_team_season_log_page(team_season_log_urls):
+    """Download Team Log Page.
 
     Raises:
         SystemExit: HTTPError for team season
 
     Args:
-        team_season_log_urls: URL to scrape
+        team_season_log_urls: URL to download
 
     Returns:
-        soup of scraped page
+        raw HTML of team log page
     """
     try:
-        page_request = requests.get(team_season_log_urls, timeout=5)
+        page_request = fetcher.get(team_season_log_urls, timeout=5)
     except requests.exceptions.RequestException as err:
         raise SystemExit from err
 
     if page_request.status_code != 200:
-        raise SystemExit('HTTP Error: {0}'.format(page_request.status_code))
-    
-    team_season_log_page = page_request.text
-    tables = SoupStrainer(id=[
-        'tgl_basic',
-        'tgl_basic_playoffs',
-    ])
-    team_season_log_page = team_season_log_page.replace('<!--', '').replace('-->', '')
+        message = 'HTTP Error: {0}'.format(page_request.status_code)
+        raise SystemExit(message) from requests.exceptions.HTTPError(message, response=page_request)
 
-    soup = BeautifulSoup(team_season_log_page, 'lxml', parse_only=tables)
-    return soup.contents[1:]
+    return page_request.text
 
 
-def scrape_tables(soup, label):
-    """Scrape game log tables.
+def page_not_found(err):
+    """Tell whether a download failed because the page does not exist.
 
     Args:
-        soup: soup of team log page
-        label: regular season or post-season
+        err: SystemExit raised while downloading a page
 
     Returns:
-        soup for table
+        bool, True for a 404 response
     """
-    qualifier_map = {False: '', True: '_playoffs'}
-    for table in soup:
-        if table.attrs['id'] == 'tgl_basic{ps_qualifier}'.format(ps_qualifier=qualifier_map[label]):
-            return table
+    response = getattr(err.__cause__, 'response', None)
+    return response is not None and response.status_code == 404
 
 
-def scraped_table_to_list(table):
-    """Convert the scraped table to a multidimensional list.
+def parse_team_season_log_page(team_season_log_page):
+    """Find the game log tables in a downloaded Team Log Page.
+
+    The page is scanned once and every table found is parsed.
 
     Args:
-        table: table to scrape
+        team_season_log_page: raw HTML of team log page
 
     Returns:
-        data scraped from soup of table
+        table registry keyed by season type label
     """
-    return [[cell.text for cell in row.find_all(['th', 'td'])] for row in table.find_all('tr')]
+    tables = table_extractor.TableRegistry(team_season_log_page, TEAM_TABLE_KEYS)
+    tables.parse()
+    return tables
 
-    
-def remove_duplicate_header_rows(team_data_log_list):
-    """Remove duplicate header rows.
+
+def scrape_team_season_log_page(team_season_log_urls):
+    """Scrape Team Log Page for tables.
+
+    Raises:
+        SystemExit: HTTPError for team season
 
     Args:
-        team_data_log_list: table with potentially duplicated header rows
+        team_season_log_urls: URL to scrape
 
     Returns:
-        table without duplicate header rows
+        table registry keyed by season type label
     """
-    header_row0 = team_data_log_list[0]
-    header_row1 = team_data_log_list[1]
+    return parse_team_season_log_page(fetch_team_season_log_page(team_season_log_urls))
 
-    team_data_log_with_dup_headers_removed = [header_row0, header_row1]
 
-    for row in team_data_log_list[2:]:
-        if row[0] not in {'', 'Rk'}:
-            team_data_log_with_dup_headers_removed.append(row)
+def scrape_tables(soup, label):
+    """Scrape game log tables.
 
-    return team_data_log_with_dup_headers_removed
+    Args:
+        soup: table registry for team log page
+        label: regular season or post-season
 
+    Returns:
+        lxml element for table, or None if the page does not have it
+    """
+    return soup.get(bool(label))
 
-def clean_column_headers(team_data_log_list):
-    """Store column headers.
+
+def scraped_table_to_list(table):
+    """Convert the scraped table to a multidimensional list.
 
     Args:
-        team_data_log_list: team game log data list
+        table: table to scrape
 
     Returns:
-        2D list of data with column headers cleaned
+        cleaned header row followed by game rows of table
     """
-    team_data_log_list = remove_duplicate_header_rows(team_data_log_list)
-    header_row1 = team_data_log_list[1]
+    header_stats, header_labels, rows = table_extractor.table_rows(table)
+    return [clean_column_headers(header_stats, header_labels)] + rows
 
-    num_team_cols_except_score = int((len(header_row1) - 9) / 2)
-    num_leading_cols = 8
 
-    for index, _ in enumerate(header_row1):
-        if num_leading_cols <= index < num_leading_cols + num_team_cols_except_score:
-            header_row1[index] = '{team_indicator} {stat}'.format(
-                team_indicator='Team',
-                stat=header_row1[index],
-            )
-        elif num_leading_cols + num_team_cols_except_score + 1 <= index < len(header_row1):
-            header_row1[index] = '{team_indicator} {stat}'.format(
-                team_indicator='Opponent',
-                stat=header_row1[index],
-            )
+def clean_column_headers(header_stats, header_labels):
+    """Name the team's and the opponent's box score columns apart.
 
-    return team_data_log_list[1:]
+    Both halves of the table share labels like FG, so their data-stat
+    decides: opponent stats start with opp_.
+
+    Args:
+        header_stats: data-stat of each header cell
+        header_labels: text of each header cell
+
+    Returns:
+        column headers
+    """
+    column_headers = []
+    for stat, label in zip(header_stats, header_labels):
+        if stat in LEADING_STATS or not label:
+            column_headers.append(label)
+        elif stat.startswith('opp_'):
+            column_headers.append('Opponent {stat}'.format(stat=label))
+        else:
+            column_headers.append('Team {stat}'.format(stat=label))
+    return column_headers
 
 
 def update_home_flag(team_log_data):
@@ -233,13 +392,92 @@ def standardize_cols_for_home_court(team_log_data, team):
     return update_teams_to_home_and_away(standardize_game_logs, team, home_flag_col_num)
 
 
-def get_log_for_team_season_and_season_type(soup, label, team):
+def home_and_away_label(label):
+    """Rename a team or opponent column for the home and away teams.
+
+    Args:
+        label: cleaned column header
+
+    Returns:
+        column header naming the home or away team
+    """
+    if 'Team ' in label:
+        return label.replace('Team ', 'Home Team ')
+    if 'Opponent' in label:
+        return label.replace('Opponent ', 'Away Team ')
+    return label
+
+
+def standardized_column_order(width, home):
+    """Pick the columns of a standardized game log row, in order.
+
+    Rank, location and the spacer between the team's and the opponent's
+    stats are dropped. Positions width and width + 1 stand for the team's
+    name and the flipped result, which are added after the table's columns.
+
+    Args:
+        width: number of columns in team game log table
+        home: order for home games instead of away games
+
+    Returns:
+        list of column positions
+    """
+    stats = (width - STATS_COL - 1) // 2
+    team_stats = list(range(STATS_COL, STATS_COL + stats))
+    opponent_stats = list(range(STATS_COL + stats + 1, STATS_COL + 2 * stats + 1))
+    if home:
+        return [1, 2, width, OPPONENT_COL, RESULT_COL, POINTS_COL, POINTS_COL + 1, *team_stats, *opponent_stats]
+    return [1, 2, OPPONENT_COL, width, width + 1, POINTS_COL + 1, POINTS_COL, *opponent_stats, *team_stats]
+
+
+def standardize_columns_for_home_court(column_headers, rows, team):
+    """Standardize columns to be team neutral without shuffling cells.
+
+    Gives the same table as standardize_cols_for_home_court. The column
+    order for home games and for away games is worked out once per table,
+    and the location column picks which one each game's row is gathered
+    with, so every row is built in one step instead of by inserting and
+    swapping cells.
+
+    Args:
+        column_headers: cleaned column headers of team game log table
+        rows: game rows of cell text, without the header row
+        team: team name
+
+    Returns:
+        team log data with teams organized by home vs away
+    """
+    width = len(column_headers)
+    home_order = standardized_column_order(width, home=True)
+    gather_home = operator.itemgetter(*home_order)
+    gather_away = operator.itemgetter(*standardized_column_order(width, home=False))
+
+    header_row = [
+        'Game Number',
+        column_headers[2],
+        'Home Team',
+        'Away Team',
+        'Home Team Result',
+        'Home Team Points',
+        'Away Team Points',
+        *(home_and_away_label(column_headers[col]) for col in home_order[7:]),
+    ]
+    standardized = [header_row]
+    for row in rows:
+        row = (*row, team, FLIPPED_RESULTS.get(row[RESULT_COL], row[RESULT_COL]))
+        standardized.append(list(gather_away(row) if row[LOCATION_COL] == '@' else gather_home(row)))
+    return standardized
+
+
+def get_log_for_team_season_and_season_type(soup, label, team, reference=False):
     """Put functions for RS and PS into one.
 
     Args:
-        soup: soup for team data log page
+        soup: table registry for team log page
         label: label for regular season vs post season
         team: team name
+        reference: use the row by row functions instead of the column-wise
+            ones, used to check the two agree
 
     Returns:
         team log data table
@@ -247,20 +485,49 @@ def get_log_for_team_season_and_season_type(soup, label, team):
     table = scrape_tables(soup, label)
     if table is None:
         return None
-    team_game_log_data_list = scraped_table_to_list(table)
+    if reference:
+        team_game_log_data_list = scraped_table_to_list(table)
+        return standardize_cols_for_home_court(team_game_log_data_list, team)
+    header_stats, header_labels, rows = table_extractor.table_rows(table)
+    return standardize_columns_for_home_court(clean_column_headers(header_stats, header_labels), rows, team)
 
-    team_game_log_data_list = clean_column_headers(team_game_log_data_list)
-    return standardize_cols_for_home_court(team_game_log_data_list, team)
 
+def index_games(header_row, team_log_data):
+    """Merge the home and away teams' rows for each game.
 
-def write_output(team_log_data, team, season, post_season_bool):
-    """Write output of game logs as csv.
+    Games are keyed by date, home team and away team, so both teams' views
+    of a game collapse into one row even if their formatting differs. Cells
+    blank in one view are filled from the other.
+
+    Args:
+        header_row: column headers of team_log_data
+        team_log_data: game rows from every team, without header rows
+
+    Returns:
+        one row per game in date order
+    """
+    key_cols = [header_row.index(name) for name in ('Date', 'Home Team', 'Away Team')]
+    games = {}
+    for row in team_log_data:
+        key = tuple(row[col].strip() for col in key_cols)
+        seen = games.get(key)
+        if seen is None:
+            games[key] = row
+        else:
+            games[key] = [cell if cell != '' else other for cell, other in zip(seen, row)]
+    return [games[key] for key in sorted(games)]
+
+
+def determine_output_filename(team, season, post_season_bool):
+    """Determine the csv file game logs are written to.
 
     Args:
-        team_log_data: game log data
         team: team name
-        season: season number
+        season: season number or range of seasons
         post_season_bool: bool to indicate rs or ps
+
+    Returns:
+        path of csv file
     """
     if post_season_bool is None:
         post_season_ext = ''
@@ -268,99 +535,277 @@ def write_output(team_log_data, team, season, post_season_bool):
         post_season_ext = '_post_season'
     else:
         post_season_ext = '_regular_season'
-    fname = 'output/{team}_{season}{post_season_bool}.csv'.format(
+    return 'output/{team}_{season}{post_season_bool}.csv'.format(
         team=team,
         season=season,
         post_season_bool=post_season_ext,
     )
 
-    with open(fname, 'w', newline='') as my_csv:
-        csv_writer = csv.writer(my_csv)
-        csv_writer.writerows(team_log_data)
 
+def write_output(team_log_data, team, season, post_season_bool):
+    """Write output of game logs as csv.
 
-def get_output_for_team(team, season, post_season_bool):
-    """Given team name, season, and post-season bool, output game logs.
+    Rows are written to a temporary file that replaces the csv file only
+    once every row is written, so a run that fails part way leaves any
+    earlier csv file as it was.
 
     Args:
+        team_log_data: game log data, any iterable of rows
         team: team name
-        season: season number
+        season: season number or range of seasons
         post_season_bool: bool to indicate rs or ps
     """
-    url = 'https://www.basketball-reference.com/teams/{team}/{season}/gamelog/'.format(
-        team=team,
-        season=season,
-    )
-    soup = scrape_team_season_log_page(url)
+    fname = determine_output_filename(team, season, post_season_bool)
+    temp_fname = fname + '.tmp'
+
+    try:
+        with open(temp_fname, 'w', newline='') as my_csv:
+            csv_writer = csv.writer(my_csv)
+            csv_writer.writerows(team_log_data)
+    except BaseException:
+        if os.path.exists(temp_fname):
+            os.remove(temp_fname)
+        raise
+    os.replace(temp_fname, fname)
+
+
+def get_output_from_soup(soup, team, post_season_bool):
+    """Standardize the game logs found on a team's page.
+
+    A season type without a table on the page, such as the playoffs for a
+    team that missed them, has no games.
+
+    Args:
+        soup: table registry for team log page
+        team: team name
+        post_season_bool: bool to indicate rs or ps
+
+    Returns:
+        game logs with header row, or an empty list if the page has no
+        table for the season type
+    """
     output = []
     if post_season_bool is None:
-        output.extend(get_log_for_team_season_and_season_type(soup, label=False, team=team))
+        output.extend(get_log_for_team_season_and_season_type(soup, label=False, team=team) or [])
         postseason = get_log_for_team_season_and_season_type(soup, label=True, team=team)
         if postseason is not None:
-            output.extend(postseason[1:])
+            output.extend(postseason if not output else postseason[1:])
     else:
-        output.extend(get_log_for_team_season_and_season_type(soup, post_season_bool, team))
+        output.extend(get_log_for_team_season_and_season_type(soup, post_season_bool, team) or [])
     return output
 
 
-def main(team, season, post_season_bool):
-    all_team_bool = True if team == 'ALL' else False
-    if team == 'ALL':
-        team_list = (
-            'ATL',
-            'BOS',
-            'BRK',
-            'CHI',
-            'CHO',
-            'CLE',
-            'DAL',
-            'DEN',
-            'DET',
-            'GSW',
-            'HOU',
-            'IND',
-            'LAC',
-            'LAL',
-            'MEM',
-            'MIA',
-            'MIL',
-            'MIN',
-            'NOP',
-            'NYK',
-            'OKC',
-            'ORL',
-            'PHI',
-            'PHO',
-            'POR',
-            'SAC',
-            'SAS',
-            'TOR',
-            'UTA',
-            'WAS',  
-        )
-        output = []
-        for team in team_list:
-            output.extend(get_output_for_team(team, season, post_season_bool))
-    else:
-        output = get_output_for_team(team, season, post_season_bool)
-    
-    if all_team_bool:
-        header_row = output[0]
-        data = output[1:]
-        data = [i for i in data if i != header_row]
-        data = [i[1:] for i in data]
-        data = list(map(list, set(map(tuple, data))))
-        data.insert(0, header_row[1:])
-        write_output(data, "ALL", season, post_season_bool)
-    else:
+def get_output_for_team(team, season, post_season_bool):
+    """Given team name, season, and post-season bool, output game logs.
+
+    Args:
+        team: team name
+        season: season number
+        post_season_bool: bool to indicate rs or ps
+    """
+    soup = scrape_team_season_log_page(determine_team_season_log_url(team, season))
+    return get_output_from_soup(soup, team, post_season_bool)
+
+
+def fetch_page_or_error(team_season_log_urls):
+    """Download Team Log Page, returning the error instead of exiting.
+
+    Args:
+        team_season_log_urls: URL to download
+
+    Returns:
+        raw HTML of team log page or None, and SystemExit or None
+    """
+    try:
+        return fetch_team_season_log_page(team_season_log_urls), None
+    except SystemExit as err:
+        return None, err
+
+
+async def iter_team_pages(teams, season, concurrency=DEFAULT_CONCURRENCY, missing=None):
+    """Download pages for many teams at once, yielding each as it arrives.
+
+    Raises:
+        SystemExit: HTTPError for any team season, other than a page not
+            found when missing is given
+
+    Args:
+        teams: team names
+        season: season number
+        concurrency: most pages downloaded at once
+        missing: list to add team and season to for each page not found,
+            instead of raising
+
+    Yields:
+        team name and raw HTML of team log page, in order of arrival
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(team):
+        async with semaphore:
+            url = determine_team_season_log_url(team, season)
+            return (team, *await asyncio.to_thread(fetch_page_or_error, url))
+
+    tasks = [asyncio.create_task(fetch(team)) for team in teams]
+    try:
+        for next_page in asyncio.as_completed(tasks):
+            team, page, err = await next_page
+            if err is not None:
+                if missing is not None and page_not_found(err):
+                    missing.append((team, season))
+                    continue
+                raise err
+            yield team, page
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def get_output_from_page(team_season_log_page, team, post_season_bool):
+    """Parse a downloaded team page and standardize its game logs.
+
+    Args:
+        team_season_log_page: raw HTML of team log page
+        team: team name
+        post_season_bool: bool to indicate rs or ps
+
+    Returns:
+        game logs with header row, or an empty list if the page has no
+        table for the season type
+    """
+    return get_output_from_soup(parse_team_season_log_page(team_season_log_page), team, post_season_bool)
+
+
+async def get_output_for_teams(teams, season, post_season_bool, concurrency=DEFAULT_CONCURRENCY, missing=None):
+    """Download pages for many teams at once and parse each as it arrives.
+
+    Pages are parsed in worker threads so the event loop keeps starting
+    downloads while a page is parsed.
+
+    Raises:
+        SystemExit: HTTPError for any team season, other than a page not
+            found when missing is given
+
+    Args:
+        teams: team names
+        season: season number
+        post_season_bool: bool to indicate rs or ps
+        concurrency: most pages downloaded at once
+        missing: list to add team and season to for each page not found,
+            instead of raising
+
+    Returns:
+        list of game logs for each team found, in the order of teams
+    """
+    outputs = {}
+    async for team, page in iter_team_pages(teams, season, concurrency, missing):
+        outputs[team] = await asyncio.to_thread(get_output_from_page, page, team, post_season_bool)
+    return [outputs[team] for team in teams if team in outputs]
+
+
+def get_season_output(team, season, post_season_bool, concurrency=DEFAULT_CONCURRENCY, missing=None):
+    """Get the game logs for one team, or every team, in a season.
+
+    For every team, the teams in use that season are scraped. In either
+    mode, pages that are not found are skipped and added to missing.
+
+    Raises:
+        SystemExit: HTTPError for team season, other than a page not found
+            when missing is given or team is 'ALL'
+
+    Args:
+        team: team name, or 'ALL' for every team
+        season: season number
+        post_season_bool: bool to indicate rs or ps
+        concurrency: most pages downloaded at once for every team
+        missing: list to add team and season to for each page not found,
+            instead of raising
+
+    Returns:
+        game logs with header row, one row per game for every team, or an
+        empty list if there are no games
+    """
+    if team != 'ALL':
+        try:
+            return get_output_for_team(team, season, post_season_bool)
+        except SystemExit as err:
+            if missing is None or not page_not_found(err):
+                raise
+            missing.append((team, season))
+            return []
+
+    if missing is None:
+        missing = []
+    output = []
+    for team_output in asyncio.run(get_output_for_teams(teams_for_season(season), season, post_season_bool, concurrency, missing)):
+        output.extend(team_output)
+    if not output:
+        return []
+    header_row = output[0]
+    data = output[1:]
+    data = [i[1:] for i in data if i != header_row]
+    data = index_games(header_row[1:], data)
+    data.insert(0, header_row[1:])
+    return data
+
+
+def iter_season_range_output(team, first_season, last_season, post_season_bool, concurrency=DEFAULT_CONCURRENCY, missing=None):
+    """Yield game logs season by season, with a single header row.
+
+    Only one season is held in memory at a time. Seasons without games
+    are skipped.
+
+    Raises:
+        SystemExit: columns change between seasons
+
+    Args:
+        team: team name, or 'ALL' for every team
+        first_season: first season number
+        last_season: last season number, included
+        post_season_bool: bool to indicate rs or ps
+        concurrency: most pages downloaded at once for every team
+        missing: list to add team and season to for each page not found
+
+    Yields:
+        header row, then game rows in season order
+    """
+    header_row = None
+    for season in range(int(first_season), int(last_season) + 1):
+        output = get_season_output(team, season, post_season_bool, concurrency, missing)
+        if not output:
+            continue
+        if header_row is None:
+            header_row = output[0]
+            yield header_row
+        elif output[0] != header_row:
+            raise SystemExit('Columns for {season} differ from earlier seasons'.format(season=season))
+        yield from output[1:]
+
+
+def main(team, season, post_season_bool, concurrency=DEFAULT_CONCURRENCY, last_season=None):
+    missing = []
+    if last_season is None:
+        output = get_season_output(team, season, post_season_bool, concurrency, missing)
         write_output(output, team, season, post_season_bool)
+    else:
+        output = iter_season_range_output(team, season, last_season, post_season_bool, concurrency, missing)
+        season_range = '{first}-{last}'.format(first=season, last=last_season)
+        write_output(output, team, season_range, post_season_bool)
+    for missing_team, missing_season in missing:
+        print('Skipped {team} {season}: page not found'.format(team=missing_team, season=missing_season))
+    return missing
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--team', type=str, required=True)
     parser.add_argument('--season', type=str, required=True)
+    parser.add_argument('--last-season', type=str)
     parser.add_argument('--postseason_bool', type=bool)
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help=CONCURRENCY_HELP)
+    fetcher.add_arguments(parser)
     args = parser.parse_args()
 
-    main(args.team, args.season, args.postseason_bool)
+    fetcher.configure_from_args(args)
+
+    main(args.team, args.season, args.postseason_bool, args.concurrency, args.last_season)
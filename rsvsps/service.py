@@ -0,0 +1,297 @@
+"""Serve rsvsps tables from a long running process with warm caches.
+
+Libraries stay imported and built tables stay in memory, so a repeat
+request for a player is answered without fetching, parsing or writing.
+
+    GET /players/<player_id>.json   tables as JSON
+    GET /players/<player_id>.xlsx   excel workbook bytes
+    GET /metrics                    stage metrics in Prometheus text format
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import http.server
+import io
+import json
+import os
+import re
+import socketserver
+import sys
+import threading
+import time
+
+from rsvsps import instrumentation, rsvsps
+from rsvsps.scrapers import fetcher, page_cache, player_page_scraper, table_cache
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_MAX_PLAYERS = 256
+PLAYER_PATH = re.compile(r'^/players/(\w+)\.(json|xlsx)$')
+CONTENT_TYPES = {
+    'json': 'application/json',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def build_tables(player_id):
+    """Fetch a player page and build the RS vs PS tables.
+
+    Raises:
+        SystemExit: HTTPError for player ID
+
+    Args:
+        player_id: string that is player ID.
+
+    Returns:
+        dict of table type to dataframe, or None for missing tables
+    """
+    return rsvsps.player_tables(player_page_scraper.main(player_id, 'all'))
+
+
+def encode_json(tables):
+    """Encode tables as JSON.
+
+    Args:
+        tables: dict of table type to dataframe
+
+    Returns:
+        JSON bytes with columns and rows for each table type
+    """
+    encoded = {}
+    for table_type, table in tables.items():
+        if table is None:
+            encoded[table_type] = None
+            continue
+        table = rsvsps.drop_spacer_columns(rsvsps.round_stats(table))
+        encoded[table_type] = json.loads(table.to_json(orient='split', index=False))
+    return json.dumps(encoded).encode()
+
+
+def encode_xlsx(tables):
+    """Encode tables as an excel workbook.
+
+    Args:
+        tables: dict of table type to dataframe
+
+    Returns:
+        xlsx bytes laid out like rsvsps.write_excel
+    """
+    buffer = io.BytesIO()
+    rsvsps.write_excel_sheets(buffer, tables)
+    return buffer.getvalue()
+
+
+ENCODERS = {'json': encode_json, 'xlsx': encode_xlsx}
+
+
+class PlayerTables:
+    """LRU of built tables that builds each player at most once at a time."""
+
+    def __init__(self, max_players=DEFAULT_MAX_PLAYERS, ttl=page_cache.PAGE_TTL, build=build_tables):
+        """Start with nothing built.
+
+        Args:
+            max_players: most players kept in memory
+            ttl: seconds a player's tables are served before being rebuilt
+            build: function taking a player ID and returning its tables
+        """
+        self.max_players = max_players
+        self.ttl = ttl
+        self.build = build
+        self.entries = collections.OrderedDict()
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def get(self, player_id):
+        """Get a player's tables, building them if needed.
+
+        Concurrent calls for a player that is being built wait for that
+        build instead of starting their own.
+
+        Raises:
+            SystemExit: HTTPError for player ID
+
+        Args:
+            player_id: string that is player ID.
+
+        Returns:
+            dict with the tables and their encodings made so far
+        """
+        with self.lock:
+            entry = self.entries.get(player_id)
+            if entry is not None and time.monotonic() - entry['built'] < self.ttl:
+                self.entries.move_to_end(player_id)
+                return entry
+            future = self.in_flight.get(player_id)
+            building = future is None
+            if building:
+                future = concurrent.futures.Future()
+                self.in_flight[player_id] = future
+        if not building:
+            return future.result()
+
+        try:
+            entry = {'built': time.monotonic(), 'tables': self.build(player_id), 'encoded': {}}
+        except BaseException as err:
+            with self.lock:
+                del self.in_flight[player_id]
+            future.set_exception(err)
+            raise
+        with self.lock:
+            del self.in_flight[player_id]
+            self.entries[player_id] = entry
+            self.entries.move_to_end(player_id)
+            while len(self.entries) > self.max_players:
+                self.entries.popitem(last=False)
+        future.set_result(entry)
+        return entry
+
+    def encoded(self, player_id, output_format):
+        """Get a player's tables encoded in a format.
+
+        Raises:
+            SystemExit: HTTPError for player ID
+
+        Args:
+            player_id: string that is player ID.
+            output_format: 'json' or 'xlsx'
+
+        Returns:
+            encoded bytes
+        """
+        entry = self.get(player_id)
+        body = entry['encoded'].get(output_format)
+        if body is None:
+            body = ENCODERS[output_format](entry['tables'])
+            entry['encoded'][output_format] = body
+        return body
+
+
+def error_status(err):
+    """Pick the HTTP status to answer with for a failed player.
+
+    Args:
+        err: SystemExit raised for the player
+
+    Returns:
+        404 if the site had no such player, otherwise 502
+    """
+    response = getattr(err.__cause__, 'response', None)
+    return 404 if getattr(response, 'status_code', None) == 404 else 502
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """Answer requests for player tables and metrics."""
+
+    def do_GET(self):
+        """Serve a player's tables or the metrics."""
+        if self.path == '/metrics':
+            self.send_body(200, 'text/plain; version=0.0.4', instrumentation.to_prometheus(instrumentation.snapshot() or {}).encode())
+            return
+        match = PLAYER_PATH.match(self.path)
+        if match is None:
+            self.send_error_body(404, 'Not found: {path}'.format(path=self.path))
+            return
+        player_id, output_format = match.groups()
+        try:
+            body = self.server.player_tables.encoded(player_id, output_format)
+        except SystemExit as err:
+            self.send_error_body(error_status(err), 'Could not get {player}: {err}'.format(player=player_id, err=err.__cause__ or err))
+            return
+        except Exception as err:
+            self.send_error_body(500, 'Could not build {player}: {err!r}'.format(player=player_id, err=err))
+            return
+        self.send_body(200, CONTENT_TYPES[output_format], body)
+
+    def send_body(self, status, content_type, body):
+        """Send a complete response.
+
+        Args:
+            status: HTTP status
+            content_type: Content-Type header
+            body: response bytes
+        """
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_body(self, status, message):
+        """Send an error as JSON.
+
+        Args:
+            status: HTTP status
+            message: description of the error
+        """
+        self.send_body(status, CONTENT_TYPES['json'], json.dumps({'error': message}).encode())
+
+    def log_message(self, format, *args):
+        """Log requests without the client address, which Unix sockets lack."""
+        sys.stderr.write('{time} {message}\n'.format(time=self.log_date_time_string(), message=format % args))
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP over a Unix socket, one thread per connection."""
+
+    daemon_threads = True
+
+
+def make_server(host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None, max_players=DEFAULT_MAX_PLAYERS):
+    """Make the server, listening on a local port or a Unix socket.
+
+    Args:
+        host: address to listen on
+        port: port to listen on, 0 for any free port
+        socket_path: path of a Unix socket to listen on instead of a port
+        max_players: most players kept in memory
+
+    Returns:
+        server, with its cache at server.player_tables
+    """
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixHTTPServer(socket_path, Handler)
+    else:
+        server = http.server.ThreadingHTTPServer((host, port), Handler)
+    server.player_tables = PlayerTables(max_players)
+    return server
+
+
+def main(host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None, max_players=DEFAULT_MAX_PLAYERS):
+    """Serve tables until interrupted.
+
+    Args:
+        host: address to listen on
+        port: port to listen on
+        socket_path: path of a Unix socket to listen on instead of a port
+        max_players: most players kept in memory
+    """
+    instrumentation.enable()
+    server = make_server(host, port, socket_path, max_players)
+    print('Serving on {address}'.format(address=socket_path or 'http://{0}:{1}/'.format(*server.server_address)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', type=str, default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--socket', type=str, help='Unix socket to listen on instead of a port')
+    parser.add_argument('--max-players', type=int, default=DEFAULT_MAX_PLAYERS)
+    fetcher.add_arguments(parser)
+    args = parser.parse_args()
+
+    fetcher.configure_from_args(args)
+    table_cache.configure_from_args(args)
+
+    main(args.host, args.port, args.socket, args.max_players)
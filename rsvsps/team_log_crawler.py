@@ -0,0 +1,205 @@
+"""Crawl game logs for many teams, seasons and season types in one run.
+
+Pages are downloaded in threads and standardized in a process pool, so
+waiting on the network overlaps with parsing and parsing uses every core.
+Each team's season type is written to its own csv file, the same one
+team_log_scraper writes for that team, season and season type.
+"""
+
+import argparse
+import concurrent.futures
+import os
+import time
+
+from rsvsps import batch, game_log_store
+from rsvsps.scrapers import fetcher, team_log_scraper
+
+
+def crawl_jobs(teams, first_season, last_season):
+    """List the team season pages to crawl.
+
+    Args:
+        teams: team names, or None for the teams in use each season
+        first_season: first season number
+        last_season: last season number, included
+
+    Returns:
+        list of team and season, season by season
+    """
+    return [
+        (team, season)
+        for season in range(int(first_season), int(last_season) + 1)
+        for team in (team_log_scraper.teams_for_season(season) if teams is None else teams)
+    ]
+
+
+def fetch_team_season(job):
+    """Download the game log page for a team's season.
+
+    Raises:
+        SystemExit: HTTPError for team season
+
+    Args:
+        job: team and season
+
+    Returns:
+        raw HTML of team log page
+    """
+    team, season = job
+    return team_log_scraper.fetch_team_season_log_page(team_log_scraper.determine_team_season_log_url(team, season))
+
+
+def process_page(team, season, team_season_log_page, season_types):
+    """Standardize a downloaded page and write a csv file per season type.
+
+    Args:
+        team: team name
+        season: season number
+        team_season_log_page: raw HTML of team log page
+        season_types: 'RS' and or 'PS'
+
+    Returns:
+        dict of season type to number of games written, or None if the
+        page has no table for it
+    """
+    tables = team_log_scraper.parse_team_season_log_page(team_season_log_page)
+    games = {}
+    for season_type in season_types:
+        label = game_log_store.SEASON_TYPES[season_type]
+        team_log = team_log_scraper.get_log_for_team_season_and_season_type(tables, label, team)
+        if team_log is None:
+            games[season_type] = None
+            continue
+        team_log_scraper.write_output(team_log, team, season, label)
+        games[season_type] = len(team_log) - 1
+    return games
+
+
+def run_crawl(jobs, season_types=tuple(game_log_store.SEASON_TYPES), fetch_workers=4, process_workers=None, max_pending=None, fetch=fetch_team_season):
+    """Crawl team season pages, overlapping downloads with parsing.
+
+    Pages are downloaded in threads and standardized in a process pool. At
+    most max_pending pages wait for a worker at any time, and downloads
+    wait while they do, so memory stays flat for any number of pages.
+
+    Args:
+        jobs: iterable of team and season
+        season_types: 'RS' and or 'PS'
+        fetch_workers: most pages downloaded at once
+        process_workers: number of worker processes, defaults to CPU count
+        max_pending: most pages waiting for or being processed, defaults to
+            twice the number of worker processes
+        fetch: function taking a team and season and returning its page
+
+    Returns:
+        dict of team and season to games per season type, None if the page
+        was not found, or a description of the error
+    """
+    if max_pending is None:
+        max_pending = 2 * (process_workers or os.cpu_count() or 1)
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=process_workers) as pool:
+        pending = {}
+
+        def collect(done):
+            for future in done:
+                job = pending.pop(future)
+                try:
+                    results[job] = future.result()
+                except (Exception, SystemExit) as err:
+                    results[job] = batch.describe_error(err)
+
+        for job, page, err in batch.fetch_pages(jobs, fetch_workers, fetch):
+            if err is not None:
+                results[job] = None if team_log_scraper.page_not_found(err) else batch.describe_error(err)
+                continue
+            if len(pending) >= max_pending:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                collect(done)
+            pending[pool.submit(process_page, *job, page, season_types)] = job
+        collect(concurrent.futures.as_completed(list(pending)))
+    return results
+
+
+def report(results, seconds):
+    """Print the outcome for each page and the crawl's throughput.
+
+    Args:
+        results: dict from run_crawl
+        seconds: wall time the crawl took
+
+    Returns:
+        number of pages that failed
+    """
+    failed = 0
+    skipped = 0
+    for (team, season), games in sorted(results.items(), key=lambda item: (item[0][1], item[0][0])):
+        if games is None:
+            skipped += 1
+            print('{team} {season}: skipped (page not found)'.format(team=team, season=season))
+        elif isinstance(games, str):
+            failed += 1
+            print('{team} {season}: failed ({error})'.format(team=team, season=season, error=games))
+        else:
+            counts = ', '.join(
+                '{season_type} {count}'.format(season_type=season_type, count='-' if count is None else count)
+                for season_type, count in games.items()
+            )
+            print('{team} {season}: {counts}'.format(team=team, season=season, counts=counts))
+    print('{ok} pages crawled, {skipped} skipped, {failed} failed in {seconds:.1f}s ({rate:.2f} pages/s)'.format(
+        ok=len(results) - skipped - failed,
+        skipped=skipped,
+        failed=failed,
+        seconds=seconds,
+        rate=len(results) / seconds if seconds else 0,
+    ))
+    return failed
+
+
+def main(teams, first_season, last_season, season_types=tuple(game_log_store.SEASON_TYPES), fetch_workers=4, process_workers=None, max_pending=None):
+    """Crawl every team and season given and report how each went.
+
+    Args:
+        teams: team names, or None for the teams in use each season
+        first_season: first season number
+        last_season: last season number, included
+        season_types: 'RS' and or 'PS'
+        fetch_workers: most pages downloaded at once
+        process_workers: number of worker processes
+        max_pending: most pages waiting for or being processed
+
+    Returns:
+        dict of team and season to games per season type, None if the page
+        was not found, or a description of the error
+    """
+    os.makedirs('output', exist_ok=True)
+    started = time.perf_counter()
+    results = run_crawl(crawl_jobs(teams, first_season, last_season), season_types, fetch_workers, process_workers, max_pending)
+    report(results, time.perf_counter() - started)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--teams', type=str, nargs='*', help='team names, defaults to the teams in use each season')
+    parser.add_argument('--season', type=int, required=True)
+    parser.add_argument('--last-season', type=int)
+    parser.add_argument('--season-types', type=str, nargs='+', choices=tuple(game_log_store.SEASON_TYPES), default=list(game_log_store.SEASON_TYPES))
+    parser.add_argument('--fetch-workers', type=int, default=4)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--max-pending', type=int)
+    fetcher.add_arguments(parser)
+    args = parser.parse_args()
+
+    fetcher.configure_from_args(args)
+
+    results = main(
+        args.teams,
+        args.season,
+        args.last_season or args.season,
+        args.season_types,
+        args.fetch_workers,
+        args.workers,
+        args.max_pending,
+    )
+    raise SystemExit(1 if any(isinstance(games, str) for games in results.values()) else 0)
@@ -0,0 +1,181 @@
+"""Test batch file"""
+
+import concurrent.futures
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import requests
+
+from benchmarks import bench
+from rsvsps import batch
+from rsvsps.scrapers import fetcher, page_archive, page_cache, player_index, player_page_scraper, table_cache
+
+
+def fixture_page(player_id):
+    """Read a committed benchmark player page.
+
+    Args:
+        player_id: string that is player ID.
+
+    Returns:
+        raw HTML of player page
+    """
+    with open(os.path.join(bench.DEFAULT_FIXTURES_DIR, 'players', player_id + '.html'), encoding='utf-8') as page_file:
+        return page_file.read()
+
+
+def fetch_fixture(player_id):
+    """Stand in for downloading a player page, with a 404 for unknown players."""
+    if player_id == 'cousybo01':
+        response = requests.models.Response()
+        response.status_code = 404
+        raise SystemExit from requests.exceptions.HTTPError('404 Client Error', response=response)
+    return fixture_page(player_id.split('/')[-1])
+
+
+def worker_state():
+    """Report how the fetcher and table cache are set up in a worker process."""
+    return {
+        'requests_per_minute': fetcher.limiter.rate * 60,
+        'burst': fetcher.limiter.capacity,
+        'cache_dir': os.path.dirname(fetcher.cache.path),
+        'archive': fetcher.archive.path,
+        'table_cache_dir': os.path.dirname(table_cache.cache.path),
+    }
+
+
+class TestBatch(unittest.TestCase):
+    """Test cases for each aspect of code"""
+
+    def test_read_player_ids(self):
+        """Test IDs from every source are merged in order without duplicates"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            players_file = os.path.join(tmp_dir, 'players.txt')
+            with open(players_file, 'w') as id_file:
+                id_file.write('# guards\njamesle01\n\n  grahade01  \npetrodr01\n')
+            archive = page_archive.PageArchive(os.path.join(tmp_dir, 'pages.sqlite'))
+            url = player_page_scraper.determine_player_url('cousybo01')
+            archive.store(url, page_cache.build_response(url, b'<p></p>', 'utf-8'))
+            index = player_index.PlayerIndex.from_players([
+                ('petrodr01', 'Drazen Petrovic', 1990, 1993, False),
+                ('curryst01', 'Stephen Curry', 2010, 2025, True),
+            ])
+
+            self.assertEqual(batch.read_player_ids(['petrodr01'], None), ['petrodr01'])
+            self.assertEqual(
+                batch.read_player_ids(['petrodr01', 'jamesle01'], players_file, archive, index, active_only=True),
+                ['petrodr01', 'jamesle01', 'grahade01', 'cousybo01', 'curryst01'])
+            self.assertEqual(sorted(batch.read_player_ids(None, None, index=index)), ['curryst01', 'petrodr01'])
+
+    def test_fetch_pages(self):
+        """Test downloads stay within fetch_workers and come back in order"""
+        lock = threading.Lock()
+        started = []
+        in_flight = [0, 0]
+
+        def fetch(player_id):
+            with lock:
+                started.append(player_id)
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            time.sleep(0.01 if player_id % 3 else 0.03)
+            with lock:
+                in_flight[0] -= 1
+            if player_id == 4:
+                raise SystemExit('HTTP Error: 404')
+            return 'page {0}'.format(player_id)
+
+        pages = batch.fetch_pages(range(10), 3, fetch)
+        self.assertEqual(next(pages), (0, 'page 0', None))
+        # nothing past the first fetch_workers pages is requested until asked for
+        self.assertLessEqual(len(started), 3)
+
+        results = list(pages)
+        self.assertEqual([player_id for player_id, _, _ in results], list(range(1, 10)))
+        self.assertIsInstance(results[3][2], SystemExit)
+        self.assertIsNone(results[3][1])
+        self.assertEqual(results[8], (9, 'page 9', None))
+        self.assertLessEqual(in_flight[1], 3)
+
+    def test_run_batch_and_report(self):
+        """Test a failing player is reported without stopping the others"""
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.mkdir(os.path.join(tmp_dir, 'output'))
+            os.chdir(tmp_dir)
+            try:
+                results = batch.run_batch(
+                    ['petrodr01', 'cousybo01', 'missing/grahade01', 'jamesle01'],
+                    fetch_workers=2,
+                    process_workers=1,
+                    max_pending=1,
+                    output_format='csv',
+                    fetch=fetch_fixture,
+                )
+                written = sorted(os.listdir('output'))
+            finally:
+                os.chdir(cwd)
+
+        self.assertEqual(results['petrodr01'], None)
+        self.assertEqual(results['jamesle01'], None)
+        self.assertEqual(results['cousybo01'], 'HTTPError: 404 Client Error')
+        # output that cannot be written fails in the worker process
+        self.assertTrue(results['missing/grahade01'].startswith('OSError'))
+        self.assertIn('petrodr01_per_game.csv', written)
+        self.assertIn('jamesle01_advanced.csv', written)
+
+        with mock.patch('builtins.print') as printed:
+            self.assertEqual(batch.report(results), 2)
+        lines = [call.args[0] for call in printed.call_args_list]
+        self.assertIn('petrodr01: ok', lines)
+        self.assertIn('cousybo01: failed (HTTPError: 404 Client Error)', lines)
+        self.assertEqual(lines[-1], '2 succeeded, 2 failed')
+
+    def test_spawned_workers_are_configured(self):
+        """Test workers get the parent's setup without fork, with the rate split between them"""
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.mkdir(os.path.join(tmp_dir, 'output'))
+            self.addCleanup(fetcher.configure)
+            self.addCleanup(fetcher.configure_cache, None)
+            self.addCleanup(fetcher.configure_archive, None)
+            self.addCleanup(table_cache.configure, None)
+            fetcher.configure(30, 4)
+            fetcher.configure_cache(os.path.join(tmp_dir, 'pages'))
+            fetcher.configure_archive(os.path.join(tmp_dir, 'pages.sqlite'))
+            table_cache.configure(os.path.join(tmp_dir, 'tables'))
+
+            spawn = multiprocessing.get_context('spawn')
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=spawn,
+                initializer=batch.configure_worker,
+                initargs=(fetcher.worker_settings(2), os.path.join(tmp_dir, 'tables')),
+            ) as pool:
+                state = pool.submit(worker_state).result()
+            self.assertEqual(state, {
+                'requests_per_minute': 15,
+                'burst': 2,
+                'cache_dir': os.path.join(tmp_dir, 'pages'),
+                'archive': os.path.join(tmp_dir, 'pages.sqlite'),
+                'table_cache_dir': os.path.join(tmp_dir, 'tables'),
+            })
+
+            # the spawned worker cleans through the table cache
+            os.chdir(tmp_dir)
+            try:
+                results = batch.run_batch(['petrodr01'], process_workers=1, output_format='csv', fetch=fetch_fixture, mp_context=spawn)
+            finally:
+                os.chdir(cwd)
+            self.assertEqual(results, {'petrodr01': None})
+            self.assertEqual([player_id for player_id, _, _ in table_cache.cache.iter_tables('per_game')], ['petrodr01'])
+            table_cache.cache.connect().close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+"""Test benchmarks file"""
+
+import json
+import unittest
+
+from benchmarks import bench
+
+
+class TestBenchmarks(unittest.TestCase):
+    """Test cases for each aspect of code"""
+
+    def test_harness_smoke(self):
+        """Smoke test the harness offline; it is too loose to catch regressions"""
+        results = bench.run(bench.DEFAULT_FIXTURES_DIR, repeat=1)
+        with open(bench.DEFAULT_BASELINE_FILE) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        # every listed fixture is committed, and every baseline stage is timed
+        self.assertEqual(results['players'], list(bench.PLAYER_FIXTURES))
+        self.assertEqual(results['teams'], ['{0}_{1}'.format(team, season) for team, season in bench.TEAM_FIXTURES])
+        self.assertEqual(results['players'], baseline['players'])
+        self.assertEqual(sorted(results['stages']), sorted(baseline['stages']))
+        self.assertEqual(baseline['command'], bench.BASELINE_COMMAND)
+
+        # the baseline is from another machine, so only a far slower run
+        # counts; this checks compare runs, not that nothing regressed
+        self.assertEqual(bench.compare(results, baseline, tolerance=100), [])
+        faster_baseline = {'stages': {stage: seconds / 1000 for stage, seconds in results['stages'].items()}}
+        regressions = bench.compare(results, faster_baseline)
+        self.assertIn('player.diff', ' '.join(regressions))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+"""Test game_log file"""
+
+import unittest
+
+import numpy as np
+
+from rsvsps import game_log
+
+
+class TestGameLog(unittest.TestCase):
+    """Test cases for each aspect of code"""
+
+    def test_rows_round_trip(self):
+        """Test typed columns give back the scraped rows"""
+        header_row = ['Date', 'Home Team', 'Away Team', 'Home Team Result', 'Home Team Points', 'Home Team FG%', 'Notes']
+        rows = [
+            ['2020-01-01', 'BOS', 'MIL', 'L', '98', '.410', 'OT'],
+            ['2020-01-03', 'MIL', 'BOS', 'W', '110', '', ''],
+            ['2020-01-05', 'ATL', 'CHI', 'W', '101', '1.000', '2OT'],
+        ]
+        log = game_log.GameLog.from_rows(header_row, rows)
+
+        self.assertEqual(list(log), [header_row] + rows)
+        self.assertEqual(log.arrays[0].dtype, np.int32)
+        self.assertEqual(log.arrays[4].dtype, np.int16)
+        self.assertEqual(log.arrays[5].dtype, np.float32)
+        # home and away teams share one dictionary
+        self.assertEqual(log.categories['teams'], ['BOS', 'MIL', 'ATL', 'CHI'])
+
+        # stats and codes are handed to pandas without a copy
+        games = log.to_pandas()
+        self.assertTrue(np.shares_memory(games['Home Team Points'].to_numpy(), log.arrays[4]))
+        self.assertTrue(np.shares_memory(games['Away Team'].array.codes, log.arrays[2]))
+        self.assertEqual(list(games['Away Team']), ['MIL', 'BOS', 'CHI'])
+
+    def test_concat(self):
+        """Test joining seasons merges dictionaries and formats"""
+        header_row = ['Home Team', 'Away Team', 'Home Team FG%']
+        first = game_log.GameLog.from_rows(header_row, [['BOS', 'MIL', '.410']])
+        second = game_log.GameLog.from_rows(header_row, [['LAL', 'BOS', '0.500'], ['MIL', 'LAL', '']])
+
+        log = game_log.GameLog.concat([first, second])
+        self.assertEqual(list(log.rows()), [
+            ['BOS', 'MIL', '.410'],
+            ['LAL', 'BOS', '0.500'],
+            ['MIL', 'LAL', ''],
+        ])
+        self.assertEqual(log.categories['teams'], ['BOS', 'MIL', 'LAL'])
+
+        with self.assertRaises(SystemExit):
+            game_log.GameLog.concat([first, game_log.GameLog.from_rows(['Home Team'], [['BOS']])])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+"""Test game_log_store file"""
+
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from rsvsps import game_log, game_log_store
+from rsvsps.scrapers import team_log_scraper
+from test.test_team_log_scraper import stub_fetch, team_page
+
+
+class TestGameLogStore(unittest.TestCase):
+    """Test cases for each aspect of code"""
+
+    def test_write_and_query(self):
+        """Test columns keep game_log's encoding through a partition"""
+        header_row = ['Date', 'Home Team', 'Away Team', 'Home Team Result', 'Home Team Points', 'Home Team FG%']
+        rows = [
+            ['2020-01-01', 'BOS', 'MIL', 'L', '98', '.410'],
+            ['2020-01-03', 'MIL', 'BOS', 'W', '110', ''],
+            ['2020-01-05', 'ATL', 'CHI', 'W', '101', '.500'],
+        ]
+        with tempfile.TemporaryDirectory() as store_dir:
+            game_log_store.write_partition(store_dir, 2020, 'RS', header_row, rows)
+
+            games = game_log_store.query(store_dir, team='BOS')
+            self.assertEqual(list(games['Away Team']), ['MIL', 'BOS'])
+            self.assertEqual(str(games['Home Team Points'].dtype), 'int16')
+            self.assertEqual(str(games['Home Team FG%'].dtype), 'float32')
+            self.assertTrue(pd.isna(games['Home Team FG%'][1]))
+
+            # the stored arrays are the ones game_log encodes
+            log = game_log.GameLog.from_rows(header_row, rows)
+            with open(os.path.join(game_log_store.determine_partition_dir(store_dir, 2020, 'RS'), 'manifest.json')) as manifest_file:
+                manifest = json.load(manifest_file)
+            self.assertEqual([column['format'] for column in manifest['columns'].values()], log.formats)
+            self.assertEqual(manifest['categories'], log.categories)
+
+            # filters on side, date and season type
+            games = game_log_store.query(
+                store_dir, columns=['Home Team'], team='BOS', home_away='away', start_date='2020-01-02')
+            self.assertEqual(list(games.columns), ['Season', 'Season Type', 'Home Team'])
+            self.assertEqual(list(games['Home Team']), ['MIL'])
+            self.assertTrue(game_log_store.query(store_dir, season_types='PS').empty)
+
+    def test_ingest_season_skips_missing_pages(self):
+        """Test teams whose page is not found are skipped and listed"""
+        pages = {
+            ('SEA', 2008): team_page([('2008-01-01', '', 'POR', 101, 99)]),
+            ('POR', 2008): team_page([('2008-01-01', '@', 'SEA', 99, 101)], [('2008-04-20', '', 'UTA', 90, 80)]),
+        }
+        with tempfile.TemporaryDirectory() as store_dir:
+            with mock.patch.object(team_log_scraper, 'fetch_team_season_log_page', stub_fetch(pages)):
+                counts, missing_teams = game_log_store.ingest_season(store_dir, 2008, concurrency=3)
+            with open(os.path.join(game_log_store.determine_partition_dir(store_dir, 2008, 'RS'), 'manifest.json')) as manifest_file:
+                manifest = json.load(manifest_file)
+
+        self.assertEqual(counts, {'RS': 1, 'PS': 1})
+        # the season's teams are scraped, not today's
+        self.assertNotIn('OKC', missing_teams)
+        self.assertIn('NOH', missing_teams)
+        self.assertEqual(manifest['missing_teams'], sorted(missing_teams))
+        self.assertEqual(len(missing_teams), len(team_log_scraper.teams_for_season(2008)) - 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,22 @@
 """Test overall script for players"""
 
+import os
 import time
 import unittest
 
 from rsvsps import rsvsps
+from rsvsps.scrapers import fetcher
+
+
+def setUpModule():
+    """Use the page archive in RSVSPS_ARCHIVE, if set, instead of the site"""
+    if os.environ.get('RSVSPS_ARCHIVE'):
+        fetcher.configure_archive(os.environ['RSVSPS_ARCHIVE'], os.environ.get('RSVSPS_ARCHIVE_MODE', 'replay'))
+
+
+def tearDownModule():
+    """Stop using the page archive so later test modules go to the site"""
+    fetcher.configure_archive(None)
 
 
 class TestRsvsps(unittest.TestCase):
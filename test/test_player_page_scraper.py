@@ -1,8 +1,20 @@
 """Test rsvsps file"""
 
+import os
 import time
 import unittest
-from rsvsps.scrapers import player_page_scraper
+from rsvsps.scrapers import fetcher, player_page_scraper
+
+
+def setUpModule():
+    """Use the page archive in RSVSPS_ARCHIVE, if set, instead of the site"""
+    if os.environ.get('RSVSPS_ARCHIVE'):
+        fetcher.configure_archive(os.environ['RSVSPS_ARCHIVE'], os.environ.get('RSVSPS_ARCHIVE_MODE', 'replay'))
+
+
+def tearDownModule():
+    """Stop using the page archive so later test modules go to the site"""
+    fetcher.configure_archive(None)
 
 
 class TestRSvsPS(unittest.TestCase):
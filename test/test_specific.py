@@ -1,9 +1,88 @@
 """Test rsvsps file"""
 
+import argparse
+import concurrent.futures
+import datetime
+import importlib.util
+import os
+import tempfile
+import threading
 import time
 import unittest
+from unittest import mock
 
-from rsvsps.scrapers import player_page_scraper
+import pandas as pd
+from bs4 import BeautifulSoup, SoupStrainer
+
+from rsvsps import instrumentation, leaderboard, rsvsps, service
+from rsvsps.scrapers import fetcher, page_archive, page_cache, player_index, player_page_scraper, table_cache, table_extractor, team_log_scraper
+from test.test_batch import fixture_page
+from test.test_team_log_scraper import team_page
+
+PER_GAME_HEADER = [
+    ('season', 'Season'), ('age', 'Age'), ('team_id', 'Tm'), ('lg_id', 'Lg'), ('pos', 'Pos'), ('g', 'G'),
+    ('gs', 'GS'), ('mp_per_g', 'MP'), ('fg_per_g', 'FG'), ('fga_per_g', 'FGA'), ('fg_pct', 'FG%'), ('pts_per_g', 'PTS'),
+]
+
+
+def per_game_table(table_id, seasons, career):
+    """Build a per game table the way basketball-reference lays it out.
+
+    Args:
+        table_id: id of table
+        seasons: rows of cell text, or season, age and reason for a Did
+            Not Play season
+        career: row of cell text for the career totals
+
+    Returns:
+        HTML of table, with a blank spacer row after the first season
+    """
+    def table_row(cells):
+        if len(cells) == 3:
+            return (
+                '<tr><th data-stat="season">{0}</th><td data-stat="age">{1}</td>'
+                '<td data-stat="reason" colspan="{2}">{3}</td></tr>'.format(cells[0], cells[1], len(PER_GAME_HEADER) - 2, cells[2])
+            )
+        return '<tr><th data-stat="season">{0}</th>'.format(cells[0]) + ''.join(
+            '<td data-stat="{0}">{1}</td>'.format(stat, cell) for (stat, _), cell in zip(PER_GAME_HEADER[1:], cells[1:])
+        ) + '</tr>'
+
+    header = '<tr>' + ''.join('<th data-stat="{0}">{1}</th>'.format(stat, label) for stat, label in PER_GAME_HEADER) + '</tr>'
+    body = [table_row(seasons[0]), '<tr class="spacer"><th data-stat="season"></th></tr>'] + [table_row(cells) for cells in seasons[1:]]
+    return '<table id="{0}"><thead>{1}</thead><tbody>{2}</tbody><tfoot>{3}</tfoot></table>'.format(
+        table_id, header, ''.join(body), table_row(career))
+
+
+def soup_tables(page, table_ids):
+    """Read tables into rows of cell text the way the BeautifulSoup scrapers did.
+
+    Args:
+        page: raw HTML of the page
+        table_ids: ids of the tables to read
+
+    Returns:
+        dict of table id to rows of cell text, header rows included
+    """
+    soup = BeautifulSoup(page.replace('<!--', '').replace('-->', ''), 'lxml', parse_only=SoupStrainer(id=list(table_ids)))
+    return {
+        table.attrs['id']: [[cell.text for cell in row.find_all(['th', 'td'])] for row in table.find_all('tr')]
+        for table in soup.find_all('table')
+    }
+
+
+def output_dir(test):
+    """Run a test from a temporary folder with an output folder in it"""
+    tmp_dir = tempfile.TemporaryDirectory()
+    test.addCleanup(tmp_dir.cleanup)
+    os.makedirs(os.path.join(tmp_dir.name, 'output'))
+    test.addCleanup(os.chdir, os.getcwd())
+    os.chdir(tmp_dir.name)
+
+
+def fixture_tables(player_id):
+    """Build the output tables from a committed benchmark player page"""
+    player_page = player_page_scraper.parse_player_page(fixture_page(player_id))
+    return rsvsps.player_tables(player_page_scraper.get_player_data(player_page, 'all'))
 
 
 class TestRSvsPS(unittest.TestCase):
@@ -24,7 +103,483 @@ class TestRSvsPS(unittest.TestCase):
         # blank player_ID
         with self.assertRaises(SystemExit):
             player_page_scraper.determine_player_url("")
-        
+
+    def test_extract_tables(self):
+        """Test single pass table extraction"""
+        page = (
+            '<div data-id="per_game"><table class="stats" id="per_game">'
+            '<tr><td>1</td></tr></table></div>'
+            '<!--\n<table id="advanced"><tr><td>2</td></tr></table>\n-->'
+            '<table id="other"><tr><td>3</td></tr></table>'
+        )
+        tables = table_extractor.extract_tables(page, ('per_game', 'advanced', 'per_poss'))
+
+        # live and commented tables are both found, missing ones are absent
+        self.assertEqual(sorted(tables), ['advanced', 'per_game'])
+        self.assertEqual(tables['per_game'].findtext('.//td'), '1')
+        self.assertEqual(tables['advanced'].findtext('.//td'), '2')
+
+    def test_table_rows(self):
+        """Test reading cells into rows by data-stat"""
+        table = table_extractor.parse_table(
+            '<table id="advanced"><thead><tr>'
+            '<th data-stat="season">Season</th><th data-stat="age">Age</th><th data-stat="team_id">Tm</th>'
+            '<th data-stat="DUMMY"></th><th data-stat="ws">WS</th><th data-stat="DUMMY"></th><th data-stat="bpm">BPM</th>'
+            '</tr></thead><tbody>'
+            '<tr><th data-stat="season">1990-91</th><td data-stat="age">26</td><td data-stat="team_id">NJN</td>'
+            '<td data-stat="DUMMY"></td><td data-stat="ws">2.1</td><td data-stat="DUMMY"></td><td data-stat="bpm">1.5</td></tr>'
+            '<tr class="thead"><th data-stat="season">Season</th><th data-stat="age">Age</th></tr>'
+            '<tr><th data-stat="season">1991-92</th><td data-stat="age">27</td>'
+            '<td data-stat="reason" colspan="5">Did Not Play (injury)</td></tr>'
+            '<tr><th data-stat="season"></th></tr>'
+            '<tr><th data-stat="season">1992-93</th><td data-stat="bpm">4.0</td><td data-stat="age">28</td></tr>'
+            '</tbody></table>'
+        )
+        header_stats, header_labels, rows = table_extractor.table_rows(table)
+
+        self.assertEqual(header_stats, ['season', 'age', 'team_id', 'DUMMY', 'ws', 'DUMMY', 'bpm'])
+        self.assertEqual(header_labels, ['Season', 'Age', 'Tm', '', 'WS', '', 'BPM'])
+        # repeated headers and blank rows are skipped, cells land by data-stat
+        self.assertEqual(rows, [
+            ['1990-91', '26', 'NJN', '', '2.1', '', '1.5'],
+            ['1991-92', '27', 'Did Not Play (injury)', '', '', '', ''],
+            ['1992-93', '28', '', '', '', '', '4.0'],
+        ])
+
+    def test_table_rows_match_beautifulsoup(self):
+        """Test lxml tables clean to the same rows as the BeautifulSoup scrapers"""
+        page = '<html><body>' + per_game_table('per_game', [
+            ['1990-91', '26', 'NJN', 'NBA', 'SG', '82', '80', '35.1', '7.8', '15.9', '.492', '20.0'],
+            ['1991-92', '27', 'Did Not Play (injury)'],
+            ['1992-93', '28', 'NJN', 'NBA', 'SG', '70', '70', '34.0', '8.0', '16.0', '', '22.5'],
+        ], ['Career', '', '', 'NBA', '', '152', '150', '34.6', '7.9', '15.9', '.497', '21.2']) + '<!--\n' + per_game_table('playoffs_per_game', [
+            ['1991-92', '27', 'NJN', 'NBA', 'SG', '3', '3', '36.3', '9.0', '17.0', '.529', '24.3'],
+        ], ['Career', '', '', 'NBA', '', '3', '3', '36.3', '9.0', '17.0', '.529', '24.3']) + '\n--></body></html>'
+
+        soup = soup_tables(page, ('per_game', 'playoffs_per_game'))
+        tables = player_page_scraper.parse_player_page(page)
+        for label, qualifier in player_page_scraper.QUALIFIERS.items():
+            rows = soup[qualifier + 'per_game']
+            expected = [[*row, *[''] * (len(rows[0]) - 3)] if 'Did Not Play' in row[2] else row for row in rows[1:] if row[0] != '']
+            expected = [[*row, label] for row in expected]
+            if label == 'RS':
+                expected = [rows[0] + ['RSPS', 'diff_qualifier']] + expected
+            self.assertEqual(player_page_scraper.clean_table(tables, label, 'per_game'), expected)
+
+        page = team_page(
+            [('2020-01-01', '', 'MIL', 110, 98), ('2020-01-03', '@', 'CHI', 95, 101), ('2020-01-05', '@', 'ATL', 120, 99)],
+            [('2020-04-20', '@', 'MIA', 100, 105), ('2020-04-22', '', 'MIA', 112, 104)],
+        )
+        soup = soup_tables(page, team_log_scraper.TEAM_TABLE_IDS)
+        tables = team_log_scraper.parse_team_season_log_page(page)
+        for label, table_id in team_log_scraper.TEAM_TABLE_KEYS.items():
+            rows = soup[table_id]
+            # the over header and header rows, then games without repeated header rows
+            rows = rows[1:2] + [row for row in rows[2:] if row[0] not in {'', 'Rk'}]
+            stats = (len(rows[0]) - 9) // 2
+            rows[0] = rows[0][:8] + ['Team ' + stat for stat in rows[0][8:8 + stats]] + [''] + ['Opponent ' + stat for stat in rows[0][9 + stats:]]
+            self.assertEqual(
+                team_log_scraper.get_log_for_team_season_and_season_type(tables, label, 'BOS'),
+                team_log_scraper.standardize_cols_for_home_court(rows, 'BOS'))
+
+    def test_table_registry(self):
+        """Test tables are found once and looked up by id or label"""
+        page = (
+            '<table id="per_game"><tr><th>Season</th><th>Tm</th><th>PTS</th></tr>'
+            '<tr><th>1990-91</th><td>NJN</td><td>20.0</td></tr></table>'
+            '<!--\n<table id="playoffs_per_game"><tr><th>Season</th><th>Tm</th><th>PTS</th></tr>'
+            '<tr><th>1991-92</th><td>NJN</td><td>22.0</td></tr></table>\n-->'
+        )
+        tables = table_extractor.TableRegistry(page, player_page_scraper.PLAYER_TABLE_KEYS)
+
+        self.assertIn(('PS', 'per_game'), tables)
+        self.assertNotIn(('RS', 'advanced'), tables)
+        self.assertIsNone(tables.get(('RS', 'advanced')))
+        # a table is parsed once and shared by its id and its label
+        self.assertIs(tables.get(('RS', 'per_game')), tables.get('per_game'))
+        self.assertEqual(tables.markup('playoffs_per_game')[:26], '<table id="playoffs_per_ga')
+
+        # tables asked for from several threads at once are parsed once
+        tables = table_extractor.TableRegistry(page, player_page_scraper.PLAYER_TABLE_KEYS)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            parsed = list(executor.map(tables.get, ['per_game', ('RS', 'per_game')] * 8))
+        self.assertTrue(all(table is parsed[0] for table in parsed))
+        self.assertEqual(player_page_scraper.get_player_data(tables, 'advanced'), (None, None))
+
+    def test_differences_match_reference(self):
+        """Test column-wise differences match the row by row reference"""
+        column_headers = ['Season', 'Tm', 'G', 'PTS', 'RSPS', 'diff_qualifier']
+        combined = [
+            ['1990-91', 'TOT', '70', '20.0', 'RS', '01990-91'],
+            ['1990-91', 'NJN', '40', '21.0', 'RS', '01990-91'],
+            ['1990-91', 'NJN', '5', '25.5', 'PS', '01990-91'],
+            ['1991-92', 'NJN', '80', '22.0', 'RS', '01991-92'],
+            ['Career', '', '150', '21.0', 'RS', '2'],
+            ['Career', '', '5', '25.5', 'PS', '2'],
+        ]
+        vectorized = rsvsps.player_single_table_type(
+            column_headers, [list(row) for row in combined], 'per_game')
+        reference = rsvsps.player_single_table_type(
+            column_headers, [list(row) for row in combined], 'per_game', reference=True)
+        pd.testing.assert_frame_equal(vectorized, reference)
+
+        # seasons with both RS and PS get a difference, RS-only seasons do not
+        self.assertEqual(vectorized.at[3, 'PTS'], 5.5)
+        self.assertTrue(pd.isna(vectorized.at[5, 'PTS']))
+        self.assertEqual(vectorized.at[8, 'PTS'], 4.5)
+
+    def test_table_cache_encoding(self):
+        """Test cleaned tables survive the table cache encoding"""
+        column_headers = ['Season', 'Age', 'Tm', 'RSPS', 'diff_qualifier']
+        combined = [
+            ['1990-91', '26', 'NJN', 'RS', '01990-91'],
+            ['1991-92', 'Did Not Play', 'RS', '01991-92'],
+        ]
+        self.assertEqual(
+            table_cache.decode(table_cache.encode(column_headers, combined)),
+            (column_headers, combined))
+
+        # missing tables
+        self.assertEqual(table_cache.decode(table_cache.encode(None, None)), (None, None))
+
+    def test_table_cache_version(self):
+        """Test tables cleaned by an older version are misses"""
+        markups = ('<table id="per_game"></table>', None)
+        column_headers = ['Season', 'Tm', 'RSPS', 'diff_qualifier']
+        combined = [['1990-91', 'NJN', 'RS', '01990-91']]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = table_cache.TableCache(cache_dir)
+            with mock.patch.object(table_cache, 'CLEANING_VERSION', table_cache.CLEANING_VERSION - 1):
+                cache.store('petrodr01', 'per_game', table_cache.digest(markups), column_headers, combined)
+            self.assertIsNone(cache.lookup('petrodr01', 'per_game', table_cache.digest(markups)))
+            self.assertEqual(list(cache.iter_tables('per_game')), [])
+
+            cache.store('petrodr01', 'per_game', table_cache.digest(markups), column_headers, combined)
+            self.assertEqual(cache.lookup('petrodr01', 'per_game', table_cache.digest(markups)), (column_headers, combined))
+            self.assertEqual(list(cache.iter_tables('per_game')), [('petrodr01', column_headers, combined)])
+            cache.connect().close()
+
+    def test_configure_from_args(self):
+        """Test the table cache is configured apart from the fetcher"""
+        self.addCleanup(table_cache.configure, None)
+        self.addCleanup(fetcher.configure_cache, None)
+        self.addCleanup(fetcher.configure)
+        parser = argparse.ArgumentParser()
+        fetcher.add_arguments(parser)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            args = parser.parse_args(['--cache-dir', cache_dir])
+            table_cache.configure(None)
+            fetcher.configure_from_args(args)
+            self.assertIsNotNone(fetcher.cache)
+            self.assertIsNone(table_cache.cache)
+
+            table_cache.configure_from_args(args)
+            self.assertIsInstance(table_cache.cache, table_cache.TableCache)
+
+    def test_token_bucket(self):
+        """Test a burst goes out at once and later requests keep to the rate"""
+        now = [100.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        with mock.patch.object(fetcher.time, 'monotonic', lambda: now[0]), \
+                mock.patch.object(fetcher.time, 'sleep', sleep):
+            bucket = fetcher.TokenBucket(requests_per_minute=30, burst=3)
+            for _ in range(5):
+                bucket.acquire()
+            # three back to back, then one every two seconds
+            self.assertEqual(sleeps, [2.0, 2.0])
+            self.assertEqual(now[0], 104.0)
+
+            # idle time refills the bucket, but never past the burst
+            now[0] += 60
+            for _ in range(4):
+                bucket.acquire()
+            self.assertEqual(sleeps, [2.0, 2.0, 2.0])
+
+        with self.assertRaises(SystemExit):
+            fetcher.TokenBucket(requests_per_minute=0, burst=1)
+        with self.assertRaises(SystemExit):
+            fetcher.TokenBucket(requests_per_minute=20, burst=0)
+
+    def test_page_cache_ttl(self):
+        """Test finished seasons never expire and the current one soon does"""
+        today = datetime.date(2020, 1, 15)
+        self.assertEqual(page_cache.current_season(today), 2020)
+        self.assertEqual(page_cache.current_season(datetime.date(2020, 8, 1)), 2021)
+
+        team_url = team_log_scraper.determine_team_season_log_url
+        self.assertIsNone(page_cache.ttl_for_url(team_url('BOS', 2019), today))
+        self.assertEqual(page_cache.ttl_for_url(team_url('BOS', 2020), today), 60 * 60)
+        self.assertEqual(page_cache.ttl_for_url(team_url('BOS', 2021), today), 60 * 60)
+        self.assertEqual(
+            page_cache.ttl_for_url(player_page_scraper.determine_player_url('petrodr01'), today),
+            page_cache.PAGE_TTL)
+
+    def test_page_cache_eviction(self):
+        """Test least recently used pages are evicted to stay within budget"""
+        clock = iter(range(1000, 2000))
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                mock.patch.object(page_cache.time, 'time', lambda: next(clock)):
+            cache = page_cache.PageCache(cache_dir, max_bytes=2500)
+            urls = [player_page_scraper.determine_player_url(player_id) for player_id in ('a01', 'b01', 'c01', 'd01')]
+            for url in urls[:2]:
+                cache.store(url, page_cache.build_response(url, os.urandom(1000), 'utf-8'))
+            # using the first page makes the second the least recently used
+            self.assertIsNotNone(cache.lookup(urls[0]))
+            stored = []
+            for url in urls[2:]:
+                cache.store(url, page_cache.build_response(url, os.urandom(1000), 'utf-8'))
+                total = cache.connect().execute('SELECT SUM(size) FROM pages').fetchone()[0]
+                self.assertLessEqual(total, cache.max_bytes)
+                stored.append(sorted(row[0] for row in cache.connect().execute('SELECT url FROM pages')))
+            self.assertEqual(stored, [[urls[0], urls[2]], [urls[2], urls[3]]])
+
+    def test_page_cache_revalidation(self):
+        """Test a 304 renews the stored page instead of replacing its body"""
+        url = player_page_scraper.determine_player_url('petrodr01')
+        page = page_cache.build_response(url, b'<p>first</p>', 'utf-8')
+        page.headers['ETag'] = '"v1"'
+        page.headers['Last-Modified'] = 'Wed, 01 Jan 2020 00:00:00 GMT'
+        requests_made = []
+
+        def fetch(fetch_url, headers):
+            requests_made.append(headers)
+            response = page_cache.build_response(fetch_url, b'', 'utf-8')
+            response.status_code = 304
+            return response
+
+        now = [1000.0]
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                mock.patch.object(page_cache.time, 'time', lambda: now[0]):
+            cache = page_cache.PageCache(cache_dir)
+            cache.store(url, page)
+
+            # fresh pages are served without asking the site
+            self.assertEqual(cache.get(url, fetch).content, b'<p>first</p>')
+            self.assertEqual(requests_made, [])
+
+            now[0] += page_cache.PAGE_TTL + 1
+            self.assertEqual(cache.get(url, fetch).content, b'<p>first</p>')
+            self.assertEqual(requests_made, [{
+                'If-None-Match': '"v1"',
+                'If-Modified-Since': 'Wed, 01 Jan 2020 00:00:00 GMT',
+            }])
+            entry = cache.lookup(url)
+            self.assertTrue(entry['fresh'])
+            self.assertEqual((entry['body'], entry['etag']), (b'<p>first</p>', '"v1"'))
+            self.assertEqual(cache.get(url, fetch).content, b'<p>first</p>')
+            self.assertEqual(len(requests_made), 1)
+
+    def test_page_archive(self):
+        """Test replaying recorded pages"""
+        with tempfile.TemporaryDirectory() as archive_dir:
+            archive = page_archive.PageArchive(os.path.join(archive_dir, 'pages.sqlite'))
+            url = player_page_scraper.determine_player_url('petrodr01')
+            archive.store(url, page_cache.build_response(url, '<p>Dražen</p>'.encode(), 'utf-8'))
+
+            response = archive.replay(url)
+            self.assertEqual((response.status_code, response.text), (200, '<p>Dražen</p>'))
+            self.assertEqual(page_archive.player_ids(archive), ['petrodr01'])
+
+            # pages never recorded are errors, not downloads
+            with self.assertRaises(SystemExit):
+                archive.replay(player_page_scraper.determine_player_url('cousybo01'))
+
+    def test_service_builds_player_once(self):
+        """Test concurrent requests for a player share one build"""
+        builds = []
+        release = threading.Event()
+
+        def build(player_id):
+            builds.append(player_id)
+            release.wait(5)
+            return {'per_game': None}
+
+        player_tables = service.PlayerTables(max_players=1, build=build)
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            futures = [executor.submit(player_tables.get, 'petrodr01') for _ in range(4)]
+            time.sleep(0.1)
+            release.set()
+            entries = [future.result() for future in futures]
+        self.assertEqual(builds, ['petrodr01'])
+        self.assertTrue(all(entry is entries[0] for entry in entries))
+
+        # least recently used player is dropped when over max_players
+        player_tables.get('cousybo01')
+        self.assertEqual(list(player_tables.entries), ['cousybo01'])
+
+    def test_leaderboard(self):
+        """Test ranking cached players by playoff change"""
+        column_headers = ['Season', 'Tm', 'G', 'MP', 'PTS', 'RSPS', 'diff_qualifier']
+        players = {
+            'petrodr01': [
+                ['1992-93', 'TOT', '70', '30.0', '20.0', 'RS', '01992-93'],
+                ['1992-93', 'NJN', '40', '30.0', '18.0', 'RS', '01992-93'],
+                ['1992-93', 'NJN', '5', '35.0', '25.0', 'PS', '01992-93'],
+                ['Career', '', '70', '30.0', '20.0', 'RS', '2'],
+                ['Career', '', '5', '35.0', '25.0', 'PS', '2'],
+            ],
+            'cousybo01': [
+                ['1950-51', 'BOS', '69', '40.0', '15.6', 'RS', '01950-51'],
+                ['1950-51', 'BOS', '2', '40.0', '10.0', 'PS', '01950-51'],
+                ['Career', '', '69', '40.0', '15.6', 'RS', '2'],
+                ['Career', '', '2', '40.0', '10.0', 'PS', '2'],
+            ],
+        }
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = table_cache.TableCache(cache_dir)
+            for player_id, combined in players.items():
+                cache.store(player_id, 'per_game', '', column_headers, combined)
+            deltas = leaderboard.build_deltas(leaderboard.read_cached_tables(cache, 'per_game'))
+
+        # mid-season trades compare against the season total row
+        self.assertAlmostEqual(deltas.loc[('petrodr01', '1992-93'), ('Diff', 'PTS')], 5.0, places=4)
+        board = leaderboard.rank(deltas, 'per_game', 'PTS')
+        self.assertEqual(list(board['Player']), ['petrodr01', 'cousybo01'])
+        self.assertEqual(list(board['Diff']), [5.0, -5.6])
+
+        # playoff minutes in per_game tables are games times minutes per game
+        board = leaderboard.rank(deltas, 'per_game', 'PTS', scope='season', min_minutes=100)
+        self.assertEqual(list(board['Player']), ['petrodr01'])
+
+        # only the stats the player sheets difference can be ranked
+        with self.assertRaises(SystemExit):
+            leaderboard.rank(deltas, 'per_game', 'MP')
+
+    def test_leaderboard_matches_player_sheet(self):
+        """Test leaderboard differences are the ones on the player's sheet"""
+        player_page = player_page_scraper.parse_player_page(fixture_page('petrodr01'))
+        player_data = player_page_scraper.get_player_data(player_page, 'all')
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = table_cache.TableCache(cache_dir)
+            for table_type, (column_headers, combined) in zip(player_page_scraper.TABLE_TYPES, player_data):
+                cache.store('petrodr01', table_type, '', column_headers, combined)
+            for table_type, (column_headers, combined) in zip(player_page_scraper.TABLE_TYPES, player_data):
+                deltas = leaderboard.build_deltas(leaderboard.read_cached_tables(cache, table_type))
+                sheet = rsvsps.player_single_table_type(column_headers, combined, table_type, reference=True)
+                career_ps = sheet.index[(sheet['Season'] == 'Career') & (sheet['RSPS'] == 'PS')][0]
+                diff_row = sheet.loc[career_ps + 1]
+                differences = deltas.loc[('petrodr01', 'Career'), 'Diff']
+                stats = [stat for stat in differences.index if stat in sheet.columns]
+                self.assertTrue(stats)
+                pd.testing.assert_series_equal(
+                    differences[stats].astype('float64'),
+                    diff_row[stats].astype('float64'),
+                    check_names=False,
+                    atol=1e-4,
+                )
+                self.assertNotIn('MP', differences.index)
+
+    def test_player_index(self):
+        """Test building and searching the player index"""
+        directory_page = (
+            '<table id="players"><tr><th data-stat="player">Player</th></tr>'
+            '<tr><th data-append-csv="petrodr01" data-stat="player"><a>Dražen Petrović</a>*</th>'
+            '<td data-stat="year_min">1990</td><td data-stat="year_max">1993</td></tr>'
+            '<tr><th data-append-csv="jamesle01" data-stat="player"><strong><a>LeBron James</a></strong></th>'
+            '<td data-stat="year_min">2004</td><td data-stat="year_max">2025</td></tr>'
+            '</table>'
+        )
+        players = player_index.parse_directory_page(directory_page)
+        self.assertEqual(players[0], ('petrodr01', 'Dražen Petrović', 1990, 1993, False))
+
+        with tempfile.TemporaryDirectory() as index_dir:
+            fname = os.path.join(index_dir, 'players.json.gz')
+            player_index.PlayerIndex.from_players(players).save(fname)
+            index = player_index.load(fname)
+
+        # IDs, accent-free name prefixes and misspellings all resolve
+        self.assertEqual(index.resolve('petrodr01'), 'petrodr01')
+        self.assertEqual(index.resolve('drazen petro'), 'petrodr01')
+        self.assertEqual(index.resolve('lebr jam'), 'jamesle01')
+        self.assertEqual(index.resolve('lebron jmaes'), 'jamesle01')
+        self.assertEqual(index.ids(active_only=True), ['jamesle01'])
+        with self.assertRaises(SystemExit):
+            index.resolve('cousy')
+
+    def test_drop_spacer_columns(self):
+        """Test blank spacer columns are dropped and named ones kept"""
+        table = pd.DataFrame([[1, None, 2, None, 'RS']], columns=['G', '', 'WS', '', 'RSPS'])
+        self.assertEqual(list(rsvsps.drop_spacer_columns(table).columns), ['G', 'WS', 'RSPS'])
+
+        tables = fixture_tables('petrodr01')
+        self.assertFalse(tables['advanced'].columns.is_unique)
+        for table in tables.values():
+            trimmed = rsvsps.drop_spacer_columns(table)
+            self.assertTrue(trimmed.columns.is_unique)
+            self.assertNotIn('', trimmed.columns)
+
+    def test_write_table_files_round_trip(self):
+        """Test csv and jsonl files read back to the rounded tables"""
+        output_dir(self)
+        tables = fixture_tables('petrodr01')
+        for output_format in ('csv', 'jsonl'):
+            fnames = rsvsps.write_output('petrodr01', tables, output_format)
+            self.assertEqual(fnames, [
+                'output/petrodr01_{0}.{1}'.format(table_type, output_format) for table_type in tables])
+            for fname, table in zip(fnames, tables.values()):
+                expected = rsvsps.drop_spacer_columns(rsvsps.round_stats(table)).reset_index(drop=True)
+                text_columns = [column for column in expected.columns if expected[column].dtype != 'float64']
+                expected = expected.astype({column: object for column in text_columns})
+                if output_format == 'csv':
+                    written = pd.read_csv(fname, converters={column: str for column in text_columns})
+                else:
+                    written = pd.read_json(fname, lines=True, dtype=False, convert_dates=False)
+                pd.testing.assert_frame_equal(written, expected, check_dtype=False)
+
+    @unittest.skipIf(importlib.util.find_spec('pyarrow') is None, 'parquet output needs pyarrow')
+    def test_write_parquet_round_trip(self):
+        """Test parquet files read back to the rounded tables"""
+        output_dir(self)
+        tables = fixture_tables('petrodr01')
+        fnames = rsvsps.write_output('petrodr01', tables, 'parquet')
+        for fname, table in zip(fnames, tables.values()):
+            expected = rsvsps.drop_spacer_columns(rsvsps.round_stats(table)).reset_index(drop=True)
+            pd.testing.assert_frame_equal(pd.read_parquet(fname), expected, check_dtype=False, check_categorical=False)
+
+    def test_write_excel_constant_memory(self):
+        """Test the constant memory workbook matches the pandas one"""
+        output_dir(self)
+        tables = fixture_tables('petrodr01')
+        rsvsps.write_output('pandas', tables, 'xlsx')
+        self.assertEqual(
+            rsvsps.write_output('streamed', tables, 'xlsx-constant-memory'), 'output/streamed.xlsx')
+
+        expected = pd.read_excel('output/pandas.xlsx', sheet_name=None, index_col=0)
+        written = pd.read_excel('output/streamed.xlsx', sheet_name=None, index_col=0)
+        self.assertEqual(list(written), list(tables))
+        for table_type, table in expected.items():
+            pd.testing.assert_frame_equal(written[table_type], table)
+
+        with self.assertRaises(SystemExit):
+            rsvsps.write_output('petrodr01', tables, 'xls')
+
+    def test_instrumentation(self):
+        """Test stage totals and their prometheus report"""
+        instrumentation.enable()
+        try:
+            for rows in (3, 4):
+                with instrumentation.stage('player.clean') as measure:
+                    measure.add(rows=rows, size=10)
+            instrumentation.merge({'player.clean': {'calls': 1, 'seconds': 0.0, 'rows': 5, 'bytes': 0}})
+            totals = instrumentation.snapshot()['player.clean']
+        finally:
+            instrumentation.disable()
+        self.assertEqual((totals['calls'], totals['rows'], totals['bytes']), (3, 12, 20))
+        self.assertIn(
+            'rsvsps_stage_rows_total{stage="player.clean"} 12',
+            instrumentation.to_prometheus({'player.clean': totals}),
+        )
+
+        # nothing is recorded when turned off
+        with instrumentation.stage('player.clean') as measure:
+            measure.add(rows=1)
+        self.assertIsNone(instrumentation.snapshot())
+
 
 if __name__ == "__main__":
     unittest.main()
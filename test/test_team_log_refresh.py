@@ -0,0 +1,133 @@
+"""Test team_log_refresh file"""
+
+import csv
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from rsvsps.scrapers import team_log_refresh, team_log_scraper
+from test.test_team_log_scraper import stub_fetch, team_page
+
+FIRST_GAMES = [('2020-01-01', '', 'MIL', 110, 98), ('2020-01-03', '@', 'CHI', 95, 101)]
+NEW_GAME = ('2020-01-05', '', 'ATL', 120, 99)
+
+
+class TestTeamLogRefresh(unittest.TestCase):
+    """Test cases for each aspect of code"""
+
+    def setUp(self):
+        """Serve pages from self.pages and write to a temporary folder"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.fname = os.path.join(self.tmp_dir.name, 'season.csv')
+        self.pages = {}
+        for patcher in (
+            mock.patch.object(team_log_scraper, 'fetch_team_season_log_page', stub_fetch(self.pages)),
+            mock.patch.object(team_log_scraper, 'determine_output_filename', return_value=self.fname),
+            mock.patch('builtins.print'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def read_rows(self):
+        """Read the rows of the season's csv file"""
+        with open(self.fname, newline='') as my_csv:
+            return list(csv.reader(my_csv))
+
+    def test_watermarks_round_trip(self):
+        """Test watermarks are only trusted while their csv file exists"""
+        watermarks = {'teams': {'BOS': {'date': '2020-01-03', 'digest': 'abc'}}, 'games': []}
+        self.assertEqual(team_log_refresh.load_watermarks(self.fname), {'teams': {}, 'games': []})
+
+        team_log_refresh.save_watermarks(self.fname, watermarks)
+        self.assertEqual(team_log_refresh.load_watermarks(self.fname), {'teams': {}, 'games': []})
+        with open(self.fname, 'w'):
+            pass
+        self.assertEqual(team_log_refresh.load_watermarks(self.fname), watermarks)
+        self.assertEqual(
+            team_log_refresh.determine_watermark_filename(self.fname),
+            os.path.join(self.tmp_dir.name, 'season.watermark.json'))
+
+    def test_page_digest_and_new_rows(self):
+        """Test only game log tables are hashed and only later games are new"""
+        page = team_page(FIRST_GAMES, [('2020-04-20', '@', 'MIA', 100, 105)])
+        tables = team_log_scraper.parse_team_season_log_page(page)
+        digest = team_log_refresh.page_digest(tables)
+
+        moved = team_log_scraper.parse_team_season_log_page('<div>ads</div>' + page)
+        self.assertEqual(team_log_refresh.page_digest(moved), digest)
+        changed = team_log_scraper.parse_team_season_log_page(team_page(FIRST_GAMES + [NEW_GAME]))
+        self.assertNotEqual(team_log_refresh.page_digest(changed), digest)
+
+        header_row, rows = team_log_refresh.get_new_rows('BOS', tables, False, {'date': '2020-01-01'})
+        self.assertEqual(header_row[1], 'Date')
+        self.assertEqual([row[1] for row in rows], ['2020-01-03'])
+        self.assertEqual(team_log_refresh.get_new_rows('BOS', tables, False, {})[1][0][1], '2020-01-01')
+        self.assertEqual(team_log_refresh.get_new_rows('BOS', changed, True, {}), (None, []))
+
+    def test_refresh_team(self):
+        """Test new games are appended once and unchanged pages write nothing"""
+        self.pages[('BOS', 2020)] = team_page(FIRST_GAMES)
+        self.assertEqual(team_log_refresh.main('BOS', 2020, False), 2)
+        first_rows = self.read_rows()
+        self.assertEqual([row[1] for row in first_rows[1:]], ['2020-01-01', '2020-01-03'])
+
+        # an unchanged page leaves both files untouched
+        watermark_fname = team_log_refresh.determine_watermark_filename(self.fname)
+        modified = [os.stat(fname).st_mtime_ns for fname in (self.fname, watermark_fname)]
+        self.assertEqual(team_log_refresh.main('BOS', 2020, False), 0)
+        self.assertEqual([os.stat(fname).st_mtime_ns for fname in (self.fname, watermark_fname)], modified)
+
+        self.pages[('BOS', 2020)] = team_page(FIRST_GAMES + [NEW_GAME])
+        self.assertEqual(team_log_refresh.main('BOS', 2020, False), 1)
+        self.assertEqual(team_log_refresh.main('BOS', 2020, False), 0)
+        rows = self.read_rows()
+        self.assertEqual(rows[:3], first_rows)
+        self.assertEqual([row[1] for row in rows[1:]], ['2020-01-01', '2020-01-03', '2020-01-05'])
+
+    def test_failed_refresh_appends_once(self):
+        """Test rows appended by a run that failed before saving watermarks are not kept"""
+        self.pages[('BOS', 2020)] = team_page(FIRST_GAMES)
+        team_log_refresh.main('BOS', 2020, False)
+        first_rows = self.read_rows()
+
+        self.pages[('BOS', 2020)] = team_page(FIRST_GAMES + [NEW_GAME])
+        with mock.patch.object(team_log_refresh, 'save_watermarks', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                team_log_refresh.main('BOS', 2020, False)
+        with open(self.fname, 'a') as my_csv:
+            my_csv.write('partial,row')
+
+        self.assertEqual(team_log_refresh.main('BOS', 2020, False), 1)
+        rows = self.read_rows()
+        self.assertEqual(rows[:3], first_rows)
+        self.assertEqual([row[1] for row in rows[1:]], ['2020-01-01', '2020-01-03', '2020-01-05'])
+
+        # a csv file shorter than its watermarks is rebuilt
+        with open(self.fname, 'w') as my_csv:
+            my_csv.write('')
+        self.assertEqual(team_log_refresh.main('BOS', 2020, False), 3)
+        self.assertEqual(self.read_rows(), rows)
+
+    def test_refresh_all_teams(self):
+        """Test a game seen from both teams' pages is appended once"""
+        self.pages[('BOS', 2020)] = team_page([('2020-01-01', '', 'MIL', 110, 98)])
+        self.pages[('MIL', 2020)] = team_page([('2020-01-01', '@', 'BOS', 98, 110)])
+        self.assertEqual(team_log_refresh.main('ALL', 2020, False), 1)
+
+        self.pages[('BOS', 2020)] = team_page([('2020-01-01', '', 'MIL', 110, 98), ('2020-01-04', '@', 'MIL', 101, 107)])
+        self.pages[('MIL', 2020)] = team_page([('2020-01-01', '@', 'BOS', 98, 110), ('2020-01-04', '', 'BOS', 107, 101)])
+        self.assertEqual(team_log_refresh.main('ALL', 2020, False), 1)
+        self.assertEqual(team_log_refresh.main('ALL', 2020, False), 0)
+
+        rows = self.read_rows()
+        self.assertEqual(rows[0][:3], ['Date', 'Home Team', 'Away Team'])
+        self.assertEqual([row[:3] for row in rows[1:]], [
+            ['2020-01-01', 'BOS', 'MIL'],
+            ['2020-01-04', 'MIL', 'BOS'],
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,256 @@
+"""Test team_log_scraper file"""
+
+import asyncio
+import csv
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import requests
+
+from rsvsps import team_log_crawler
+from rsvsps.scrapers import team_log_scraper
+
+STATS = ['fg', 'fga', 'fg_pct', 'fg3', 'fg3a', 'fg3_pct', 'ft', 'fta', 'ft_pct', 'orb', 'trb', 'ast', 'stl', 'blk', 'tov', 'pf']
+GAME_STATS = ['ranker', 'game_season', 'date_game', 'game_location', 'opp_id', 'game_result', 'pts', 'opp_pts'] + STATS + ['x'] + ['opp_' + stat for stat in STATS]
+STAT_LABELS = ['FG', 'FGA', 'FG%', '3P', '3PA', '3P%', 'FT', 'FTA', 'FT%', 'ORB', 'TRB', 'AST', 'STL', 'BLK', 'TOV', 'PF']
+GAME_LABELS = ['Rk', 'G', 'Date', '', 'Opp', 'W/L', 'Tm', 'Opp'] + STAT_LABELS + [''] + STAT_LABELS
+
+
+def game_log_table(table_id, games, labels=GAME_LABELS):
+    """Build a game log table the way basketball-reference lays it out.
+
+    Args:
+        table_id: id of table
+        games: list of date, location, opponent, points and opponent points
+        labels: text of each header cell
+
+    Returns:
+        HTML of table, with the header rows repeated after the first game
+    """
+    stats = len(STATS)
+    header = (
+        '<tr class="over_header"><th colspan="8"></th><th colspan="{0}">Team</th><th></th>'
+        '<th colspan="{0}">Opponent</th></tr>'.format(stats)
+    ) + '<tr class="thead">' + ''.join(
+        '<th data-stat="{0}">{1}</th>'.format(stat, label) for stat, label in zip(GAME_STATS, labels)
+    ) + '</tr>'
+    rows = []
+    for number, (date, location, opponent, points, opp_points) in enumerate(games, 1):
+        cells = [str(number), date, location, opponent, 'W' if points > opp_points else 'L', str(points), str(opp_points)]
+        cells += ['1'] * len(STATS) + [''] + ['2'] * len(STATS)
+        rows.append('<tr><th data-stat="ranker">{0}</th>'.format(number) + ''.join(
+            '<td data-stat="{0}">{1}</td>'.format(stat, cell) for stat, cell in zip(GAME_STATS[1:], cells)
+        ) + '</tr>')
+        if number == 1:
+            rows.append(header)
+    return '<table id="{0}"><thead>{1}</thead><tbody>{2}</tbody></table>'.format(table_id, header, ''.join(rows))
+
+
+def team_page(games, playoff_games=None, labels=GAME_LABELS):
+    """Build a team season game log page.
+
+    Args:
+        games: regular season games, see game_log_table
+        playoff_games: playoff games, or None for a team that missed them
+        labels: text of each header cell
+
+    Returns:
+        raw HTML of team log page
+    """
+    tables = [game_log_table('tgl_basic', games, labels)]
+    if playoff_games is not None:
+        tables.append('<!-- ' + game_log_table('tgl_basic_playoffs', playoff_games, labels) + ' -->')
+    return '<html><body>' + '\n'.join(tables) + '</body></html>'
+
+
+def stub_fetch(pages):
+    """Stand in for downloading team pages, with a 404 for any other page.
+
+    Args:
+        pages: dict of team and season to raw HTML
+
+    Returns:
+        function taking a URL and returning its page
+    """
+    def fetch(url):
+        team, season = url.split('/')[-4:-2]
+        page = pages.get((team, int(season)))
+        if page is None:
+            response = requests.models.Response()
+            response.status_code = 404
+            raise SystemExit('HTTP Error: 404') from requests.exceptions.HTTPError(response=response)
+        return page
+    return fetch
+
+
+def fetch_without_tables(job):
+    """Stand in for downloading a page, a 404 for unknown teams and a 500 for 'ERR'."""
+    if job[0] == 'ERR' or job[0] not in team_log_scraper.TEAMS:
+        response = requests.models.Response()
+        response.status_code = 500 if job[0] == 'ERR' else 404
+        message = 'HTTP Error: {0}'.format(response.status_code)
+        raise SystemExit(message) from requests.exceptions.HTTPError(message, response=response)
+    return '<html><body>No games</body></html>'
+
+
+class TestTeamLogScraper(unittest.TestCase):
+    """Test cases for each aspect of code"""
+
+    def test_index_games(self):
+        """Test merging both teams' views of each game"""
+        header_row = ['Date', 'Home Team', 'Away Team', 'Home Team Result', 'Home Team Points']
+        team_log_data = [
+            ['2020-01-03', 'BOS', 'MIL', 'W', '110'],
+            ['2020-01-01', 'BOS', 'MIL', 'L', ''],
+            ['2020-01-01', 'BOS', 'MIL ', 'L', '98'],
+            ['2020-01-01', 'ATL', 'CHI', 'W', '101'],
+        ]
+
+        # one row per game in date order, blank cells filled from other view
+        self.assertEqual(team_log_scraper.index_games(header_row, team_log_data), [
+            ['2020-01-01', 'ATL', 'CHI', 'W', '101'],
+            ['2020-01-01', 'BOS', 'MIL', 'L', '98'],
+            ['2020-01-03', 'BOS', 'MIL', 'W', '110'],
+        ])
+
+    def test_standardize_columns_for_home_court(self):
+        """Test gathering standardized rows matches the reference"""
+        stats = ['FG{0}'.format(number) for number in range(16)]
+        column_headers = team_log_scraper.clean_column_headers(
+            ['ranker', 'game_season', 'date_game', 'game_location', 'opp_id', 'game_result', 'pts', 'opp_pts']
+            + stats + ['x'] + ['opp_' + stat for stat in stats],
+            ['Rk', 'G', 'Date', '', 'Opp', 'W/L', 'Tm', 'Opp'] + stats + [''] + stats,
+        )
+        games = [
+            ['1', '1', '2020-01-01', '', 'MIL', 'W', '110', '98'] + ['1'] * 16 + [''] + ['2'] * 16,
+            ['2', '2', '2020-01-03', '@', 'CHI', 'L', '95', '101'] + ['3'] * 16 + [''] + ['4'] * 16,
+        ]
+        standardized = team_log_scraper.standardize_columns_for_home_court(column_headers, [list(game) for game in games], 'BOS')
+        self.assertEqual(
+            standardized,
+            team_log_scraper.standardize_cols_for_home_court([column_headers] + games, 'BOS'))
+
+        # away games swap teams, points and stats, and flip the result
+        self.assertEqual(standardized[2][:7], ['2', '2020-01-03', 'CHI', 'BOS', 'W', '101', '95'])
+        self.assertEqual(standardized[2][7], '4')
+        self.assertEqual(standardized[0][7], 'Home Team FG0')
+
+    def test_run_crawl(self):
+        """Test every crawled page gets a result, with missing pages skipped"""
+        jobs = team_log_crawler.crawl_jobs(['BOS', 'SEA', 'ERR'], 2019, 2020)
+        self.assertEqual(jobs[:4], [('BOS', 2019), ('SEA', 2019), ('ERR', 2019), ('BOS', 2020)])
+
+        results = team_log_crawler.run_crawl(jobs, ('RS', 'PS'), fetch_workers=2, process_workers=1, fetch=fetch_without_tables)
+        self.assertEqual(results[('BOS', 2020)], {'RS': None, 'PS': None})
+        self.assertIsNone(results[('SEA', 2019)])
+        self.assertEqual(results[('ERR', 2019)], 'HTTPError: HTTP Error: 500')
+        self.assertEqual(len(results), 6)
+        with mock.patch('builtins.print'):
+            self.assertEqual(team_log_crawler.report(results, 1.0), 2)
+
+        # by default each season's own teams are crawled
+        jobs = team_log_crawler.crawl_jobs(None, 2008, 2009)
+        self.assertIn(('SEA', 2008), jobs)
+        self.assertIn(('OKC', 2009), jobs)
+        self.assertNotIn(('OKC', 2008), jobs)
+        self.assertNotIn(('BRK', 2009), jobs)
+
+    def test_teams_for_season(self):
+        """Test teams are named as they were in each season"""
+        self.assertEqual(team_log_scraper.teams_for_season(2020), team_log_scraper.TEAMS)
+        teams = team_log_scraper.teams_for_season('1985')
+        self.assertEqual(len(teams), 23)
+        self.assertTrue({'NJN', 'KCK', 'LAC', 'WSB'} <= set(teams))
+        self.assertFalse({'BRK', 'SDC', 'TOR', 'OKC'} & set(teams))
+
+    def test_team_season_range_skips_missing_pages(self):
+        """Test a single team's range skips seasons whose page is not found"""
+        pages = {('SEA', 2008): team_page([('2008-01-01', '', 'POR', 101, 99)])}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fname = os.path.join(tmp_dir, 'SEA.csv')
+            with mock.patch.object(team_log_scraper, 'fetch_team_season_log_page', stub_fetch(pages)), \
+                    mock.patch.object(team_log_scraper, 'determine_output_filename', return_value=fname), \
+                    mock.patch('builtins.print'):
+                self.assertEqual(team_log_scraper.main('SEA', 2008, False, last_season=2009), [('SEA', 2009)])
+                with self.assertRaises(SystemExit):
+                    team_log_scraper.get_season_output('SEA', 2009, False)
+            with open(fname, newline='') as my_csv:
+                rows = list(csv.reader(my_csv))
+
+        self.assertEqual([row[1:4] for row in rows[1:]], [['2008-01-01', 'SEA', 'POR']])
+
+    def test_all_teams_post_season(self):
+        """Test missing pages and playoff tables are skipped in every team mode"""
+        pages = {
+            ('BOS', 2020): team_page([('2020-01-01', '', 'MIL', 110, 98)], [('2020-04-20', '@', 'MIA', 100, 105)]),
+            ('MIL', 2020): team_page([('2020-01-01', '@', 'BOS', 98, 110)]),
+            ('BOS', 2021): team_page([], [('2021-04-20', '', 'MIL', 101, 99)]),
+            ('MIL', 2021): team_page([], [('2021-04-20', '@', 'BOS', 99, 101)]),
+        }
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fname = os.path.join(tmp_dir, 'ALL.csv')
+            with mock.patch.object(team_log_scraper, 'fetch_team_season_log_page', stub_fetch(pages)), \
+                    mock.patch.object(team_log_scraper, 'determine_output_filename', return_value=fname), \
+                    mock.patch('builtins.print'):
+                missing = team_log_scraper.main('ALL', 2020, True, concurrency=3, last_season=2021)
+            with open(fname, newline='') as my_csv:
+                rows = list(csv.reader(my_csv))
+            self.assertEqual(os.listdir(tmp_dir), ['ALL.csv'])
+
+        self.assertEqual(len(missing), 2 * (len(team_log_scraper.TEAMS) - 2))
+        self.assertIn(('BRK', 2021), missing)
+        self.assertEqual(rows[0][:3], ['Date', 'Home Team', 'Away Team'])
+        self.assertEqual([row[:3] for row in rows[1:]], [
+            ['2020-04-20', 'MIA', 'BOS'],
+            ['2021-04-20', 'BOS', 'MIL'],
+        ])
+
+    def test_get_output_for_teams(self):
+        """Test outputs keep the order of teams with a bounded number of downloads"""
+        teams = ('ATL', 'BOS', 'CHI', 'MIL', 'NYK')
+        lock = threading.Lock()
+        in_flight = [0, 0]
+
+        def fetch(url):
+            team = url.split('/')[-4]
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            # later teams arrive first
+            time.sleep(0.01 * (len(teams) - teams.index(team)))
+            with lock:
+                in_flight[0] -= 1
+            return team_page([('2020-01-0{0}'.format(teams.index(team) + 1), '', 'TOR', 100, 90)]), None
+
+        with mock.patch.object(team_log_scraper, 'fetch_page_or_error', fetch):
+            outputs = asyncio.run(team_log_scraper.get_output_for_teams(teams, 2020, False, concurrency=2))
+
+        self.assertEqual([output[1][1] for output in outputs], ['2020-01-01', '2020-01-02', '2020-01-03', '2020-01-04', '2020-01-05'])
+        self.assertEqual(in_flight, [0, 2])
+
+    def test_failed_run_keeps_csv(self):
+        """Test a run failing part way leaves the earlier csv file as it was"""
+        renamed = [label.replace('PF', 'Fouls') for label in GAME_LABELS]
+        pages = {
+            ('BOS', 2020): team_page([('2020-01-01', '', 'MIL', 110, 98)]),
+            ('BOS', 2021): team_page([('2021-01-01', '', 'MIL', 110, 98)], labels=renamed),
+        }
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fname = os.path.join(tmp_dir, 'BOS.csv')
+            with open(fname, 'w') as my_csv:
+                my_csv.write('earlier run\n')
+            with mock.patch.object(team_log_scraper, 'fetch_team_season_log_page', stub_fetch(pages)), \
+                    mock.patch.object(team_log_scraper, 'determine_output_filename', return_value=fname):
+                with self.assertRaises(SystemExit):
+                    team_log_scraper.main('BOS', 2020, False, last_season=2021)
+            with open(fname) as my_csv:
+                self.assertEqual(my_csv.read(), 'earlier run\n')
+            self.assertEqual(os.listdir(tmp_dir), ['BOS.csv'])
+
+
+if __name__ == "__main__":
+    unittest.main()